@@ -0,0 +1,240 @@
+"""Benchmark reading, updating and repacking synthetic OOXML packages.
+
+Usage:
+
+    python benchmarks/run.py [--quick] [--output results.json]
+                             [--compare baseline.json]
+
+Results are written as JSON, one record per benchmark and package variant
+with the minimum, median and mean wall clock time in seconds. Passing the
+results of an earlier run with --compare prints the change of the median
+for every benchmark present in both runs.
+"""
+
+from ooxml_docprops import copy_with_properties
+from ooxml_docprops import read_properties
+from ooxml_docprops import update_properties
+from ooxml_docprops.package import OOXMLPackage
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.template import PreparedTemplate
+from synthetic import generate_package
+import argparse
+import json
+import lxml.etree
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+
+MB = 1024 * 1024
+
+FULL = {
+    'kinds': ('docx', 'xlsx', 'pptx'),
+    'media_sizes': (0, 5 * MB, 50 * MB),
+    'entry_counts': (10, 1000),
+    'property_counts': (0, 10, 80),
+    'key_counts': (1, 10, 40, 80),
+    'repeat': 5,
+}
+
+QUICK = {
+    'kinds': ('docx', 'xlsx', 'pptx'),
+    'media_sizes': (0, 1 * MB),
+    'entry_counts': (10, 200),
+    'property_counts': (0, 40),
+    'key_counts': (1, 10, 40),
+    'repeat': 3,
+}
+
+
+def measure(func, repeat, setup=None):
+    """Call `func` `repeat` times and return the wall clock times. `setup`
+    is called before every call and not measured.
+    """
+    timings = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+    return timings
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        'min': ordered[0],
+        'median': ordered[len(ordered) // 2],
+        'mean': sum(ordered) / len(ordered),
+        'repeat': len(ordered),
+    }
+
+
+class BenchmarkRun(object):
+
+    def __init__(self, settings, workdir):
+        self.settings = settings
+        self.workdir = workdir
+        self.results = []
+
+    def record(self, name, params, timings):
+        result = dict(params, benchmark=name)
+        result.update(summarize(timings))
+        self.results.append(result)
+        print '%-28s %-60s %8.4fs' % (
+            name, ' '.join('%s=%s' % item for item in sorted(params.items())),
+            result['median'])
+        sys.stdout.flush()
+
+    def package_variants(self):
+        settings = self.settings
+        for kind in settings['kinds']:
+            for media_size in settings['media_sizes']:
+                for entry_count in settings['entry_counts']:
+                    for property_count in settings['property_counts']:
+                        yield {'kind': kind,
+                               'media_mb': media_size / float(MB),
+                               'entries': entry_count,
+                               'properties': property_count}
+
+    def generate(self, params):
+        path = os.path.join(self.workdir, 'fixture.%s' % params['kind'])
+        generate_package(path, kind=params['kind'],
+                         media_size=int(params['media_mb'] * MB),
+                         media_count=4,
+                         filler_parts=params['entries'],
+                         property_count=params['properties'])
+        return path
+
+    def run(self):
+        repeat = self.settings['repeat']
+        for params in self.package_variants():
+            fixture = self.generate(params)
+            target = os.path.join(self.workdir, 'target.%s' % params['kind'])
+
+            def reset():
+                shutil.copyfile(fixture, target)
+
+            reset()
+            self.record('read_properties', params, measure(
+                lambda: list(read_properties(target)), repeat))
+
+            for in_memory in (False, True):
+                backend = in_memory and 'memory' or 'extract'
+
+                def read_document():
+                    with OOXMLDocument(target, read_only=True,
+                                       in_memory=in_memory) as doc:
+                        doc.properties.get_properties()
+                self.record('document_read', dict(params, backend=backend),
+                            measure(read_document, repeat))
+
+                def update_document():
+                    with OOXMLDocument(target, in_memory=in_memory) as doc:
+                        doc.update_properties({'Benchmark': 'stamped'})
+                self.record('document_update',
+                            dict(params, backend=backend),
+                            measure(update_document, repeat, setup=reset))
+
+            package = {}
+
+            def unpack():
+                package['current'] = OOXMLPackage(target).__enter__()
+
+            def setup_unpack():
+                if 'current' in package:
+                    package.pop('current').close()
+                reset()
+            self.record('package_unpack', params,
+                        measure(unpack, repeat, setup=setup_unpack))
+
+            def setup_pack():
+                setup_unpack()
+                unpack()
+                package['current'].mark_modified('docProps/app.xml')
+            self.record('package_pack', params, measure(
+                lambda: package['current'].pack(), repeat, setup=setup_pack))
+
+            self.record('update_properties', params, measure(
+                lambda: update_properties(target, {'Benchmark': 'stamped'}),
+                repeat, setup=reset))
+
+            copy_target = os.path.join(self.workdir,
+                                       'copy.%s' % params['kind'])
+            self.record('copy_with_properties', params, measure(
+                lambda: copy_with_properties(
+                    fixture, copy_target, {'Benchmark': 'stamped'}),
+                repeat))
+
+            template = PreparedTemplate(fixture)
+            self.record('template_stamp', params, measure(
+                lambda: template.stamp({'Benchmark': 'stamped'},
+                                       copy_target),
+                repeat))
+
+            for key_count in self.settings['key_counts']:
+                metadata = dict(('Key%d' % i, 'Value %d' % i)
+                                for i in range(key_count))
+                self.record(
+                    'update_scaling', dict(params, keys=key_count),
+                    measure(lambda: update_properties(target, metadata),
+                            repeat, setup=reset))
+
+        return self.results
+
+
+def result_key(result):
+    return tuple(sorted((key, value) for key, value in result.items()
+                        if key not in ('min', 'median', 'mean', 'repeat')))
+
+
+def compare(baseline, results):
+    baseline = dict((result_key(r), r) for r in baseline['results'])
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old is None or not old['median']:
+            continue
+        print '%-28s %-60s %8.4fs -> %8.4fs (%+.1f%%)' % (
+            result['benchmark'],
+            ' '.join('%s=%s' % item for item in result_key(result)
+                     if item[0] != 'benchmark'),
+            old['median'], result['median'],
+            (result['median'] / old['median'] - 1) * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quick', action='store_true',
+                        help='Run a smaller set of package variants')
+    parser.add_argument('-o', '--output', default='benchmark-results.json',
+                        help='File to write the JSON results to')
+    parser.add_argument('--compare',
+                        help='JSON results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='ooxml_benchmark')
+    try:
+        results = BenchmarkRun(args.quick and QUICK or FULL, workdir).run()
+    finally:
+        shutil.rmtree(workdir)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'lxml': lxml.etree.__version__,
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Generate synthetic OOXML packages for benchmarking.
+
+The packages are minimal but valid OPC packages of the requested kind,
+padded with incompressible media payloads and filler parts.
+"""
+
+from datetime import datetime
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+from zipfile import ZIP_DEFLATED
+from zipfile import ZipFile
+from zipfile import ZipInfo
+import os
+import random
+
+
+CT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+DOC_REL = ('http://schemas.openxmlformats.org/officeDocument/2006/'
+           'relationships/officeDocument')
+CUSTOM_REL = ('http://schemas.openxmlformats.org/officeDocument/2006/'
+              'relationships/custom-properties')
+CORE_REL = ('http://schemas.openxmlformats.org/package/2006/relationships/'
+            'metadata/core-properties')
+APP_REL = ('http://schemas.openxmlformats.org/officeDocument/2006/'
+           'relationships/extended-properties')
+
+MAIN_PARTS = {
+    'docx': (
+        'word/document.xml',
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.'
+        'document.main+xml',
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/'
+        'wordprocessingml/2006/main"><w:body>%s</w:body></w:document>',
+        '<w:p><w:r><w:t>Paragraph %d</w:t></w:r></w:p>'),
+    'xlsx': (
+        'xl/workbook.xml',
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.'
+        'sheet.main+xml',
+        '<workbook xmlns="http://schemas.openxmlformats.org/'
+        'spreadsheetml/2006/main"><sheets>%s</sheets></workbook>',
+        '<sheet name="Sheet%d"/>'),
+    'pptx': (
+        'ppt/presentation.xml',
+        'application/vnd.openxmlformats-officedocument.presentationml.'
+        'presentation.main+xml',
+        '<p:presentation xmlns:p="http://schemas.openxmlformats.org/'
+        'presentationml/2006/main"><p:sldIdLst>%s</p:sldIdLst>'
+        '</p:presentation>',
+        '<p:sldId id="%d"/>'),
+}
+
+
+def content_types(kind, with_custom):
+    main_part, main_type = MAIN_PARTS[kind][:2]
+    overrides = [
+        ('/' + main_part, main_type),
+        ('/docProps/core.xml',
+         'application/vnd.openxmlformats-package.core-properties+xml'),
+        ('/docProps/app.xml',
+         'application/vnd.openxmlformats-officedocument.'
+         'extended-properties+xml'),
+    ]
+    if with_custom:
+        overrides.append(
+            ('/docProps/custom.xml',
+             'application/vnd.openxmlformats-officedocument.'
+             'custom-properties+xml'))
+    return ''.join(
+        ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+         '<Types xmlns="%s">' % CT_NS,
+         '<Default Extension="rels" ContentType="application/'
+         'vnd.openxmlformats-package.relationships+xml"/>',
+         '<Default Extension="xml" ContentType="application/xml"/>',
+         '<Default Extension="bin" ContentType="image/png"/>'] +
+        ['<Override PartName="%s" ContentType="%s"/>' % item
+         for item in overrides] +
+        ['</Types>'])
+
+
+def relationships(kind, with_custom):
+    rels = [(DOC_REL, MAIN_PARTS[kind][0]),
+            (CORE_REL, 'docProps/core.xml'),
+            (APP_REL, 'docProps/app.xml')]
+    if with_custom:
+        rels.append((CUSTOM_REL, 'docProps/custom.xml'))
+    return ''.join(
+        ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+         '<Relationships xmlns="%s">' % REL_NS] +
+        ['<Relationship Id="rId%d" Type="%s" Target="%s"/>' % (
+            i + 1, rel_type, target)
+         for i, (rel_type, target) in enumerate(rels)] +
+        ['</Relationships>'])
+
+
+def custom_properties(count):
+    props = []
+    for i in range(count):
+        props.append(
+            '<property fmtid="{D5CDD505-2E9C-101B-9397-08002B2CF9AE}" '
+            'pid="%d" name=%s><vt:lpwstr>%s</vt:lpwstr></property>' % (
+                i + 2, quoteattr('Property%d' % i),
+                escape('Value %d' % i)))
+    return ''.join(
+        ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+         '<Properties xmlns="http://schemas.openxmlformats.org/'
+         'officeDocument/2006/custom-properties" xmlns:vt="http://schemas.'
+         'openxmlformats.org/officeDocument/2006/docPropsVTypes">'] +
+        props + ['</Properties>'])
+
+
+def random_bytes(rnd, size):
+    """Return `size` incompressible bytes drawn from the Random `rnd`.
+    """
+    if not size:
+        return ''
+    return ('%0*x' % (size * 2, rnd.getrandbits(size * 8))).decode('hex')
+
+
+def generate_package(path, kind='docx', media_size=0, media_count=1,
+                     filler_parts=0, property_count=0, paragraphs=100,
+                     seed=0):
+    """Write a synthetic package of `kind` to `path`.
+
+    `media_size` bytes of incompressible data are split over `media_count`
+    media parts, `filler_parts` additional small XML parts are added and
+    the custom properties part contains `property_count` properties.
+    Without properties, the package has no custom properties part.
+    """
+    rnd = random.Random(seed)
+    main_part, main_type, template, item = MAIN_PARTS[kind]
+    with_custom = property_count > 0
+    date_time = datetime(2016, 10, 18).timetuple()[:6]
+
+    with ZipFile(path, 'w', ZIP_DEFLATED) as z:
+        def add(name, data):
+            info = ZipInfo(name, date_time)
+            info.compress_type = ZIP_DEFLATED
+            info.external_attr = 0o600 << 16
+            z.writestr(info, data)
+
+        add('[Content_Types].xml', content_types(kind, with_custom))
+        add('_rels/.rels', relationships(kind, with_custom))
+        add(main_part, template % ''.join(
+            item % i for i in range(paragraphs)))
+        add('docProps/core.xml',
+            '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/'
+            'package/2006/metadata/core-properties"/>')
+        add('docProps/app.xml',
+            '<Properties xmlns="http://schemas.openxmlformats.org/'
+            'officeDocument/2006/extended-properties"/>')
+        if with_custom:
+            add('docProps/custom.xml', custom_properties(property_count))
+
+        media_dir = os.path.dirname(main_part) + '/media'
+        if media_size and media_count:
+            chunk = media_size // media_count
+            for i in range(media_count):
+                add('%s/image%d.bin' % (media_dir, i),
+                    random_bytes(rnd, chunk))
+        for i in range(filler_parts):
+            add('%s/filler/part%d.xml' % (os.path.dirname(main_part), i),
+                '<filler>%s</filler>' % ('x' * rnd.randint(100, 1000)))
@@ -1,22 +1,107 @@
 from ooxml_docprops.config import SUPPORTED_MIME_TYPES
+from ooxml_docprops.instrumentation import OperationStats
+from ooxml_docprops.instrumentation import log_stats
+from ooxml_docprops.locking import ConcurrentModificationError
+from ooxml_docprops.locking import LockTimeout
 from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.reader import iter_custom_properties
+from ooxml_docprops.reader import iter_custom_property_records
+from ooxml_docprops.reader import probe_package
+from ooxml_docprops.reader import property_matcher
+from ooxml_docprops.zip_utils import is_path
 
 
-def update_properties(document, metadata):
+def update_properties(document, metadata, output=None, core=None,
+                      extended=None, schema=None, on_stats=log_stats,
+                      locking=False, lock_timeout=None, refresh_fields=False):
     """Update custom doc properties in the document specified by path
     `document` with properties from `metadata`. Modifies the document in place!
+
+    Core and extended properties are updated from the dicts `core` and
+    `extended` in the same pass. Custom properties are validated against
+    the PropertySchema `schema`, if given. With `refresh_fields` set, the
+    DOCPROPERTY fields showing the updated properties in Word documents are
+    refreshed too.
+
+    The document is not extracted, only the changed parts are written and
+    all other entries are copied over as they are. The document may also
+    be given as bytes or seekable file-like object.
+    If `output` is given, the updated document is written to that path or
+    stream instead. Otherwise documents that are not given as path are returned
+    as bytes.
+
+    The OperationStats of the update are passed to `on_stats`, by default
+    they are logged to the 'ooxml_docprops' logger at debug level.
+
+    Safe to call from many threads at once, for different documents.
+    Concurrent updates of the same path never corrupt it. An update that
+    would discard another one is detected on a best-effort basis and raises
+    ConcurrentModificationError, but a change made right between that check
+    and the replacement can still be lost. Only with `locking` set, which
+    makes concurrent updates of the same path, also from other processes,
+    wait for each other (at most `lock_timeout` seconds), no update is lost.
+    """
+    with OOXMLDocument(document, in_memory=True, output=output,
+                       schema=schema, on_stats=on_stats, locking=locking,
+                       lock_timeout=lock_timeout) as doc:
+        doc.update_properties(metadata, core=core, extended=extended,
+                              refresh_fields=refresh_fields)
+    return doc.getvalue()
+
+
+def copy_with_properties(source, destination, metadata, core=None,
+                         extended=None, schema=None, on_stats=log_stats,
+                         refresh_fields=False):
+    """Write a copy of the document `source` with the custom properties
+    updated from `metadata` to `destination`, a path or writable stream.
+
+    The copy is written in one pass, unchanged entries are copied over as
+    they are. The source is only read, so many copies of the same source
+    can be made concurrently. See `update_properties` for the other
+    arguments.
     """
-    with OOXMLDocument(document) as doc:
-        doc.update_properties(metadata)
+    update_properties(source, metadata, output=destination, core=core,
+                      extended=extended, schema=schema, on_stats=on_stats,
+                      refresh_fields=refresh_fields)
 
 
-def read_properties(document):
+def read_properties(document, cache=None, names=None, prefix=None,
+                    pattern=None):
     """Read custom doc properties from the file `document`.
+
+    The document is not extracted, properties are yielded as (name, value)
+    tuples while the custom properties part is parsed. Documents given as
+    path are served from the PropertiesCache `cache` if there is one.
+
+    Only the properties listed in `names`, starting with `prefix` or
+    matching the glob `pattern` are returned if any of them is given, all
+    other properties are skipped without converting their values.
+
+    Safe to call from many threads at once, also for the same document and
+    with the same cache.
+    """
+    match = property_matcher(prefix, pattern)
+    if cache is not None and is_path(document):
+        properties = cache.get_properties(document)
+        if names is None and match is None:
+            return iter(properties)
+        names = set(names or ())
+        return ((name, value) for name, value in properties
+                if name in names or (match is not None and match(name)))
+    return iter_custom_properties(document, names, match)
+
+
+def read_all_properties(document, on_stats=log_stats):
+    """Read the custom, core and extended doc properties from the file
+    `document` without extracting it.
+
+    Returns a dict with the keys 'custom', 'core' and 'extended', each
+    mapping property names to values. See `update_properties` for
+    `on_stats`.
     """
-    with OOXMLDocument(document, read_only=True) as doc:
-        for name in doc.properties.get_property_names():
-            value = doc.properties.get_property_value(name)
-            yield (name, value)
+    with OOXMLDocument(document, read_only=True, in_memory=True,
+                       on_stats=on_stats) as doc:
+        return doc.get_all_properties()
 
 
 def is_supported_mimetype(mime_type):
@@ -0,0 +1,124 @@
+"""Processing of many documents at once on a pool of worker processes.
+"""
+
+from collections import namedtuple
+from fnmatch import fnmatch
+from multiprocessing import Pool
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.reader import iter_custom_property_records
+import json
+import os
+
+
+BulkResult = namedtuple('BulkResult', ['path', 'success', 'error', 'changed'])
+ReadResult = namedtuple('ReadResult', ['path', 'success', 'error', 'records'])
+# A manifest line that could not be read, `path` being its location
+InvalidEntry = namedtuple('InvalidEntry', ['path', 'error'])
+
+
+def iter_manifest(manifest_path):
+    """Yield (path, metadata) tuples from a manifest file.
+
+    Every non-empty line of the manifest is a JSON object with the keys
+    `path` and `metadata`, which may be omitted for reading. Relative paths
+    are relative to the directory containing the manifest.
+
+    For lines that are not valid entries an InvalidEntry is yielded
+    instead, which the bulk functions report as failed document, so one
+    bad line does not abort the run.
+    """
+    basedir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path) as manifest:
+        for lineno, line in enumerate(manifest, 1):
+            if not line.strip():
+                continue
+            location = '%s:%d' % (manifest_path, lineno)
+            try:
+                entry = json.loads(line)
+            except ValueError as exc:
+                yield InvalidEntry(location, 'ValueError: %s' % exc)
+                continue
+            if not isinstance(entry, dict) or \
+                    not isinstance(entry.get('path'), basestring):
+                yield InvalidEntry(location, 'ValueError: Entry has no path')
+                continue
+            yield (os.path.join(basedir, entry['path']),
+                   entry.get('metadata', {}))
+
+
+def iter_documents(basedir, pattern='*.docx'):
+    """Yield the paths of all files below `basedir` whose names match the
+    glob `pattern`.
+    """
+    for root, dirs, files in os.walk(basedir):
+        dirs.sort()
+        for fn in sorted(files):
+            if fnmatch(fn, pattern):
+                yield os.path.join(root, fn)
+
+
+def _update_document(job):
+    if isinstance(job, InvalidEntry):
+        return BulkResult(job.path, False, job.error, False)
+    path, metadata = job
+    try:
+        with OOXMLDocument(path, in_memory=True) as doc:
+            doc.update_properties(metadata)
+    except Exception as exc:
+        return BulkResult(path, False, '%s: %s' % (type(exc).__name__, exc),
+                          False)
+    return BulkResult(path, True, None, doc.changed)
+
+
+def _read_document(path):
+    if isinstance(path, InvalidEntry):
+        return ReadResult(path.path, False, path.error, None)
+    try:
+        records = list(iter_custom_property_records(path))
+    except Exception as exc:
+        return ReadResult(path, False, '%s: %s' % (type(exc).__name__, exc),
+                          None)
+    return ReadResult(path, True, None, records)
+
+
+def _run(func, jobs, processes):
+    if processes == 1:
+        for job in jobs:
+            yield func(job)
+        return
+
+    pool = Pool(processes)
+    try:
+        for result in pool.imap_unordered(func, jobs):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def bulk_update_properties(jobs, processes=None):
+    """Update the custom doc properties of many documents.
+
+    `jobs` is an iterable of (path, metadata) tuples, for example from
+    `iter_manifest`. Documents are processed on a pool of `processes`
+    worker processes (by default one per CPU). A BulkResult is yielded for
+    every document as soon as it has been processed, failures (including
+    InvalidEntry jobs) are reported in the result instead of aborting the
+    run. Documents whose properties
+    are already up to date are not written and reported as not changed.
+    """
+    return _run(_update_document, jobs, processes)
+
+
+def bulk_read_properties(paths, processes=None):
+    """Read the custom doc properties of many documents.
+
+    Documents are read on a pool of `processes` worker processes (by
+    default one per CPU). A ReadResult with the PropertyRecords of every
+    document is yielded as soon as it has been read, failures are reported
+    in the result instead of aborting the run.
+    """
+    return _run(_read_document, paths, processes)
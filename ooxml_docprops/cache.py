@@ -0,0 +1,129 @@
+"""LRU cache for the custom properties of documents that are read often.
+
+Cached entries are keyed by the identity of the file, either its stat
+information (path, size, mtime and inode) or a hash of its content, so a
+changed file is never served from the cache. Additionally, all caches drop
+their entries for a path as soon as an OOXMLDocument writes to it.
+"""
+
+from collections import OrderedDict
+from reader import iter_custom_properties
+import hashlib
+import os
+import sys
+import threading
+import weakref
+
+
+_caches = weakref.WeakSet()
+_caches_lock = threading.Lock()
+
+
+def invalidate(path):
+    """Drop the cached properties of the file at `path` from all caches.
+    """
+    path = os.path.abspath(path)
+    with _caches_lock:
+        caches = list(_caches)
+    for cache in caches:
+        cache.invalidate(path)
+
+
+def estimate_size(properties):
+    size = sys.getsizeof(properties)
+    for item in properties:
+        size += sys.getsizeof(item) + sum(sys.getsizeof(x) for x in item)
+    return size
+
+
+class PropertiesCache(object):
+    """Caches the custom properties of at most `max_entries` documents,
+    using at most roughly `max_size` bytes of memory.
+
+    `key` selects how files are identified, either by 'stat' information
+    or by a hash of their 'content'. Hashing still reads the file, but
+    saves the ZIP and XML work and also detects changes that keep size
+    and mtime.
+    """
+
+    def __init__(self, max_entries=256, max_size=16 * 1024 * 1024,
+                 key='stat'):
+        assert key in ('stat', 'content'), 'unsupported key %r' % key
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.key = key
+
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._keys_by_path = {}
+        self._lock = threading.Lock()
+        with _caches_lock:
+            _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def make_key(self, path):
+        if self.key == 'content':
+            digest = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), ''):
+                    digest.update(chunk)
+            return (path, digest.hexdigest())
+
+        stat = os.stat(path)
+        return (path, stat.st_size, stat.st_mtime, stat.st_ino)
+
+    def get_properties(self, path):
+        """Return the custom properties of the file at `path` as a list of
+        (name, value) tuples, from the cache if possible.
+        """
+        path = os.path.abspath(path)
+        key = self.make_key(path)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                # Re-insert to mark the entry as most recently used
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        properties = list(iter_custom_properties(path))
+        self._store(path, key, properties)
+        return properties
+
+    def _store(self, path, key, properties):
+        size = estimate_size(properties)
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            self._remove(self._keys_by_path.get(path))
+            self._entries[key] = (properties, size)
+            self._keys_by_path[path] = key
+            self.size += size
+            while (len(self._entries) > self.max_entries or
+                   self.size > self.max_size):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry[1]
+        if self._keys_by_path.get(key[0]) == key:
+            del self._keys_by_path[key[0]]
+
+    def invalidate(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            self._remove(self._keys_by_path.get(path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_path.clear()
+            self.size = 0
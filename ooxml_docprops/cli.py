@@ -1,11 +1,22 @@
 """Simple command-line interface for easy testing.
 """
 
+from io import BytesIO
+from ooxml_docprops import copy_with_properties
 from ooxml_docprops import read_properties
 from ooxml_docprops import update_properties
+from ooxml_docprops.bulk import InvalidEntry
+from ooxml_docprops.bulk import bulk_update_properties
+from ooxml_docprops.bulk import iter_documents
+from ooxml_docprops.bulk import iter_manifest
+from ooxml_docprops.export import Checkpoint
+from ooxml_docprops.export import WRITERS
+from ooxml_docprops.export import export_properties
+from ooxml_docprops.export import guess_format
 import argparse
-import config
 import json
+import logging
+import sys
 
 
 def create_arg_parser():
@@ -20,24 +31,154 @@ def create_arg_parser():
 def update_props():
     parser = create_arg_parser()
     parser.add_argument('metadata_file', help='JSON file containing metadata')
+    parser.add_argument('--refresh-fields', action='store_true',
+                        help='Also refresh the DOCPROPERTY fields showing '
+                             'the updated properties')
     args = parser.parse_args()
 
-    config.DEBUG = args.debug
-    if config.DEBUG:
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
         print "Updating '%s' with metadata from '%s'..." % (
             args.document, args.metadata_file)
 
     metadata = json.load(open(args.metadata_file))
-    update_properties(args.document, metadata)
+    update_properties(args.document, metadata,
+                      refresh_fields=args.refresh_fields)
+
+
+def copy_props():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source', help='Office Document to be copied')
+    parser.add_argument('destination',
+                        help='Path of the copy, "-" for standard output')
+    parser.add_argument('metadata_file', help='JSON file containing metadata')
+    parser.add_argument('--refresh-fields', action='store_true',
+                        help='Also refresh the DOCPROPERTY fields showing '
+                             'the updated properties')
+    args = parser.parse_args()
+
+    metadata = json.load(open(args.metadata_file))
+    if args.destination == '-':
+        # Writing a ZIP file needs a seekable stream
+        output = BytesIO()
+        copy_with_properties(args.source, output, metadata,
+                             refresh_fields=args.refresh_fields)
+        sys.stdout.write(output.getvalue())
+    else:
+        copy_with_properties(args.source, args.destination, metadata,
+                             refresh_fields=args.refresh_fields)
 
 
 def read_props():
     parser = create_arg_parser()
+    parser.add_argument('-n', '--name', action='append', dest='names',
+                        help='Only read this property (may be repeated)')
+    parser.add_argument('--prefix',
+                        help='Only read properties starting with PREFIX')
+    parser.add_argument('--pattern',
+                        help='Only read properties matching the glob PATTERN')
     args = parser.parse_args()
 
-    config.DEBUG = args.debug
-    if config.DEBUG:
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
         print "Reading properties from '%s'..." % args.document
 
-    for key, value in read_properties(args.document):
+    for key, value in read_properties(args.document, names=args.names,
+                                      prefix=args.prefix,
+                                      pattern=args.pattern):
         print "%s = %s" % (key, value)
+
+
+def bulk_update_props():
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('-m', '--manifest',
+                        help='JSON lines file with a "path" and "metadata" '
+                             'object per line')
+    source.add_argument('-r', '--directory',
+                        help='Directory tree containing the documents to be '
+                             'updated with the same metadata')
+    parser.add_argument('--metadata-file',
+                        help='JSON file containing metadata (required with '
+                             '--directory)')
+    parser.add_argument('--pattern', default='*.docx',
+                        help='Glob pattern for documents in --directory')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='Number of worker processes (default: one per '
+                             'CPU)')
+    args = parser.parse_args()
+
+    if args.manifest:
+        jobs = iter_manifest(args.manifest)
+    else:
+        if not args.metadata_file:
+            parser.error('--metadata-file is required with --directory')
+        metadata = json.load(open(args.metadata_file))
+        jobs = ((path, metadata)
+                for path in iter_documents(args.directory, args.pattern))
+
+    failed = 0
+    for result in bulk_update_properties(jobs, processes=args.processes):
+        if result.success and not result.changed:
+            print "UNCHANGED %s" % result.path
+        elif result.success:
+            print "OK %s" % result.path
+        else:
+            failed += 1
+            print "FAILED %s: %s" % (result.path, result.error)
+        sys.stdout.flush()
+
+    if failed:
+        sys.exit(1)
+
+
+def export_props():
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('-m', '--manifest',
+                        help='JSON lines file with a "path" object per line')
+    source.add_argument('-r', '--directory',
+                        help='Directory tree containing the documents to be '
+                             'exported')
+    parser.add_argument('--pattern', default='*.docx',
+                        help='Glob pattern for documents in --directory')
+    parser.add_argument('-o', '--output', required=True,
+                        help='File to write the properties to, a directory '
+                             'of files for Parquet')
+    parser.add_argument('-f', '--format', choices=sorted(WRITERS),
+                        help='Output format (default: guessed from the '
+                             'extension of --output)')
+    parser.add_argument('-c', '--checkpoint',
+                        help='File recording the exported documents, to '
+                             'resume an interrupted export')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='Number of worker processes (default: one per '
+                             'CPU)')
+    args = parser.parse_args()
+
+    output_format = args.format or guess_format(args.output)
+    if output_format is None:
+        parser.error('Cannot guess the format of %s, use --format' %
+                     args.output)
+
+    if args.manifest:
+        paths = (entry if isinstance(entry, InvalidEntry) else entry[0]
+                 for entry in iter_manifest(args.manifest))
+    else:
+        paths = iter_documents(args.directory, args.pattern)
+    checkpoint = args.checkpoint and Checkpoint(args.checkpoint) or None
+
+    failed = 0
+    writer = WRITERS[output_format](args.output)
+    try:
+        for result in export_properties(paths, writer, checkpoint,
+                                        processes=args.processes):
+            if not result.success:
+                failed += 1
+                print "FAILED %s: %s" % (result.path, result.error)
+                sys.stdout.flush()
+    finally:
+        writer.close()
+
+    if failed:
+        sys.exit(1)
@@ -2,19 +2,34 @@
 """
 import os
 
-DEBUG = False
-
 CUSTOM_PROPERTY_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.custom-properties+xml'
 CUSTOM_PROPERTY_FMTID = '{D5CDD505-2E9C-101B-9397-08002B2CF9AE}'
 CUSTOM_PROPERTY_DEFAULT_PATH = os.path.join('docProps', 'custom.xml')
+CORE_PROPERTY_CONTENT_TYPE = 'application/vnd.openxmlformats-package.core-properties+xml'
+CORE_PROPERTY_DEFAULT_PATH = 'docProps/core.xml'
+EXTENDED_PROPERTY_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.extended-properties+xml'
+EXTENDED_PROPERTY_DEFAULT_PATH = 'docProps/app.xml'
 CONTENT_TYPES_PATH = '[Content_Types].xml'
+RELATIONSHIPS_PATH = '_rels/.rels'
 
 NAMESPACES = {
     'CONTENT_TYPES':    'http://schemas.openxmlformats.org/package/2006/content-types',
     'VTYPES':           'http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes',
+    'OFFICE_DOCUMENT_REL': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument',
     'CUSTOM_PROPS_REL': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/custom-properties',
     'RELATIONSHIPS':    'http://schemas.openxmlformats.org/package/2006/relationships',
     'CUSTOM_PROPS':     'http://schemas.openxmlformats.org/officeDocument/2006/custom-properties',
+    'CORE_PROPS_REL':   'http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties',
+    'CORE_PROPS':       'http://schemas.openxmlformats.org/package/2006/metadata/core-properties',
+    'DC':               'http://purl.org/dc/elements/1.1/',
+    'DCTERMS':          'http://purl.org/dc/terms/',
+    'XSI':              'http://www.w3.org/2001/XMLSchema-instance',
+    'EXTENDED_PROPS_REL': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/extended-properties',
+    'EXTENDED_PROPS':   'http://schemas.openxmlformats.org/officeDocument/2006/extended-properties',
+    'HEADER_REL':       'http://schemas.openxmlformats.org/officeDocument/2006/relationships/header',
+    'FOOTER_REL':       'http://schemas.openxmlformats.org/officeDocument/2006/relationships/footer',
+    'WORDPROCESSINGML': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'XML':              'http://www.w3.org/XML/1998/namespace',
 }
 
 # this is used to hack around the required namespace prefix for xpath
@@ -28,6 +43,75 @@ NSMAP_CUSTOM_PROPERTIES = {
     'vt': NAMESPACES['VTYPES'],
 }
 
+NSMAP_CORE_PROPERTIES = {
+    'cp': NAMESPACES['CORE_PROPS'],
+    'dc': NAMESPACES['DC'],
+    'dcterms': NAMESPACES['DCTERMS'],
+    'xsi': NAMESPACES['XSI'],
+}
+
+NSMAP_EXTENDED_PROPERTIES = {
+    None: NAMESPACES['EXTENDED_PROPS'],
+    'vt': NAMESPACES['VTYPES'],
+}
+
+# Content types of the main document part and the MIME type of the
+# corresponding package
+MAIN_PART_MIME_TYPES = {
+    # WordprocessingML
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml':
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml':
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.template',
+    'application/vnd.ms-word.document.macroEnabled.main+xml':
+        'application/vnd.ms-word.document.macroEnabled.12',
+    'application/vnd.ms-word.template.macroEnabledTemplate.main+xml':
+        'application/vnd.ms-word.template.macroEnabled.12',
+    # SpreadsheetML
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml':
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.template.main+xml':
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.template',
+    'application/vnd.ms-excel.sheet.macroEnabled.main+xml':
+        'application/vnd.ms-excel.sheet.macroEnabled.12',
+    'application/vnd.ms-excel.template.macroEnabled.main+xml':
+        'application/vnd.ms-excel.template.macroEnabled.12',
+    # PresentationML
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml':
+        'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'application/vnd.openxmlformats-officedocument.presentationml.template.main+xml':
+        'application/vnd.openxmlformats-officedocument.presentationml.template',
+    'application/vnd.openxmlformats-officedocument.presentationml.slideshow.main+xml':
+        'application/vnd.openxmlformats-officedocument.presentationml.slideshow',
+    'application/vnd.ms-powerpoint.presentation.macroEnabled.main+xml':
+        'application/vnd.ms-powerpoint.presentation.macroEnabled.12',
+    'application/vnd.ms-powerpoint.template.macroEnabled.main+xml':
+        'application/vnd.ms-powerpoint.template.macroEnabled.12',
+    'application/vnd.ms-powerpoint.slideshow.macroEnabled.main+xml':
+        'application/vnd.ms-powerpoint.slideshow.macroEnabled.12',
+}
+
+# Content types of main parts that are WordprocessingML documents
+WORDPROCESSING_MAIN_CONTENT_TYPES = (
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml',
+    'application/vnd.ms-word.document.macroEnabled.main+xml',
+    'application/vnd.ms-word.template.macroEnabledTemplate.main+xml',
+)
+
 SUPPORTED_MIME_TYPES = (
     'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.template',
+    'application/vnd.ms-word.document.macroEnabled.12',
+    'application/vnd.ms-word.template.macroEnabled.12',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.template',
+    'application/vnd.ms-excel.sheet.macroEnabled.12',
+    'application/vnd.ms-excel.template.macroEnabled.12',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'application/vnd.openxmlformats-officedocument.presentationml.template',
+    'application/vnd.openxmlformats-officedocument.presentationml.slideshow',
+    'application/vnd.ms-powerpoint.presentation.macroEnabled.12',
+    'application/vnd.ms-powerpoint.template.macroEnabled.12',
+    'application/vnd.ms-powerpoint.slideshow.macroEnabled.12',
 )
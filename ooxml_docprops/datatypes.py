@@ -6,73 +6,531 @@ Relevant parts of standards:
   http://www.ecma-international.org/publications/standards/Ecma-376.htm
 """
 
+from base64 import b64decode
+from base64 import b64encode
+from config import NAMESPACES
 from datetime import date
 from datetime import datetime
 from datetime import time
+from decimal import Decimal
+from lxml import etree
 from lxml.etree import QName
+from uuid import UUID
 import iso8601
+import re
 
 
 INT_VTYPES = ('i1', 'i2', 'i3', 'i4', 'i8', 'int')
 STR_VTYPES = ('lpstr', 'lpwstr')
 
+# Value types allowed as base type of vectors and arrays
+VECTOR_BASE_TYPES = (
+    'variant', 'i1', 'i2', 'i4', 'i8', 'ui1', 'ui2', 'ui4', 'ui8', 'r4',
+    'r8', 'lpstr', 'lpwstr', 'bstr', 'date', 'filetime', 'bool', 'cy',
+    'error', 'clsid')
+ARRAY_BASE_TYPES = (
+    'variant', 'i1', 'i2', 'i4', 'int', 'ui1', 'ui2', 'ui4', 'uint', 'r4',
+    'r8', 'decimal', 'bstr', 'date', 'bool', 'error', 'cy')
+
+CLSID_PATTERN = re.compile(
+    r'^\{[0-9A-Fa-f]{8}(-[0-9A-Fa-f]{4}){3}-[0-9A-Fa-f]{12}\}$')
+
 
 class ValidationError(Exception):
     """
     """
 
 
+class VariantType(object):
+    """A value type and the conversion of its values from and to value
+    type nodes.
+
+    Every instance knows the Python types it accepts, so values are
+    validated without dispatching on the type of the value.
+    """
+
+    python_types = ()
+
+    def __init__(self, name):
+        self.name = name
+        self.tag = '{%s}%s' % (NAMESPACES['VTYPES'], name)
+        # bool is a subclass of int, but no valid number
+        self._accepts_bool = bool in self.python_types
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.name)
+
+    def is_valid(self, value):
+        return (isinstance(value, self.python_types) and
+                (self._accepts_bool or not isinstance(value, bool)))
+
+    def validate(self, value):
+        if not self.is_valid(value):
+            raise ValidationError(
+                "Value %r of type %s is invalid for value type %s" % (
+                    value, type(value).__name__, self.name))
+
+    def to_text(self, value):
+        return unicode(value)
+
+    def from_text(self, text):
+        return text
+
+    def describes(self, node):
+        """Tell whether `node` is a value type node of this type.
+        """
+        return node.tag == self.tag
+
+    def add_node(self, parent, value):
+        """Append a value type node representing `value` to `parent`.
+        """
+        node = etree.SubElement(parent, self.tag)
+        node.text = self.to_text(value)
+        return node
+
+    def convert_node(self, node):
+        return self.from_text(node.text)
+
+    def node_equals(self, node, value):
+        """Tell whether the value type node `node` already represents
+        `value`.
+        """
+        return (self.describes(node) and len(node) == 0 and
+                (node.text or u'') == (self.to_text(value) or u''))
+
+
+class IntegerType(VariantType):
+
+    python_types = (int, long)
+
+    def __init__(self, name, minimum, maximum):
+        super(IntegerType, self).__init__(name)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def is_valid(self, value):
+        return (super(IntegerType, self).is_valid(value) and
+                self.minimum <= value <= self.maximum)
+
+    def from_text(self, text):
+        return int(text)
+
+
+class FloatType(VariantType):
+
+    python_types = (float, int, long)
+
+    def to_text(self, value):
+        value = float(value)
+        if value != value:
+            return u'NaN'
+        elif value in (float('inf'), float('-inf')):
+            return value > 0 and u'INF' or u'-INF'
+        return unicode(repr(value))
+
+    def from_text(self, text):
+        return float(text)
+
+
+class DecimalType(VariantType):
+
+    python_types = (Decimal, int, long)
+
+    def is_valid(self, value):
+        return (super(DecimalType, self).is_valid(value) and
+                Decimal(value).is_finite())
+
+    def to_text(self, value):
+        # Never use the exponent notation
+        return u'{:f}'.format(Decimal(value))
+
+    def from_text(self, text):
+        return Decimal(text.strip())
+
+
+class CurrencyType(DecimalType):
+    """A fixed point number with four decimal places, scaled to a 64 bit
+    integer.
+    """
+
+    LIMIT = Decimal('922337203685477.5808')
+
+    def is_valid(self, value):
+        if not super(CurrencyType, self).is_valid(value):
+            return False
+        value = Decimal(value)
+        return (value.as_tuple().exponent >= -4 and
+                -self.LIMIT <= value < self.LIMIT)
+
+
+class StringType(VariantType):
+
+    python_types = (basestring,)
+
+    def to_text(self, value):
+        # Always pass unicode to lxml API
+        if isinstance(value, str):
+            value = value.decode('utf-8')
+        return value
+
+    def from_text(self, text):
+        return text or u''
+
+
+class BoolType(VariantType):
+
+    python_types = (bool,)
+
+    def to_text(self, value):
+        return value and u'true' or u'false'
+
+    def from_text(self, text):
+        return text.strip().lower() in ('true', '1')
+
+
+class DateTimeType(VariantType):
+
+    python_types = (datetime,)
+
+    def to_text(self, value):
+        return value.isoformat()
+
+    def from_text(self, text):
+        # use None as default timezone to avoid converting naive to aware
+        return iso8601.parse_date(text, default_timezone=None)
+
+
+class DateType(DateTimeType):
+
+    python_types = (datetime, date)
+
+    def to_text(self, value):
+        if not isinstance(value, datetime):
+            value = datetime.combine(value, time())
+        return value.isoformat()
+
+
+class ErrorType(VariantType):
+    """A 32 bit status code, written in hexadecimal notation.
+    """
+
+    python_types = (int, long)
+
+    def is_valid(self, value):
+        return (super(ErrorType, self).is_valid(value) and
+                0 <= value <= 0xFFFFFFFF)
+
+    def to_text(self, value):
+        return u'0x%08X' % value
+
+    def from_text(self, text):
+        return int(text.strip(), 16)
+
+
+class ClsidType(VariantType):
+
+    python_types = (basestring, UUID)
+
+    def is_valid(self, value):
+        if isinstance(value, UUID):
+            return True
+        return (super(ClsidType, self).is_valid(value) and
+                CLSID_PATTERN.match(value) is not None)
+
+    def to_text(self, value):
+        if isinstance(value, UUID):
+            value = '{%s}' % value
+        return unicode(value).upper()
+
+
+class EmptyType(VariantType):
+
+    python_types = (type(None),)
+
+    def to_text(self, value):
+        return None
+
+    def from_text(self, text):
+        return None
+
+
+class BinaryType(VariantType):
+    """Binary data, written base64 encoded.
+    """
+
+    python_types = (str, bytearray)
+
+    def to_text(self, value):
+        return b64encode(bytes(value)).decode('ascii')
+
+    def from_text(self, text):
+        return b64decode(text or '')
+
+
+class VersionedStreamType(BinaryType):
+    """A binary stream with a version GUID. Values are (version, data)
+    tuples.
+    """
+
+    python_types = (tuple,)
+
+    def is_valid(self, value):
+        return (isinstance(value, tuple) and len(value) == 2 and
+                CLSID.is_valid(value[0]) and
+                isinstance(value[1], BinaryType.python_types))
+
+    def add_node(self, parent, value):
+        version, data = value
+        node = etree.SubElement(parent, self.tag)
+        node.attrib['version'] = CLSID.to_text(version)
+        node.text = super(VersionedStreamType, self).to_text(data)
+        return node
+
+    def convert_node(self, node):
+        return (node.get('version'), self.from_text(node.text))
+
+    def node_equals(self, node, value):
+        version, data = value
+        return (self.describes(node) and
+                node.get('version') == CLSID.to_text(version) and
+                (node.text or u'') ==
+                super(VersionedStreamType, self).to_text(data))
+
+
+class VariantElementType(VariantType):
+    """The element of a vector or array whose base type is variant, which
+    wraps a value type node determined by the type of the value.
+    """
+
+    python_types = (object,)
+
+    def __init__(self):
+        super(VariantElementType, self).__init__('variant')
+        self._accepts_bool = True
+
+    def is_valid(self, value):
+        try:
+            return infer_variant_type(value).is_valid(value)
+        except ValidationError:
+            return False
+
+    def add_node(self, parent, value):
+        node = etree.SubElement(parent, self.tag)
+        infer_variant_type(value).add_node(node, value)
+        return node
+
+    def convert_node(self, node):
+        return convert_node(node[0])
+
+    def node_equals(self, node, value):
+        return (self.describes(node) and len(node) == 1 and
+                infer_variant_type(value).node_equals(node[0], value))
+
+
+class SequenceType(VariantType):
+    """A vector or array of values of the value type `base_type`.
+    Values are lists or tuples.
+    """
+
+    python_types = (list, tuple)
+
+    def __init__(self, name, base_type):
+        super(SequenceType, self).__init__(name)
+        self.base_type = base_type
+
+    def __repr__(self):
+        return '<%s %s of %s>' % (
+            type(self).__name__, self.name, self.base_type.name)
+
+    def is_valid(self, value):
+        return (super(SequenceType, self).is_valid(value) and
+                all(self.base_type.is_valid(item) for item in value))
+
+    def describes(self, node):
+        return (node.tag == self.tag and
+                node.get('baseType') == self.base_type.name)
+
+    def set_size(self, node, size):
+        node.attrib['size'] = str(size)
+
+    def add_node(self, parent, value):
+        node = etree.SubElement(parent, self.tag)
+        self.set_size(node, len(value))
+        node.attrib['baseType'] = self.base_type.name
+        for item in value:
+            self.base_type.add_node(node, item)
+        return node
+
+    def convert_node(self, node):
+        return [self.base_type.convert_node(child) for child in node]
+
+    def node_equals(self, node, value):
+        return (self.describes(node) and len(node) == len(value) and
+                all(self.base_type.node_equals(child, item)
+                    for child, item in zip(node, value)))
+
+
+class VectorType(SequenceType):
+
+    def __init__(self, base_type):
+        super(VectorType, self).__init__('vector', base_type)
+
+
+class ArrayType(SequenceType):
+    """A one-dimensional array with a lower bound of 0.
+    """
+
+    def __init__(self, base_type):
+        super(ArrayType, self).__init__('array', base_type)
+
+    def set_size(self, node, size):
+        node.attrib['lBounds'] = '0'
+        node.attrib['uBounds'] = str(size - 1)
+
+
+BOOL = BoolType('bool')
+CLSID = ClsidType('clsid')
+DECIMAL = DecimalType('decimal')
+DATE = DateType('date')
+EMPTY = EmptyType('empty')
+FILETIME = DateTimeType('filetime')
+I4 = IntegerType('i4', -2 ** 31, 2 ** 31 - 1)
+I8 = IntegerType('i8', -2 ** 63, 2 ** 63 - 1)
+LPWSTR = StringType('lpwstr')
+R8 = FloatType('r8')
+VARIANT = VariantElementType()
+
+VARIANT_TYPES = dict((vtype.name, vtype) for vtype in (
+    IntegerType('i1', -2 ** 7, 2 ** 7 - 1),
+    IntegerType('i2', -2 ** 15, 2 ** 15 - 1),
+    I4,
+    I8,
+    IntegerType('int', -2 ** 31, 2 ** 31 - 1),
+    IntegerType('ui1', 0, 2 ** 8 - 1),
+    IntegerType('ui2', 0, 2 ** 16 - 1),
+    IntegerType('ui4', 0, 2 ** 32 - 1),
+    IntegerType('ui8', 0, 2 ** 64 - 1),
+    IntegerType('uint', 0, 2 ** 32 - 1),
+    FloatType('r4'),
+    R8,
+    DECIMAL,
+    CurrencyType('cy'),
+    StringType('lpstr'),
+    LPWSTR,
+    StringType('bstr'),
+    BOOL,
+    DATE,
+    FILETIME,
+    ErrorType('error'),
+    CLSID,
+    EMPTY,
+    EmptyType('null'),
+    BinaryType('blob'),
+    BinaryType('oblob'),
+    BinaryType('stream'),
+    BinaryType('ostream'),
+    BinaryType('storage'),
+    BinaryType('ostorage'),
+    VersionedStreamType('vstream'),
+    VARIANT,
+))
+
+_TYPES_BY_TAG = dict((vtype.tag, vtype) for vtype in VARIANT_TYPES.values())
+_SEQUENCE_TYPES = {}
+
+
+def get_variant_type(name, base_type=None):
+    """Return the VariantType called `name`. Vectors and arrays also need
+    the name of their `base_type`.
+    """
+    if name in ('vector', 'array'):
+        key = (name, base_type)
+        if key not in _SEQUENCE_TYPES:
+            allowed = name == 'vector' and VECTOR_BASE_TYPES or \
+                ARRAY_BASE_TYPES
+            if base_type not in allowed:
+                raise ValueError(
+                    "Invalid base type for %s: %s" % (name, base_type))
+            cls = name == 'vector' and VectorType or ArrayType
+            _SEQUENCE_TYPES[key] = cls(VARIANT_TYPES[base_type])
+        return _SEQUENCE_TYPES[key]
+
+    if name not in VARIANT_TYPES or name == 'variant':
+        raise ValueError("Unknown value type: %s" % name)
+    return VARIANT_TYPES[name]
+
+
+def variant_type_of(vt_node):
+    """Return the VariantType of the value type node `vt_node`.
+    """
+    vtype = _TYPES_BY_TAG.get(vt_node.tag)
+    if vtype is not None:
+        return vtype
+
+    tag = QName(vt_node).localname
+    if tag in ('vector', 'array'):
+        try:
+            return get_variant_type(tag, vt_node.get('baseType'))
+        except ValueError:
+            pass
+    raise ValidationError("Unsupported value type: %s" % tag)
+
+
+def convert_node(vt_node):
+    """Convert a value type node to a native Python data type.
+    """
+    return variant_type_of(vt_node).convert_node(vt_node)
+
+
+def infer_variant_type(value):
+    """Determine the VariantType used for `value` by default, given its
+    Python data type.
+    """
+    if isinstance(value, basestring):
+        return LPWSTR
+    elif isinstance(value, bool):
+        return BOOL
+    elif isinstance(value, (int, long)):
+        return I4.is_valid(value) and I4 or I8
+    elif isinstance(value, float):
+        return R8
+    elif isinstance(value, datetime):
+        return FILETIME
+    elif isinstance(value, date):
+        return DATE
+    elif isinstance(value, Decimal):
+        return DECIMAL
+    elif isinstance(value, UUID):
+        return CLSID
+    elif value is None:
+        return EMPTY
+    elif isinstance(value, (list, tuple)):
+        base_types = set(infer_variant_type(item).name for item in value)
+        if len(base_types) == 1 and \
+                list(base_types)[0] in VECTOR_BASE_TYPES:
+            return get_variant_type('vector', base_types.pop())
+        return get_variant_type('vector', 'variant')
+    raise ValidationError("Unsupported value type: %r" % (value,))
+
+
 class DataTypeConverter(object):
 
     def convert_value(self, value):
         """Convert Python data types to the corresponding unicode
         representation to be set as the text of the value type node.
         """
-        if isinstance(value, basestring):
-            # Always pass unicode to lxml API
-            if isinstance(value, str):
-                value = value.decode('utf-8')
-            return value
-        elif isinstance(value, bool):
-            return value and u'true' or u'false'
-        elif isinstance(value, int):
-            return str(value).encode('utf-8')
-        elif isinstance(value, datetime):
-            return value.isoformat()
-        else:
-            raise Exception("Unsupported value type")
+        return infer_variant_type(value).to_text(value)
 
     def convert_node(self, vt_node):
         """Convert a value type node to a native Python data type.
         """
-        tag = QName(vt_node).localname
-        value = vt_node.text
-        if tag in STR_VTYPES:
-            return value
-        elif tag in INT_VTYPES:
-            return int(value)
-        elif tag == 'bool':
-            return value.lower() == 'true'
-        elif tag == 'filetime':
-            # use None as default timezone to avoid converting naive to aware
-            return iso8601.parse_date(value, default_timezone=None)
-        else:
-            raise Exception("Unsupported value type: %s" % tag)
+        return convert_node(vt_node)
 
     def determine_value_type(self, value):
         """Given a Python data type, determine the correct value type node
         type.
         """
-        if isinstance(value, basestring):
-            return 'lpwstr'
-        elif isinstance(value, bool):
-            return 'bool'
-        elif isinstance(value, int):
-            return 'i4'
-        elif isinstance(value, datetime):
-            return 'filetime'
-        else:
-            raise Exception("Unsupported value type: %r" % value)
+        return infer_variant_type(value).name
 
 
 class DataTypeValidator(object):
@@ -81,19 +539,59 @@ class DataTypeValidator(object):
         """Given a value type node and a native Python data type, check if
         the two types are compatible.
         """
-        tag = QName(vt_node).localname
-        if tag in STR_VTYPES:
-            required_type = basestring
-        elif tag == 'bool':
-            required_type = bool
-        elif tag in INT_VTYPES:
-            required_type = int
-        elif tag == 'filetime':
-            required_type = datetime
-        else:
-            raise Exception("Unsupported value type: %s" % tag)
-
-        if not isinstance(value, required_type):
+        if not variant_type_of(vt_node).is_valid(value):
             raise ValidationError(
                 "Value %r of type %s is invalid for node %s" % (
                     value, type(value), vt_node))
+
+
+class SimpleTypeConverter(object):
+    """Converter and validator for the values of core and extended
+    properties, which are plain XML Schema types instead of value types.
+
+    Relevant parts of standards:
+    - ECMA-376 4th edition Part 2: Section 11 (Core Properties)
+    - ECMA-376 4th edition Part 1: Section 22.2 (Extended Properties)
+    """
+
+    PYTHON_TYPES = {
+        'string': basestring,
+        'int': int,
+        'bool': bool,
+        'datetime': datetime,
+    }
+
+    def validate(self, type_name, value):
+        required_type = self.PYTHON_TYPES[type_name]
+        if (not isinstance(value, required_type) or
+                (type_name == 'int' and isinstance(value, bool))):
+            raise ValidationError(
+                "Value %r of type %s is invalid for type %s" % (
+                    value, type(value), type_name))
+        if type_name == 'datetime' and value.tzinfo is None:
+            # Values are read back in UTC, which naive ones may not be
+            raise ValidationError(
+                "Datetime %r has no timezone" % (value,))
+
+    def convert_value(self, type_name, value):
+        """Convert a Python value to the text of a property node.
+        """
+        self.validate(type_name, value)
+        if type_name == 'datetime':
+            # W3CDTF in UTC, with whole seconds
+            value = value.astimezone(iso8601.UTC).replace(tzinfo=None)
+            return value.replace(microsecond=0).isoformat() + 'Z'
+        return DataTypeConverter().convert_value(value)
+
+    def convert_text(self, type_name, text):
+        """Convert the text of a property node to a Python value.
+        """
+        if not text:
+            return None if type_name != 'string' else u''
+        if type_name == 'int':
+            return int(text)
+        elif type_name == 'bool':
+            return text.strip().lower() in ('true', '1')
+        elif type_name == 'datetime':
+            return iso8601.parse_date(text, default_timezone=None)
+        return text
@@ -0,0 +1,135 @@
+"""Non-blocking access to documents for event loop based applications.
+
+All blocking ZIP and XML work is run on a bounded pool of threads and
+every operation immediately returns a `concurrent.futures.Future`. These
+futures can be chained with callbacks or handed to an event loop, e.g.
+with `asyncio.wrap_future`.
+"""
+
+from concurrent.futures import CancelledError
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.reader import iter_custom_properties
+import threading
+
+
+class OperationFuture(Future):
+    """A future that can also cancel an operation that is already running.
+
+    `cancel` returns True unless the operation has finished or is already
+    committing its changes, `cancel_requested` then tells that it has been
+    cancelled. A pending operation is cancelled right away. A running one
+    is stopped at its next checkpoint and its changes are discarded, the
+    future then fails with CancelledError, while `cancelled` stays False
+    as for every future that was running.
+    """
+
+    def __init__(self):
+        super(OperationFuture, self).__init__()
+        self.cancel_event = threading.Event()
+        self._cancel_lock = threading.Lock()
+        self._committing = False
+
+    @property
+    def cancel_requested(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        if super(OperationFuture, self).cancel():
+            self.cancel_event.set()
+            return True
+        with self._cancel_lock:
+            if self.done() or self._committing:
+                return False
+            self.cancel_event.set()
+        return True
+
+    def check_cancelled(self):
+        """Raise CancelledError if the operation has been cancelled.
+        """
+        if self.cancel_event.is_set():
+            raise CancelledError()
+
+    def start_commit(self):
+        """Check for cancellation a last time before the operation commits
+        its changes, cancelling fails from now on.
+        """
+        with self._cancel_lock:
+            self.check_cancelled()
+            self._committing = True
+
+
+def _update_document(future, document, metadata):
+    def update(doc):
+        doc.update_properties(metadata)
+    return _process_document(future, document, update, in_memory=True)
+
+
+def _process_document(future, document, callback, **kwargs):
+    with OOXMLDocument(document, **kwargs) as doc:
+        future.check_cancelled()
+        result = callback(doc)
+        # Leaving the block with an exception discards the working copy
+        future.start_commit()
+    return result
+
+
+def _read_properties(future, document):
+    properties = []
+    for item in iter_custom_properties(document):
+        future.check_cancelled()
+        properties.append(item)
+    return properties
+
+
+class PropertiesExecutor(object):
+    """Runs document operations on at most `max_workers` threads.
+    """
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _submit(self, func, *args, **kwargs):
+        future = OperationFuture()
+        self._executor.submit(self._run, future, func, args, kwargs)
+        return future
+
+    def _run(self, future, func, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(future, *args, **kwargs)
+            future.start_commit()
+        except BaseException as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def update_properties(self, document, metadata):
+        """Counterpart of `ooxml_docprops.update_properties`.
+        """
+        return self._submit(_update_document, document, metadata)
+
+    def read_properties(self, document):
+        """Counterpart of `ooxml_docprops.read_properties`, the future's
+        result is a list of (name, value) tuples.
+        """
+        return self._submit(_read_properties, document)
+
+    def process_document(self, document, callback, **kwargs):
+        """Open `document` as OOXMLDocument with `kwargs` in a worker thread
+        and call `callback` with it. The document is packed after the
+        callback returned, unless the operation has been cancelled. The
+        future's result is the callback's return value.
+        """
+        return self._submit(_process_document, document, callback, **kwargs)
@@ -0,0 +1,342 @@
+"""Export the custom properties of many documents for analysis.
+
+Every property becomes one row with the columns path, name, pid, vtype and
+value, documents without custom properties one row with only the path.
+Exports are resumable: documents are recorded in a checkpoint file once
+their rows have been written, and skipped when the export is run again.
+"""
+
+from abc import ABCMeta
+from abc import abstractmethod
+from base64 import b64encode
+from bulk import bulk_read_properties
+from datetime import date
+from datetime import datetime
+from decimal import Decimal
+import csv
+import iso8601
+import json
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+BINARY_VTYPES = ('blob', 'oblob', 'stream', 'ostream', 'storage', 'ostorage')
+COLUMNS = ('path', 'name', 'pid', 'vtype', 'value')
+
+
+def to_json_value(vtype, value):
+    """Convert the typed value of a property of value type `vtype` to a
+    value that can be serialized to JSON.
+    """
+    if vtype in BINARY_VTYPES:
+        return b64encode(value)
+    elif vtype == 'vstream':
+        return {'version': value[0], 'data': b64encode(value[1])}
+    return _to_json_value(value)
+
+
+def _to_json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    elif isinstance(value, Decimal):
+        return u'{:f}'.format(value)
+    elif isinstance(value, list):
+        return [_to_json_value(item) for item in value]
+    return value
+
+
+def to_text(vtype, value):
+    """Convert the typed value of a property to text, with the notation of
+    JSON for booleans, vectors and arrays.
+    """
+    value = to_json_value(vtype, value)
+    if value is None:
+        return u''
+    elif isinstance(value, basestring):
+        return value
+    elif isinstance(value, float):
+        return repr(value)
+    elif isinstance(value, (int, long)) and not isinstance(value, bool):
+        return unicode(value)
+    return json.dumps(value)
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+class Checkpoint(object):
+    """The paths of the documents already exported, stored in a text file
+    with one UTF-8 encoded path per line.
+
+    Along with the paths the size of the output they have been written to
+    is recorded as `position`, in lines starting with a NUL character,
+    which paths cannot contain.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+        self.position = None
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    # An incomplete last line is not a completed document
+                    if not line.endswith('\n'):
+                        continue
+                    if line.startswith('\x00'):
+                        self.position = int(line[1:-1])
+                    else:
+                        self.completed.add(line[:-1])
+
+    def __contains__(self, path):
+        return _encode(path) in self.completed
+
+    def add(self, paths, position=None):
+        """Durably record `paths` as completed, and `position` as the size
+        of the output containing them.
+        """
+        if not paths and position is None:
+            return
+        paths = [_encode(path) for path in paths]
+        with open(self.path, 'ab') as f:
+            # The position goes first, a crash in between must not record
+            # documents beyond it
+            if position is not None:
+                f.write('\x00%d\n' % position)
+            for path in paths:
+                f.write(path + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.completed.update(paths)
+        if position is not None:
+            self.position = position
+
+
+class ExportWriter(object):
+    """Writes the property records of documents to `path`.
+
+    Rows only need to be durable once `flush` has been called. Existing
+    output is appended to, so interrupted exports can be resumed.
+    """
+
+    __metaclass__ = ABCMeta
+
+    def __init__(self, path):
+        self.path = path
+
+    @abstractmethod
+    def write(self, path, records):
+        """Write the rows of the document at `path`.
+        """
+
+    def flush(self):
+        pass
+
+    def tell(self):
+        """Return the size of the flushed output, or None if output cannot
+        be truncated.
+        """
+        return None
+
+    def truncate(self, size):
+        """Discard the output after `size`, such as a partial row left by
+        an interrupted export.
+        """
+
+    def close(self):
+        self.flush()
+
+
+class FileExportWriter(ExportWriter):
+    """Writes all rows to a single file, which is appended to.
+    """
+
+    def __init__(self, path):
+        super(FileExportWriter, self).__init__(path)
+        self.file = open(path, 'ab')
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def tell(self):
+        self.file.flush()
+        return os.fstat(self.file.fileno()).st_size
+
+    def truncate(self, size):
+        self.file.flush()
+        if os.fstat(self.file.fileno()).st_size > size:
+            self.file.truncate(size)
+
+    def close(self):
+        super(FileExportWriter, self).close()
+        self.file.close()
+
+
+class CSVWriter(FileExportWriter):
+
+    def __init__(self, path):
+        super(CSVWriter, self).__init__(path)
+        self.writer = csv.writer(self.file)
+        if not self.tell():
+            self.writer.writerow(COLUMNS)
+
+    def write(self, path, records):
+        if not records:
+            self.writer.writerow([_encode(path), '', '', '', ''])
+        for record in records:
+            self.writer.writerow([
+                _encode(path), _encode(record.name), record.pid,
+                record.vtype, _encode(to_text(record.vtype, record.value))])
+
+
+class JSONLinesWriter(FileExportWriter):
+    """Writes one JSON object per document, with the path and the list of
+    its properties.
+    """
+
+    def write(self, path, records):
+        self.file.write(json.dumps({
+            'path': path,
+            'properties': [{'name': record.name,
+                            'pid': record.pid,
+                            'vtype': record.vtype,
+                            'value': to_json_value(record.vtype,
+                                                   record.value)}
+                           for record in records],
+        }) + '\n')
+
+
+class ParquetWriter(ExportWriter):
+    """Writes a directory of Parquet files, one per flush.
+
+    Besides the value as text, values are stored in a typed column for
+    integers, floats, booleans and datetimes, datetimes in UTC.
+    """
+
+    def __init__(self, path):
+        if pyarrow is None:
+            raise RuntimeError('Exporting to Parquet requires pyarrow')
+        super(ParquetWriter, self).__init__(path)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.rows = []
+        self.part = len([fn for fn in os.listdir(path)
+                         if fn.endswith('.parquet')])
+
+    def write(self, path, records):
+        if not records:
+            self.rows.append(
+                (path, u'', None, None, u'', None, None, None, None))
+        for record in records:
+            value = record.value
+            self.rows.append((
+                path, record.name, record.pid, record.vtype,
+                to_text(record.vtype, value),
+                value if _is_int64(value) else None,
+                value if isinstance(value, float) else None,
+                value if isinstance(value, bool) else None,
+                _to_utc(value) if isinstance(value, datetime) else None))
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = zip(*self.rows)
+        table = pyarrow.Table.from_arrays([
+            pyarrow.array(columns[0], pyarrow.string()),
+            pyarrow.array(columns[1], pyarrow.string()),
+            pyarrow.array(columns[2], pyarrow.int64()),
+            pyarrow.array(columns[3], pyarrow.string()),
+            pyarrow.array(columns[4], pyarrow.string()),
+            pyarrow.array(columns[5], pyarrow.int64()),
+            pyarrow.array(columns[6], pyarrow.float64()),
+            pyarrow.array(columns[7], pyarrow.bool_()),
+            pyarrow.array(columns[8], pyarrow.timestamp('us')),
+        ], names=list(COLUMNS) + [
+            'int_value', 'float_value', 'bool_value', 'datetime_value'])
+
+        # Files only appear once complete, so a crash leaves no broken part
+        filename = os.path.join(self.path, 'part-%05d.parquet' % self.part)
+        pyarrow.parquet.write_table(table, filename + '.tmp')
+        os.rename(filename + '.tmp', filename)
+        self.part += 1
+        self.rows = []
+
+
+def _is_int64(value):
+    return (isinstance(value, (int, long)) and not isinstance(value, bool)
+            and -2 ** 63 <= value < 2 ** 63)
+
+
+def _to_utc(value):
+    # Naive datetimes are stored as they are
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(iso8601.UTC).replace(tzinfo=None)
+
+
+WRITERS = {
+    'csv': CSVWriter,
+    'jsonl': JSONLinesWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def guess_format(path):
+    """Guess the export format from the extension of `path`.
+    """
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('json', 'jsonl', 'ndjson'):
+        return 'jsonl'
+    elif extension in WRITERS:
+        return extension
+    return None
+
+
+def export_properties(paths, writer, checkpoint=None, processes=None,
+                      batch_size=100):
+    """Read the custom properties of the documents at `paths` in parallel
+    and write them with the ExportWriter `writer`.
+
+    Documents recorded in the Checkpoint `checkpoint` are skipped. The
+    writer is flushed and the exported documents are added to the
+    checkpoint every `batch_size` documents, so an interrupted export can
+    be resumed with at most one batch of documents exported twice. Output
+    written after the last checkpoint is discarded when resuming. Failed
+    documents are not recorded and retried on the next run.
+
+    A ReadResult is yielded for every document read.
+    """
+    if checkpoint is not None:
+        if checkpoint.position is not None:
+            writer.truncate(checkpoint.position)
+        else:
+            checkpoint.add([], writer.tell())
+        paths = (path for path in paths if path not in checkpoint)
+
+    pending = []
+    try:
+        for result in bulk_read_properties(paths, processes=processes):
+            if result.success:
+                writer.write(result.path, result.records)
+                pending.append(result.path)
+                if len(pending) >= batch_size:
+                    _commit(writer, checkpoint, pending)
+                    pending = []
+            yield result
+    finally:
+        _commit(writer, checkpoint, pending)
+
+
+def _commit(writer, checkpoint, paths):
+    writer.flush()
+    if checkpoint is not None and paths:
+        checkpoint.add(paths, writer.tell())
@@ -0,0 +1,358 @@
+"""Refresh of the results of DOCPROPERTY fields in WordprocessingML parts.
+
+Word keeps the last result of every field in the document and only updates
+it when asked to. After custom properties have been changed, the results of
+the DOCPROPERTY fields referring to them are replaced here, so documents
+show the new values right away. Both simple fields (w:fldSimple) and
+complex fields (w:fldChar) are refreshed, formatting switches are not
+applied.
+
+Parts are transformed block by block (paragraphs, tables) with an
+incremental parser, so memory usage does not grow with the size of the
+part.
+
+Relevant parts of standards:
+- ECMA-376 4th edition Part 1: Section 17.16 (Fields and Hyperlinks)
+"""
+
+from config import NAMESPACES
+from copy import deepcopy
+from datetime import date
+from datetime import datetime
+from decimal import Decimal
+from lxml import etree
+import re
+
+
+W = NAMESPACES['WORDPROCESSINGML']
+BODY_TAG = '{%s}body' % W
+BR_TAG = '{%s}br' % W
+CR_TAG = '{%s}cr' % W
+FLD_CHAR_TAG = '{%s}fldChar' % W
+FLD_SIMPLE_TAG = '{%s}fldSimple' % W
+INSTR_TEXT_TAG = '{%s}instrText' % W
+P_TAG = '{%s}p' % W
+R_TAG = '{%s}r' % W
+RPR_TAG = '{%s}rPr' % W
+SDT_TAG = '{%s}sdt' % W
+T_TAG = '{%s}t' % W
+TAB_TAG = '{%s}tab' % W
+TBL_TAG = '{%s}tbl' % W
+FLD_CHAR_TYPE_ATTR = '{%s}fldCharType' % W
+INSTR_ATTR = '{%s}instr' % W
+XML_SPACE_ATTR = '{%s}space' % NAMESPACES['XML']
+
+# Run content making up the visible result of a field
+CONTENT_TAGS = (T_TAG, TAB_TAG, BR_TAG, CR_TAG)
+
+# Elements the content of a part is written in
+BLOCK_TAGS = (P_TAG, TBL_TAG, SDT_TAG)
+
+XML_DECLARATION = \
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+
+DOCPROPERTY_RE = re.compile(r'^\s*DOCPROPERTY\s+(?:"([^"]*)"|(\S+))',
+                            re.IGNORECASE | re.UNICODE)
+
+# Namespace declarations come first in start tags serialized by libxml2
+_START_TAG_RE = re.compile(r'<([^\s/>]+)((?:\s+xmlns(?::[^\s=]+)?="[^"]*")*)')
+_DECLARATION_RE = re.compile(r'\s+xmlns(?::([^\s=]+))?="([^"]*)"')
+
+
+def format_field_value(value):
+    """Return the text shown for `value` as result of a DOCPROPERTY field.
+    """
+    if value is None:
+        return u''
+    elif isinstance(value, bool):
+        return u'Y' if value else u'N'
+    elif isinstance(value, datetime):
+        return value.date().isoformat()
+    elif isinstance(value, date):
+        return value.isoformat()
+    elif isinstance(value, float) and value.is_integer():
+        return unicode(int(value))
+    elif isinstance(value, float):
+        return repr(value).decode('ascii')
+    elif isinstance(value, Decimal):
+        return u'{:f}'.format(value)
+    elif isinstance(value, list):
+        return u', '.join(format_field_value(item) for item in value)
+    elif isinstance(value, str):
+        return value.decode('utf-8')
+    return unicode(value)
+
+
+class _Field(object):
+    """A field in the document, whose result is replaced by `text` unless
+    it is None.
+    """
+
+    def __init__(self, text=None, in_result=False):
+        self.instruction = []
+        self.text = text
+        self.in_result = in_result
+        self.written = False
+
+
+class FieldRefresher(object):
+    """Replaces the results of the DOCPROPERTY fields of one part.
+
+    `values` maps the names of properties to their new values, which are
+    converted to text with `format_value`. The blocks of the part must be
+    passed to `refresh` in document order, so fields spanning several
+    blocks are refreshed as well. Afterwards `changed` tells whether any
+    result has been changed.
+    """
+
+    def __init__(self, values, format_value=format_field_value):
+        # Word looks up property names case-insensitive
+        self.texts = dict((name.lower(), format_value(value))
+                          for name, value in values.items())
+        self.changed = False
+        self._fields = []
+
+    def lookup(self, instruction):
+        """Return the new result of the field with the instruction
+        `instruction`, or None if it is not refreshed.
+        """
+        match = DOCPROPERTY_RE.match(instruction)
+        if match is None:
+            return None
+        name = match.group(1) if match.group(1) is not None \
+            else match.group(2)
+        return self.texts.get(name.lower())
+
+    def refresh(self, block):
+        """Refresh the fields in the element `block` in place.
+        """
+        if not self._fields and next(
+                block.iter(FLD_SIMPLE_TAG, FLD_CHAR_TAG), None) is None:
+            return
+        skipped = set()
+        for node in list(block.iter(FLD_SIMPLE_TAG, FLD_CHAR_TAG,
+                                    INSTR_TEXT_TAG, *CONTENT_TAGS)):
+            if node in skipped:
+                continue
+            elif node.tag == FLD_SIMPLE_TAG:
+                skipped.update(self._refresh_simple_field(node))
+            elif node.tag == FLD_CHAR_TAG:
+                self._handle_field_char(node)
+            elif node.tag == INSTR_TEXT_TAG:
+                if self._fields and not self._fields[-1].in_result:
+                    self._fields[-1].instruction.append(node.text or u'')
+            else:
+                field = self._replacing_field()
+                if field is not None:
+                    self._replace_content(field, node)
+
+    def _replacing_field(self):
+        # Results of nested fields are part of the result of the outer one
+        for field in self._fields:
+            if field.in_result and field.text is not None:
+                return field
+        return None
+
+    def _refresh_simple_field(self, node):
+        if self._replacing_field() is not None:
+            return ()
+        text = self.lookup(node.get(INSTR_ATTR, u''))
+        if text is None:
+            return ()
+
+        field = _Field(text, in_result=True)
+        descendants = list(node.iter())
+        for content in list(node.iter(*CONTENT_TAGS)):
+            self._replace_content(field, content)
+        if not field.written:
+            run = etree.SubElement(node, R_TAG)
+            self._set_text(etree.SubElement(run, T_TAG), text)
+        return descendants
+
+    def _handle_field_char(self, node):
+        kind = node.get(FLD_CHAR_TYPE_ATTR)
+        if kind == 'begin':
+            self._fields.append(_Field())
+        elif not self._fields:
+            # Unbalanced field characters are left alone
+            return
+        elif kind == 'separate':
+            field = self._fields[-1]
+            field.in_result = True
+            field.text = self.lookup(u''.join(field.instruction))
+        elif kind == 'end':
+            field = self._fields.pop()
+            if not field.in_result:
+                field.text = self.lookup(u''.join(field.instruction))
+            if field.text is not None and not field.written and \
+                    self._replacing_field() is None:
+                self._insert_result(field, node)
+
+    def _replace_content(self, field, node):
+        if node.tag == T_TAG and not field.written:
+            field.written = True
+            self._set_text(node, field.text)
+        else:
+            node.getparent().remove(node)
+            self.changed = True
+
+    def _insert_result(self, field, end_char):
+        """Insert the result of a field without any before its end.
+        """
+        run = end_char.getparent()
+        if run.tag != R_TAG:
+            return
+        if not field.in_result:
+            separate = etree.SubElement(run.getparent(), R_TAG)
+            etree.SubElement(separate, FLD_CHAR_TAG).set(
+                FLD_CHAR_TYPE_ATTR, 'separate')
+            run.addprevious(separate)
+
+        result = etree.SubElement(run.getparent(), R_TAG)
+        properties = run.find(RPR_TAG)
+        if properties is not None:
+            result.append(deepcopy(properties))
+        self._set_text(etree.SubElement(result, T_TAG), field.text)
+        run.addprevious(result)
+        field.written = True
+        self.changed = True
+
+    def _set_text(self, node, text):
+        if (node.text or u'') == text:
+            return
+        node.text = text
+        if text != text.strip():
+            node.set(XML_SPACE_ATTR, 'preserve')
+        self.changed = True
+
+
+def _start_tag(element):
+    """Return the start tag of `element`, declaring all namespaces in
+    scope.
+    """
+    shallow = etree.Element(element.tag, dict(element.attrib),
+                            nsmap=element.nsmap)
+    xml = etree.tostring(shallow, encoding='utf-8')
+    return xml[:-len('/>')] + '>'
+
+
+def _declarations(xml):
+    match = _START_TAG_RE.match(xml)
+    return set(declaration.groups() for declaration in
+               _DECLARATION_RE.finditer(match.group(2)))
+
+
+class _PartWriter(object):
+    """Writes a part block by block while it is being parsed.
+
+    Blocks are written and freed once they are complete, along with any
+    other content preceding them. The root and the body enclosing the
+    blocks are written as start tags before their first block and end tags
+    at the end, each of them with the namespace declarations in scope.
+    """
+
+    def __init__(self, target, refresher):
+        self.target = target
+        self.refresher = refresher
+        # Open containers with their end tag and declared namespaces
+        self.containers = []
+        self._written = None
+        self._kept = {}
+
+    def write_block(self, block):
+        container = block.getparent()
+        self._open(container)
+        self._flush(container, until=block)
+        self._write(block)
+        # The current element must stay in the tree while parsing
+        block.clear()
+        self._written = block
+
+    def finish(self, root):
+        self._open(root)
+        while self.containers:
+            container, end_tag, _ = self.containers.pop()
+            self._kept = {}
+            self._flush(container)
+            self.target.write(end_tag)
+            if container.getparent() is not None:
+                container.getparent().remove(container)
+
+    def _open(self, container):
+        if any(opened is container for opened, _, _ in self.containers):
+            return
+        if container.getparent() is not None:
+            self._open(container.getparent())
+            self._flush(container.getparent(), until=container)
+        start_tag = _start_tag(container)
+        declared = _declarations(start_tag)
+        if self.containers:
+            start_tag = self._strip(start_tag)
+        self.target.write(start_tag)
+        self.containers.append(
+            (container,
+             '</%s>' % _START_TAG_RE.match(start_tag).group(1),
+             declared))
+        self._kept = {}
+
+    def _flush(self, container, until=None):
+        """Write and remove the children of `container` preceding `until`.
+        """
+        # The parser reads ahead, so there may be many children after
+        # `until` already
+        if until is None:
+            children = list(container)
+        else:
+            children = []
+            child = until.getprevious()
+            while child is not None:
+                children.append(child)
+                child = child.getprevious()
+            children.reverse()
+        for child in children:
+            if child is not self._written:
+                self._write(child)
+            container.remove(child)
+
+    def _write(self, element):
+        self.refresher.refresh(element)
+        self.target.write(self._strip(
+            etree.tostring(element, encoding='utf-8', with_tail=False)))
+
+    def _strip(self, xml):
+        # Blocks are written without declarations their container has,
+        # siblings mostly repeat the same declarations
+        match = _START_TAG_RE.match(xml)
+        declarations = match.group(2)
+        kept = self._kept.get(declarations)
+        if kept is None:
+            declared = self.containers[-1][2]
+            kept = self._kept[declarations] = ''.join(
+                declaration.group(0) for declaration in
+                _DECLARATION_RE.finditer(declarations)
+                if declaration.groups() not in declared)
+        return xml[:match.start(2)] + kept + xml[match.end(2):]
+
+
+def refresh_fields(source, target, values, format_value=format_field_value):
+    """Copy the part (document, header or footer) read from the file-like
+    object `source` to `target`, refreshing the DOCPROPERTY fields of the
+    properties in `values` on the way.
+
+    Returns True if the result of any field has changed, otherwise the
+    copy is equivalent to the original and can be discarded.
+    """
+    refresher = FieldRefresher(values, format_value)
+    writer = _PartWriter(target, refresher)
+    target.write(XML_DECLARATION)
+    # Only the ends of blocks are reported, nested ones are written with
+    # the block enclosing them
+    context = etree.iterparse(source, tag=BLOCK_TAGS, huge_tree=True)
+    for _, element in context:
+        container = element.getparent()
+        if container.getparent() is None or (
+                container.tag == BODY_TAG and
+                container.getparent().getparent() is None):
+            writer.write_block(element)
+    writer.finish(context.root)
+    return refresher.changed
@@ -0,0 +1,92 @@
+"""Timings and counters of operations on documents.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import logging
+import time
+
+
+logger = logging.getLogger('ooxml_docprops')
+
+PHASES = ('unzip', 'parse', 'mutate', 'serialize', 'zip', 'commit')
+
+
+class OperationStats(object):
+    """Timings and counters of one operation on the document `document`.
+
+    Time is accounted to the innermost phase being measured, so the
+    timings of the PHASES do not overlap.
+    """
+
+    def __init__(self, document=None):
+        self.document = document
+        self.timings = OrderedDict((phase, 0.0) for phase in PHASES)
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.entries_copied = 0
+        self.entries_recompressed = 0
+        self.failed = False
+        self.duration = None
+        self._started = time.time()
+        self._phases = []
+        self._read_entries = set()
+
+    @contextmanager
+    def measure(self, phase):
+        """Account the time spent in the block to `phase`.
+        """
+        now = time.time()
+        if self._phases:
+            outer, start = self._phases[-1]
+            self.timings[outer] += now - start
+        self._phases.append((phase, now))
+        try:
+            yield
+        finally:
+            now = time.time()
+            phase, start = self._phases.pop()
+            self.timings[phase] += now - start
+            if self._phases:
+                # Resume the outer phase
+                self._phases[-1] = (self._phases[-1][0], now)
+
+    def count_read(self, entry, size):
+        """Count the `size` bytes of the ZIP entry `entry` as read, every
+        entry of the source is only counted once.
+        """
+        if entry not in self._read_entries:
+            self._read_entries.add(entry)
+            self.bytes_read += size
+
+    def finish(self):
+        self.duration = time.time() - self._started
+
+    def as_dict(self):
+        return {
+            'document': self.document,
+            'duration': self.duration,
+            'failed': self.failed,
+            'timings': dict(self.timings),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'entries_copied': self.entries_copied,
+            'entries_recompressed': self.entries_recompressed,
+        }
+
+
+def log_stats(stats, logger=logger, level=logging.DEBUG):
+    """Log `stats` as a structured record, with the stats as dict in the
+    `ooxml_stats` attribute of the log record.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    record = stats.as_dict()
+    logger.log(
+        level, '%s %s in %.4fs (%s), %d bytes read, %d bytes written, '
+        '%d entries recompressed',
+        record['failed'] and 'Failed' or 'Processed', stats.document,
+        stats.duration or 0.0,
+        ', '.join('%s %.4fs' % item for item in stats.timings.items()),
+        stats.bytes_read, stats.bytes_written, stats.entries_recompressed,
+        extra={'ooxml_stats': record})
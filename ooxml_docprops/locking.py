@@ -0,0 +1,165 @@
+"""Advisory locks to serialize updates of the same document by several
+processes.
+
+Documents are locked through a separate lock file next to them, since the
+documents themselves are replaced by every atomic update. Lock files are
+locked with `fcntl.flock` and removed by the holder before releasing the
+lock, so they only exist while a document is in use. Whoever has been
+waiting on a removed file notices and starts over with a new one.
+
+Where fcntl is not available, holding the lock means having created the
+lock file. Lock files left behind by crashed processes are broken once they
+are older than `stale_after` seconds.
+"""
+
+import errno
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class LockTimeout(Exception):
+    """Raised if a document could not be locked within the timeout.
+    """
+
+
+class ConcurrentModificationError(Exception):
+    """Raised if a document has been changed by someone else since it was
+    read, so writing it would discard their changes.
+    """
+
+
+def file_identity(path):
+    """Return what identifies the current version of the file at `path`,
+    which changes with every write to it and every atomic replacement, or
+    None if there is no such file.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as exc:
+        if exc.errno != errno.ENOENT:
+            raise
+        return None
+    return (stat.st_size, stat.st_mtime, stat.st_ino)
+
+
+def get_lock_path(path):
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, '.%s.lock' % filename)
+
+
+class DocumentLock(object):
+    """An exclusive advisory lock of the document at `path`, held by at
+    most one process or thread at a time.
+
+    Acquiring waits at most `timeout` seconds, forever if it is None, and
+    fails immediately if it is 0. Locks are only respected by other users
+    of DocumentLock. Without fcntl, locks held longer than `stale_after`
+    seconds are considered stale and broken.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, path, timeout=None, stale_after=3600):
+        self.path = os.path.abspath(path)
+        self.lock_path = get_lock_path(self.path)
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    @property
+    def locked(self):
+        return self._fd is not None
+
+    def acquire(self):
+        assert not self.locked, 'lock already acquired'
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+
+        while True:
+            if self._try_acquire(blocking=deadline is None):
+                return
+            if deadline is not None and time.time() >= deadline:
+                raise LockTimeout('Timed out locking %s' % self.path)
+            time.sleep(self.poll_interval)
+
+    def _try_acquire(self, blocking):
+        if fcntl is None:
+            return self._try_create()
+
+        while True:
+            fd = os.open(self.lock_path, os.O_WRONLY | os.O_CREAT)
+            try:
+                if blocking:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as exc:
+                os.close(fd)
+                if exc.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+                return False
+            except:
+                os.close(fd)
+                raise
+
+            # The previous holder may have removed the file meanwhile
+            if _same_file(fd, self.lock_path):
+                self._fd = fd
+                return True
+            os.close(fd)
+
+    def _try_create(self):
+        try:
+            self._fd = os.open(self.lock_path,
+                               os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+            self._break_stale_lock()
+            return False
+        return True
+
+    def _break_stale_lock(self):
+        try:
+            stat = os.stat(self.lock_path)
+            if time.time() - stat.st_mtime > self.stale_after:
+                os.remove(self.lock_path)
+        except OSError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+
+    def release(self):
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        if fcntl is None:
+            # Without fcntl lock files only exist while they are held
+            os.close(fd)
+            os.remove(self.lock_path)
+        else:
+            # Removed while still locked, see _try_acquire
+            os.remove(self.lock_path)
+            os.close(fd)
+
+
+def _same_file(fd, path):
+    try:
+        stat = os.stat(path)
+    except OSError as exc:
+        if exc.errno != errno.ENOENT:
+            raise
+        return False
+    return os.fstat(fd).st_ino == stat.st_ino
@@ -5,62 +5,443 @@ Relevant parts of standards:
   http://www.ecma-international.org/publications/standards/Ecma-376.htm
 """
 
-from os.path import abspath
+from binascii import hexlify
+from cache import invalidate
+from instrumentation import OperationStats
+from instrumentation import log_stats
+from io import BytesIO
+from locking import ConcurrentModificationError
+from locking import DocumentLock
+from locking import file_identity
 from zipfile import ZipFile
-from zip_utils import zipdir
-import config
+from zip_utils import as_zip_source
+from zip_utils import is_path
+from zip_utils import rewrite_zip
+import errno
+import logging
 import os
 import shutil
 import tempfile
 
 
+logger = logging.getLogger(__name__)
+
+
+# fsync policies for committing a package in place
+FSYNC_NONE = 'none'  # leave flushing to the operating system
+FSYNC_FILE = 'file'  # flush the new file before it replaces the original
+FSYNC_FULL = 'full'  # additionally flush the directory after replacing
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_FILE, FSYNC_FULL)
+
+
 class OOXMLPackage(object):
-    def __init__(self, zipped_path, read_only=False):
-        self.zipped_path = abspath(zipped_path)
+    """An OOXML Package that can be modified part by part.
+
+    By default the package is extracted into a temporary working directory.
+    With `in_memory` set, nothing is extracted. Parts are read straight from
+    the ZIP file on demand and modified parts are kept in memory until the
+    package is packed again.
+
+    The package is either given as path, or as bytes, bytearray, memoryview
+    or seekable file-like object. A path is modified in place unless
+    `output` is given, a path or writable stream to which the packed
+    package is written instead, leaving the source untouched. Without
+    `output`, packages not given as path are packed into memory, use
+    `getvalue` to retrieve the result.
+
+    `fsync` is one of the FSYNC_POLICIES and controls the durability of
+    packages written to a path.
+
+    The timings and counters of the operation are collected in `stats`, an
+    OperationStats, which is passed to the callable `on_stats` once the
+    package has been packed or closed. By default they are logged.
+
+    The working directory is left behind for inspection if `keep_workdir`
+    is set. Packages keep all their state to themselves, so different
+    packages can be used from different threads at once.
+
+    A path modified in place is only replaced if it has not been changed
+    by anyone else since it was read, otherwise packing raises
+    ConcurrentModificationError. This check is best-effort, a change right
+    before the replacement can still be lost. With `locking` set, the path
+    is locked with a DocumentLock from reading until it has been replaced,
+    so concurrent updates of the same document wait for each other, at most
+    `lock_timeout` seconds before raising LockTimeout, and none is lost.
+    """
+
+    def __init__(self, zipped_path, read_only=False, in_memory=False,
+                 output=None, fsync=FSYNC_FILE, on_stats=log_stats,
+                 keep_workdir=False, locking=False, lock_timeout=None):
+        assert fsync in FSYNC_POLICIES, 'unknown fsync policy %r' % fsync
+        self._source = as_zip_source(zipped_path)
+        if isinstance(self._source, basestring):
+            self.zipped_path = self._source
+        else:
+            self.zipped_path = None
+        self._output = output
+        self.output_path = None
+        if output is not None and is_path(output):
+            self.output_path = os.path.abspath(output)
+            if self.zipped_path is not None and \
+                    os.path.exists(self.output_path) and \
+                    os.path.samefile(self.zipped_path, self.output_path):
+                raise ValueError('The output must not be the source itself')
+        self._packed_data = None
+        self.changed = None
         self._read_only = read_only
+        self.in_memory = in_memory
+        self.fsync = fsync
+        self.stats = OperationStats(self.zipped_path or self.output_path)
+        self.on_stats = on_stats
+        self._in_place = (self.zipped_path is not None and not read_only
+                          and output is None)
+        self._source_identity = None
+        self._lock = None
+        if locking and self._in_place:
+            self._lock = DocumentLock(self.zipped_path, lock_timeout)
 
         self._unpacked = False
-        self.remove_workdir = True
-
-        if config.DEBUG:
-            self.remove_workdir = False
+        self._zipfile = None
+        self._part_data = {}
+        self.workdir = None
+        self.modified_parts = set()
+        self._dirty_parts = []
+        self.remove_workdir = not keep_workdir
 
     def __enter__(self):
-        self.workdir = tempfile.mkdtemp(prefix='docxtemp')
-        self.unpack()
+        if not self.in_memory:
+            self.workdir = tempfile.mkdtemp(prefix='docxtemp')
+        try:
+            if self._lock is not None:
+                self._lock.acquire()
+            if self._in_place:
+                # Taken before reading, so changes made while reading are
+                # detected as well
+                self._source_identity = file_identity(self.zipped_path)
+            self.unpack()
+            self.load()
+        except:
+            self.stats.failed = True
+            self.close()
+            self._report_stats()
+            raise
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if not self._read_only:
-            self.pack()
+        self.stats.failed = exc_type is not None
+        try:
+            # Changes are discarded if the block was left with an exception
+            if not self._read_only and exc_type is None:
+                self.pack()
+            else:
+                self.close()
+        except:
+            self.stats.failed = True
+            raise
+        finally:
+            self._report_stats()
+
+    def _report_stats(self):
+        self.stats.finish()
+        if self.on_stats is not None:
+            self.on_stats(self.stats)
 
     def unpack(self):
         """Unpack a zipped OOXML Package into a working directory.
+
+        In memory mode only the ZIP's central directory is read.
         """
-        if config.DEBUG:
-            print "Unpacking to %s" % self.workdir
-        with ZipFile(self.zipped_path, 'r') as z:
-            z.extractall(self.workdir)
+        with self.stats.measure('unzip'):
+            if self.in_memory:
+                self._zipfile = ZipFile(self._source, 'r')
+            else:
+                logger.debug('Unpacking to %s', self.workdir)
+                with ZipFile(self._source, 'r') as z:
+                    z.extractall(self.workdir)
+                    for zinfo in z.infolist():
+                        self.stats.count_read(zinfo.filename,
+                                              zinfo.compress_size)
         self._unpacked = True
 
+    def load(self):
+        """Load the parts needed to work with the unpacked package.
+        """
+
+    def close(self):
+        """Discard the unpacked package without packing it again.
+        """
+        self._close_zipfile()
+        self._remove_workdir()
+        for data in self._part_data.values():
+            if hasattr(data, 'close'):
+                data.close()
+        self._part_data = {}
+        self.modified_parts = set()
+        self._dirty_parts = []
+        self._unpacked = False
+        if self._lock is not None:
+            self._lock.release()
+
+    def _remove_workdir(self):
+        if self.workdir is not None and self.remove_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _close_zipfile(self):
+        if self._zipfile is not None:
+            self._zipfile.close()
+            self._zipfile = None
+
+    def get_part_path(self, partname):
+        """Return the path of the part `partname` in the working directory.
+        """
+        assert not self.in_memory, 'in memory packages have no workdir!'
+        return os.path.join(self.workdir, *partname.split('/'))
+
+    def has_part(self, partname):
+        if not self.in_memory:
+            return os.path.exists(self.get_part_path(partname))
+        if partname in self._part_data:
+            return True
+        return partname in self._zipfile.NameToInfo
+
+    def read_part(self, partname):
+        """Return the contents of the part `partname`.
+        """
+        if not self.in_memory:
+            with open(self.get_part_path(partname), 'rb') as f:
+                return f.read()
+        if partname in self._part_data:
+            data = self._part_data[partname]
+            if hasattr(data, 'read'):
+                data.seek(0)
+                return data.read()
+            return data
+        with self.stats.measure('unzip'):
+            data = self._zipfile.read(partname)
+        self.stats.count_read(
+            partname, self._zipfile.getinfo(partname).compress_size)
+        return data
+
+    def open_part(self, partname):
+        """Return a file-like object to read the contents of the part
+        `partname` incrementally, without loading it into memory at once.
+        """
+        if not self.in_memory:
+            return open(self.get_part_path(partname), 'rb')
+        if partname in self._part_data:
+            data = self._part_data[partname]
+            if hasattr(data, 'read'):
+                data.seek(0)
+                return _StreamView(data)
+            return BytesIO(data)
+        self.stats.count_read(
+            partname, self._zipfile.getinfo(partname).compress_size)
+        return self._zipfile.open(partname)
+
+    def write_part(self, partname, data):
+        """Replace the contents of the part `partname` with `data`, or add
+        a new part if it does not exist yet.
+
+        `data` are bytes or a seekable file-like object, which is copied
+        chunk by chunk when the package is packed. The package takes over
+        file-like objects and closes them.
+        """
+        if self.in_memory:
+            previous = self._part_data.get(partname)
+            if hasattr(previous, 'close') and previous is not data:
+                previous.close()
+            self._part_data[partname] = data
+        else:
+            path = self.get_part_path(partname)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as f:
+                if hasattr(data, 'read'):
+                    data.seek(0)
+                    shutil.copyfileobj(data, f)
+                    data.close()
+                else:
+                    f.write(data)
+        self.mark_modified(partname)
+
+    def mark_modified(self, partname):
+        """Mark the part `partname` as changed so it is included when the
+        package is packed again.
+        """
+        self.modified_parts.add(partname)
+
+    def register_dirty_part(self, part):
+        """Register a parsed part whose tree has changed, so it gets
+        serialized when the package is flushed.
+        """
+        self._dirty_parts.append(part)
+
+    def flush(self):
+        """Serialize all parsed parts that have changed since they were
+        loaded or last flushed.
+        """
+        dirty_parts, self._dirty_parts = self._dirty_parts, []
+        for part in dirty_parts:
+            if part.dirty:
+                part.write_xml_file()
+
+    def getvalue(self):
+        """Return the packed package as bytes if it has been packed into
+        memory, None otherwise.
+        """
+        return self._packed_data
+
+    @property
+    def is_modified(self):
+        """Tell whether any part has been changed since unpacking.
+        """
+        return bool(self.modified_parts or
+                    any(part.dirty for part in self._dirty_parts))
+
     def pack(self):
         """Pack an unpacked OOXML Package into a ZIP file again.
 
-        First, create a temporary directory and zip up the contents of
-        self.workdir into a new ZIP in that location.
-        If that was successful, move the newly created ZIP to the
-        location of the original input file, overwriting it.
+        A copy of the original ZIP is written, where only the modified parts
+        are compressed again. All other entries are copied over from the
+        original without recompressing them.
+        The copy goes to the `output` stream if there is one, or into memory
+        if the package was not given as path. Paths, either the `output` or
+        the original input file, are written to a temporary file next to
+        them first and, if that was successful, atomically renamed to
+        replace them. If no part has been changed, the original is left
+        alone entirely.
+
+        Afterwards `changed` tells whether any part had been changed.
         """
+        replacements = {}
+        try:
+            self.flush()
+            self.changed = bool(self.modified_parts)
+            for partname in self.modified_parts:
+                replacements[partname] = self._get_replacement(partname)
+            self._close_zipfile()
 
-        temp_zip_location = tempfile.mkdtemp(prefix='docx_temp_zip')
-        temp_zip_path = os.path.join(temp_zip_location, 'output.zip')
-        if config.DEBUG:
-            print "Packing to %s..." % temp_zip_path
-        zipdir(self.workdir, temp_zip_path)
-        if config.DEBUG:
-            print "Moving to %s" % self.zipped_path
-        shutil.move(temp_zip_path, self.zipped_path)
-        shutil.rmtree(temp_zip_location)
-        if self.remove_workdir:
-            shutil.rmtree(self.workdir)
-        self._unpacked = False
+            if self.output_path is not None:
+                self._write_to_path(self.output_path, replacements)
+            elif self._output is not None:
+                self._rewrite(self._output, replacements)
+            elif self.zipped_path is None:
+                output = BytesIO()
+                self._rewrite(output, replacements)
+                self._packed_data = output.getvalue()
+            elif self.changed:
+                self._write_to_path(self.zipped_path, replacements,
+                                    expected_identity=self._source_identity)
+        finally:
+            for data in replacements.values():
+                if hasattr(data, 'close'):
+                    data.close()
+            self.close()
+
+    def _get_replacement(self, partname):
+        # Modified parts are passed on as streams where possible, so large
+        # parts are never loaded into memory at once
+        if not self.in_memory:
+            return self.open_part(partname)
+        data = self._part_data[partname]
+        if hasattr(data, 'read'):
+            data.seek(0)
+        return data
+
+    def _rewrite(self, fileobj, replacements):
+        with self.stats.measure('zip'):
+            rewrite_zip(self._source, fileobj, replacements, stats=self.stats)
+
+    def _write_to_path(self, path, replacements, expected_identity=None):
+        with self.stats.measure('commit'):
+            write_atomically(
+                path, lambda f: self._rewrite(f, replacements),
+                fsync=self.fsync, mode_source=self.zipped_path,
+                expected_identity=expected_identity)
+
+
+class _StreamView(object):
+    """Reads a stream that belongs to the package, closing the view leaves
+    the stream open.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+    def close(self):
+        pass
+
+
+def write_atomically(path, write, fsync=FSYNC_FILE, mode_source=None,
+                     expected_identity=None):
+    """Write the file at `path` by calling `write` with a temporary file,
+    which then atomically replaces `path` if writing was successful.
+
+    The mode of an existing file at `path` is kept, new files get the mode
+    of the file at `mode_source` if given, otherwise the default mode for
+    new files given by the umask. `fsync` is one of the
+    FSYNC_POLICIES. If `expected_identity` is given, `path` is only replaced
+    if its `file_identity` still matches, ConcurrentModificationError is
+    raised otherwise. Without a lock held, another writer may still replace
+    `path` between this check and the rename.
+    """
+    # The temporary file is created in the same directory, so it is on
+    # the same filesystem and can replace the target with a rename.
+    directory, filename = os.path.split(path)
+    fd, temp_zip_path = create_temp_file(directory, '.%s.' % filename)
+    try:
+        logger.debug('Packing to %s', temp_zip_path)
+        with os.fdopen(fd, 'w+b') as f:
+            write(f)
+            if fsync != FSYNC_NONE:
+                f.flush()
+                os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temp_zip_path)
+        elif mode_source is not None:
+            shutil.copymode(mode_source, temp_zip_path)
+
+        if expected_identity is not None and \
+                file_identity(path) != expected_identity:
+            raise ConcurrentModificationError(
+                '%s has been changed since it was read' % path)
+        logger.debug('Moving to %s', path)
+        os.rename(temp_zip_path, path)
+    except:
+        os.remove(temp_zip_path)
+        raise
+
+    if fsync == FSYNC_FULL:
+        fsync_directory(directory)
+    invalidate(path)
+
+
+def create_temp_file(directory, prefix, suffix='.tmp'):
+    """Create a new file in `directory` like `tempfile.mkstemp`, but with
+    the mode new files get by the umask instead of 0600. Returns the file
+    descriptor and path.
+    """
+    flags = os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    while True:
+        path = os.path.join(directory, '%s%s%s' % (
+            prefix, hexlify(os.urandom(6)), suffix))
+        try:
+            # The umask is applied by the operating system, reading it
+            # with os.umask would briefly change it for all threads
+            return os.open(path, flags, 0666), path
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+
+def fsync_directory(directory):
+    """Flush the directory entries of `directory` to disk.
+    """
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
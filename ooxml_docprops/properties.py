@@ -4,74 +4,165 @@ Relevant parts of standards:
 - ECMA-376 4th edition Part 1: Section 13.2 (Package Structure)
 - ECMA-376 4th edition Part 1: Section 15.2.12.2 (Custom File Properties Part)
 - ECMA-376 4th edition Part 1: Section 22.3 (Custom Properties)
+- ECMA-376 4th edition Part 1: Section 22.2 (Extended Properties)
+- ECMA-376 4th edition Part 2: Section 11 (Core Properties)
 
 http://www.ecma-international.org/publications/standards/Ecma-376.htm
 """
 
+from collections import OrderedDict
 from config import CONTENT_TYPES_PATH
+from config import CORE_PROPERTY_CONTENT_TYPE
+from config import CORE_PROPERTY_DEFAULT_PATH
 from config import CUSTOM_PROPERTY_CONTENT_TYPE
 from config import CUSTOM_PROPERTY_DEFAULT_PATH
 from config import CUSTOM_PROPERTY_FMTID
+from config import EXTENDED_PROPERTY_CONTENT_TYPE
+from config import EXTENDED_PROPERTY_DEFAULT_PATH
+from config import MAIN_PART_MIME_TYPES
 from config import NAMESPACES
 from config import NSMAP
+from config import NSMAP_CORE_PROPERTIES
 from config import NSMAP_CUSTOM_PROPERTIES
-from datatypes import DataTypeConverter
-from datatypes import DataTypeValidator
+from config import NSMAP_EXTENDED_PROPERTIES
+from config import RELATIONSHIPS_PATH
+from config import WORDPROCESSING_MAIN_CONTENT_TYPES
+from datatypes import SimpleTypeConverter
+from datatypes import convert_node
+from datatypes import infer_variant_type
+from datatypes import variant_type_of
+from fields import format_field_value
+from fields import refresh_fields
+from instrumentation import log_stats
+from io import BytesIO
 from lxml import etree
+from lxml.etree import QName
 from ooxml_docprops.datatypes import ValidationError
+from package import FSYNC_FILE
 from package import OOXMLPackage
-import config
+from reader import OVERRIDE_TAG
+from reader import PROPERTY_TAG
+from reader import RELATIONSHIP_TAG
+from reader import find_content_type
+from schema import PropertySchema
+from tempfile import SpooledTemporaryFile
+import logging
 import os
+import posixpath
 import re
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# Parts with refreshed fields are kept in memory up to this size
+FIELDS_SPOOL_SIZE = 8 * 1024 * 1024
+
+
+_local = threading.local()
+
+
+def get_parser():
+    """Return the XML parser for parts of the current thread.
+
+    lxml serializes all parsing with the same parser object, so every
+    thread gets its own one to parse parts in parallel.
+    """
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        # Allow text nodes larger than 10 MB, as in very large string
+        # properties
+        parser = _local.parser = etree.XMLParser(huge_tree=True)
+    return parser
 
 
 class Part(object):
     """An XML part of the OOXML document.
 
-    Represents one internal file of the OOXML document.
+    Represents one internal file of the OOXML document. Changes are only
+    applied to the parsed tree, the part is serialized once when the
+    package is packed.
     """
 
-    def __init__(self, path):
-        self.filepath = path
-        self.tree = etree.parse(open(self.filepath))
+    def __init__(self, package, partname, tree=None):
+        self.package = package
+        self.partname = partname
+        if tree is None:
+            data = package.read_part(partname)
+            with package.stats.measure('parse'):
+                tree = etree.parse(BytesIO(data), get_parser())
+        self.tree = tree
+        self.dirty = False
+
+    def mark_dirty(self):
+        if not self.dirty:
+            self.dirty = True
+            self.package.register_dirty_part(self)
 
     def write_xml_file(self):
-        xml = etree.tostring(self.tree, pretty_print=True,
-                             xml_declaration=True, encoding='utf-8')
-        with open(self.filepath, 'w') as f:
-            f.write(xml)
+        with self.package.stats.measure('serialize'):
+            xml = etree.tostring(self.tree, pretty_print=True,
+                                 xml_declaration=True, encoding='utf-8')
+        self.package.write_part(self.partname, xml)
+        self.dirty = False
 
 
 class CustomPropertiesPart(Part):
 
-    def __init__(self, docprops_path, force):
-        super(CustomPropertiesPart, self).__init__(docprops_path)
+    def __init__(self, package, partname, force, schema=None, tree=None):
+        super(CustomPropertiesPart, self).__init__(package, partname, tree)
 
-        self.converter = DataTypeConverter()
-        self.validator = DataTypeValidator()
         self.force = force
+        if schema is None:
+            schema = PropertySchema()
+        self.schema = schema
+        self._build_index()
+
+    def _build_index(self):
+        """Index the property nodes by name in one pass over the tree.
+
+        Names are not necessarily unique, all nodes of a name are indexed
+        and the first one is the property's value.
+        """
+        self._nodes = OrderedDict()
+        # No properties yet. Property IDs must start at 2 (sic!),
+        # so a maximum of 1 will lead to a new PID of 2.
+        self._max_pid = 1
+        for node in self.tree.getroot().iterchildren(PROPERTY_TAG):
+            self._nodes.setdefault(node.attrib['name'], []).append(node)
+            self._max_pid = max(self._max_pid, int(node.attrib['pid']))
 
     def set_property_value(self, name, value):
         property_node = self.get_property_node(name)
         value_type_node = property_node.getchildren()[0]
+        # The schema takes precedence over the type of the existing node
+        vtype = self.schema.get_variant_type(name)
 
         try:
-            self.validator.validate(value_type_node, value)
-            value = self.converter.convert_value(value)
-            value_type_node.text = value
+            if vtype is None:
+                vtype = variant_type_of(value_type_node)
+            elif not vtype.describes(value_type_node):
+                raise ValidationError(
+                    "Property %s is of value type %s instead of %s" % (
+                        name, QName(value_type_node).localname, vtype.name))
+            vtype.validate(value)
         except ValidationError:
-            if self.force:
-                property_node.remove(value_type_node)
-                self.add_value_node(property_node, value)
-            else:
+            if not self.force:
                 raise
+            vtype = self.schema.get_variant_type(name)
+        else:
+            if vtype.node_equals(value_type_node, value):
+                # Already up to date, leave the part untouched
+                return
 
-        self.write_xml_file()
+        property_node.remove(value_type_node)
+        self.add_value_node(property_node, value, vtype)
+        self.mark_dirty()
 
     def get_property_value(self, name):
         property_node = self.get_property_node(name)
         value_type_node = property_node.getchildren()[0]
-        value = self.converter.convert_node(value_type_node)
+        value = convert_node(value_type_node)
         return value
 
     def has_property(self, name):
@@ -79,140 +170,328 @@ class CustomPropertiesPart(Part):
         return prop is not None
 
     def get_property_names(self):
-        xpath = '/c:Properties/c:property'
-        nodes = self.tree.xpath(xpath, namespaces=NSMAP)
-        names = [n.attrib['name'] for n in nodes]
-        return names
+        return self._nodes.keys()
+
+    def get_properties(self):
+        """Return an ordered dict mapping all property names to their
+        values.
+        """
+        return OrderedDict(
+            (name, convert_node(nodes[0].getchildren()[0]))
+            for name, nodes in self._nodes.items())
 
     def get_max_pid(self):
-        xpath = '/c:Properties/c:property'
-        nodes = self.tree.xpath(xpath, namespaces=NSMAP)
-        if nodes == []:
-            # No properties yet. Property IDs must start at 2 (sic!),
-            # so returning 1 will lead to a new PID of 2.
-            return 1
-        max_pid = max(int(n.attrib['pid']) for n in nodes)
-        return max_pid
-
-    def add_property(self, name, value):
-        max_pid = self.get_max_pid()
-        new_pid = str(max_pid + 1)
+        return self._max_pid
+
+    def add_property(self, name, value, pid=None):
+        if pid is None:
+            pid = self.get_max_pid() + 1
+        new_pid = str(pid)
         root = self.tree.getroot()
 
-        new_property = etree.SubElement(root, '{%s}property' %
-                                        NAMESPACES['CUSTOM_PROPS'])
+        new_property = etree.SubElement(root, PROPERTY_TAG)
         new_property.attrib['fmtid'] = CUSTOM_PROPERTY_FMTID
         new_property.attrib['pid'] = new_pid
         new_property.attrib['name'] = name
 
-        self.add_value_node(new_property, value)
-        self.write_xml_file()
-
-    def add_value_node(self, parent_node, value):
-        value_type = self.converter.determine_value_type(value)
-        vt = etree.SubElement(parent_node, '{%s}%s' % (
-            NAMESPACES['VTYPES'], value_type))
-        self.validator.validate(vt, value)
-        value = self.converter.convert_value(value)
-        vt.text = value
+        try:
+            self.add_value_node(new_property, value,
+                                self.schema.get_variant_type(name))
+        except Exception:
+            root.remove(new_property)
+            raise
+        self._nodes[name] = [new_property]
+        self._max_pid = max(self._max_pid, pid)
+        self.mark_dirty()
+
+    def remove_property(self, name):
+        # Duplicates are removed as well, so the property is gone
+        for property_node in self._nodes.pop(name):
+            property_node.getparent().remove(property_node)
+        self.mark_dirty()
+
+    def add_value_node(self, parent_node, value, vtype=None):
+        """Add the value type node for `value` to `parent_node`. Without
+        `vtype` the value type is determined by the type of the value.
+        """
+        if vtype is None:
+            vtype = infer_variant_type(value)
+        vtype.validate(value)
+        vtype.add_node(parent_node, value)
 
     def update(self, metadata):
+        """Apply all properties in `metadata` to the tree.
+
+        PIDs for new properties are allocated once for the whole batch.
+        """
+        next_pid = self.get_max_pid() + 1
         for (key, value) in metadata.items():
-            self.update_property(key, value)
+            if self.update_property(key, value, pid=next_pid):
+                next_pid += 1
         return self
 
-    def update_property(self, name, value):
-        if self.has_property(name):
-            self.set_property_value(name, value)
-        else:
-            self.add_property(name, value)
+    def update_property(self, name, value, pid=None):
+        """Set the property `name` to `value`, adding it if necessary.
 
-        if config.DEBUG:
-            value = self.get_property_value(name)
-            print "Reading out property '%s' again:" % name
-            print "    %s = %s" % (name, value)
+        Returns True if a new property has been added.
+        """
+        added = not self.has_property(name)
+        if added:
+            self.add_property(name, value, pid=pid)
+        else:
+            self.set_property_value(name, value)
+        logger.debug('Set custom property %s to %r', name, value)
+        return added
 
     def get_property_node(self, name):
-        xpath = '/c:Properties/c:property[@name="%s"]' % name
-        nodes = self.tree.xpath(xpath, namespaces=NSMAP)
-        try:
-            prop = nodes[0]
-        except IndexError:
-            prop = None
-        return prop
+        nodes = self._nodes.get(name)
+        return nodes[0] if nodes else None
 
 
 class EmptyPropertiesPart(object):
 
-    def __init__(self, workdir, force):
-        self.workdir = workdir
+    def __init__(self, package, force, schema=None):
+        self.package = package
         self.force = force
+        self.schema = schema
 
     def update(self, metadata):
         if not metadata:
-            return
+            return self
+        return self.create().update(metadata)
 
+    def create(self):
+        """Add an empty custom properties part to the package and return
+        it as CustomPropertiesPart.
+        """
         self.add_properties_to_content_types()
         self.add_properties_to_relationships()
-        properties_path = self._create_custom_props_file()
+        partname = self._create_custom_props_file()
         return CustomPropertiesPart(
-            properties_path, self.force).update(metadata)
+            self.package, partname, self.force, self.schema)
 
     def add_properties_to_content_types(self):
-        OOXMLContentTypes(self.workdir).create_custom_props_content_types()
+        self.package.content_types.create_custom_props_content_types()
 
     def add_properties_to_relationships(self):
-        relationships = OOXMLRelationships(self.workdir)
+        relationships = self.package.relationships
         return relationships.create_custom_props_relationship()
 
     def _create_custom_props_file(self):
-        custom_props_path = os.path.join(self.workdir,
-                                         CUSTOM_PROPERTY_DEFAULT_PATH)
-        assert not os.path.exists(custom_props_path)
-
-        with open(custom_props_path, 'w') as f:
-            root = etree.Element('Properties', nsmap=NSMAP_CUSTOM_PROPERTIES)
-            xml = etree.tostring(etree.ElementTree(root), pretty_print=True,
-                                 xml_declaration=True, encoding='utf-8')
-            f.write(xml)
+        partname = CUSTOM_PROPERTY_DEFAULT_PATH
+        assert not self.package.has_part(partname)
 
-        return custom_props_path
+        root = etree.Element('Properties', nsmap=NSMAP_CUSTOM_PROPERTIES)
+        xml = etree.tostring(etree.ElementTree(root), pretty_print=True,
+                             xml_declaration=True, encoding='utf-8')
+        self.package.write_part(partname, xml)
+        return partname
 
     def get_property_names(self):
         return []
 
+    def get_properties(self):
+        return OrderedDict()
+
+
+class SimplePropertiesPart(Part):
+    """Base class for parts with one child node per property, holding a
+    value of a simple XML Schema type.
+
+    Subclasses define the known properties in FIELDS, mapping property
+    names to their (tag, type) and the details needed to create the part
+    if the package does not have it yet.
+    """
+
+    FIELDS = OrderedDict()
+    ROOT_TAG = None
+    ROOT_NSMAP = None
+    CONTENT_TYPE = None
+    RELATIONSHIP_TYPE = None
+    DEFAULT_PATH = None
+
+    def __init__(self, package, partname):
+        self.is_new = partname is None
+        if self.is_new:
+            # The part is only added to the package once it is modified
+            partname = self.DEFAULT_PATH
+            tree = etree.ElementTree(
+                etree.Element(self.ROOT_TAG, nsmap=self.ROOT_NSMAP))
+        else:
+            tree = None
+        super(SimplePropertiesPart, self).__init__(package, partname, tree)
+        self.converter = SimpleTypeConverter()
+
+    def mark_dirty(self):
+        if self.is_new:
+            self.is_new = False
+            self.package.content_types.add_override(
+                '/' + self.partname, self.CONTENT_TYPE)
+            self.package.relationships.create_relationship(
+                self.RELATIONSHIP_TYPE, self.partname)
+        super(SimplePropertiesPart, self).mark_dirty()
+
+    def _get_field(self, name):
+        try:
+            return self.FIELDS[name]
+        except KeyError:
+            raise ValidationError(
+                "Unknown property %r for %s" % (name, self.partname))
+
+    def get_property_names(self):
+        root = self.tree.getroot()
+        return [name for name, (tag, type_name) in self.FIELDS.items()
+                if root.find(tag) is not None]
+
+    def get_property_value(self, name):
+        tag, type_name = self._get_field(name)
+        node = self.tree.getroot().find(tag)
+        if node is None:
+            return None
+        return self.converter.convert_text(type_name, node.text)
+
+    def get_properties(self):
+        """Return an ordered dict mapping the names of all properties
+        present in the part to their values.
+        """
+        properties = OrderedDict()
+        for node in self.tree.getroot().iterchildren():
+            for name, (tag, type_name) in self.FIELDS.items():
+                if node.tag == tag:
+                    properties[name] = self.converter.convert_text(
+                        type_name, node.text)
+        return properties
+
+    def set_property_value(self, name, value):
+        tag, type_name = self._get_field(name)
+        text = self.converter.convert_value(type_name, value)
+        root = self.tree.getroot()
+        node = root.find(tag)
+        if node is None:
+            node = etree.SubElement(root, tag)
+            self.init_node(node, type_name)
+        elif node.text == text:
+            return
+        node.text = text
+        self.mark_dirty()
+
+    def init_node(self, node, type_name):
+        pass
+
+    def update(self, metadata):
+        for (key, value) in metadata.items():
+            self.set_property_value(key, value)
+        return self
+
+
+class CorePropertiesPart(SimplePropertiesPart):
+
+    FIELDS = OrderedDict([
+        (name, ('{%s}%s' % (NAMESPACES[ns], name), type_name))
+        for name, ns, type_name in (
+            ('title', 'DC', 'string'),
+            ('subject', 'DC', 'string'),
+            ('creator', 'DC', 'string'),
+            ('keywords', 'CORE_PROPS', 'string'),
+            ('description', 'DC', 'string'),
+            ('lastModifiedBy', 'CORE_PROPS', 'string'),
+            ('revision', 'CORE_PROPS', 'string'),
+            ('lastPrinted', 'CORE_PROPS', 'datetime'),
+            ('created', 'DCTERMS', 'datetime'),
+            ('modified', 'DCTERMS', 'datetime'),
+            ('category', 'CORE_PROPS', 'string'),
+            ('contentStatus', 'CORE_PROPS', 'string'),
+            ('identifier', 'DC', 'string'),
+            ('language', 'DC', 'string'),
+            ('version', 'CORE_PROPS', 'string'),
+        )])
+    ROOT_TAG = '{%s}coreProperties' % NAMESPACES['CORE_PROPS']
+    ROOT_NSMAP = NSMAP_CORE_PROPERTIES
+    CONTENT_TYPE = CORE_PROPERTY_CONTENT_TYPE
+    RELATIONSHIP_TYPE = NAMESPACES['CORE_PROPS_REL']
+    DEFAULT_PATH = CORE_PROPERTY_DEFAULT_PATH
+
+    def init_node(self, node, type_name):
+        if node.tag.startswith('{%s}' % NAMESPACES['DCTERMS']):
+            node.attrib['{%s}type' % NAMESPACES['XSI']] = 'dcterms:W3CDTF'
+
+
+class ExtendedPropertiesPart(SimplePropertiesPart):
+
+    FIELDS = OrderedDict([
+        (name, ('{%s}%s' % (NAMESPACES['EXTENDED_PROPS'], name), type_name))
+        for name, type_name in (
+            ('Template', 'string'),
+            ('Manager', 'string'),
+            ('Company', 'string'),
+            ('Pages', 'int'),
+            ('Words', 'int'),
+            ('Characters', 'int'),
+            ('PresentationFormat', 'string'),
+            ('Lines', 'int'),
+            ('Paragraphs', 'int'),
+            ('Slides', 'int'),
+            ('Notes', 'int'),
+            ('TotalTime', 'int'),
+            ('HiddenSlides', 'int'),
+            ('MMClips', 'int'),
+            ('ScaleCrop', 'bool'),
+            ('LinksUpToDate', 'bool'),
+            ('CharactersWithSpaces', 'int'),
+            ('SharedDoc', 'bool'),
+            ('HyperlinkBase', 'string'),
+            ('HyperlinksChanged', 'bool'),
+            ('DocSecurity', 'int'),
+            ('Application', 'string'),
+            ('AppVersion', 'string'),
+        )])
+    ROOT_TAG = '{%s}Properties' % NAMESPACES['EXTENDED_PROPS']
+    ROOT_NSMAP = NSMAP_EXTENDED_PROPERTIES
+    CONTENT_TYPE = EXTENDED_PROPERTY_CONTENT_TYPE
+    RELATIONSHIP_TYPE = NAMESPACES['EXTENDED_PROPS_REL']
+    DEFAULT_PATH = EXTENDED_PROPERTY_DEFAULT_PATH
+
 
 class OOXMLContentTypes(Part):
 
-    def __init__(self, workdir):
-        self.workdir = workdir
-        super(OOXMLContentTypes, self).__init__(
-            os.path.join(self.workdir, CONTENT_TYPES_PATH))
+    def __init__(self, package):
+        super(OOXMLContentTypes, self).__init__(package, CONTENT_TYPES_PATH)
         self.part_name = os.path.join('/', CUSTOM_PROPERTY_DEFAULT_PATH)
 
-    def has_custom_props_content_type(self):
-        xpath = '/c:Types/c:Override[@PartName="{}"]'.format(self.part_name)
-        return len(self.tree.xpath(xpath, namespaces=NSMAP)) > 0
+    def get_content_type(self, part_name):
+        """Return the content type of the part `part_name`, which is
+        given as absolute part name (e.g. '/word/document.xml').
+        """
+        return find_content_type(self.tree.getroot(), part_name)
 
-    def create_custom_props_content_types(self):
-        if self.has_custom_props_content_type():
+    def has_override(self, part_name):
+        for override in self.tree.getroot().iterchildren(OVERRIDE_TAG):
+            if override.attrib['PartName'] == part_name:
+                return True
+        return False
+
+    def add_override(self, part_name, content_type):
+        if self.has_override(part_name):
             return
 
         root = self.tree.getroot()
-        new_relationship = etree.SubElement(root, '{%s}Override' %
-                                            NAMESPACES['CONTENT_TYPES'])
-        new_relationship.attrib['ContentType'] = CUSTOM_PROPERTY_CONTENT_TYPE
-        new_relationship.attrib['PartName'] = self.part_name
+        new_override = etree.SubElement(root, OVERRIDE_TAG)
+        new_override.attrib['ContentType'] = content_type
+        new_override.attrib['PartName'] = part_name
 
-        self.write_xml_file()
+        self.mark_dirty()
+
+    def has_custom_props_content_type(self):
+        return self.has_override(self.part_name)
+
+    def create_custom_props_content_types(self):
+        self.add_override(self.part_name, CUSTOM_PROPERTY_CONTENT_TYPE)
 
 
 class OOXMLRelationships(Part):
 
-    def __init__(self, workdir):
-        self.workdir = workdir
-        super(OOXMLRelationships, self).__init__(
-            os.path.join(self.workdir, '_rels', '.rels'))
+    def __init__(self, package):
+        super(OOXMLRelationships, self).__init__(package, RELATIONSHIPS_PATH)
 
     @property
     def relationships(self):
@@ -227,15 +506,18 @@ class OOXMLRelationships(Part):
                 return rel
         return None
 
-    def get_custom_props_path(self):
-        custom_props_rel = self.get_by_type(NAMESPACES['CUSTOM_PROPS_REL'])
-        if custom_props_rel is None:
+    def get_partname_by_type(self, type):
+        rel = self.get_by_type(type)
+        if rel is None:
             return None
-        target = custom_props_rel.attrib['Target']
-        return os.path.join(self.workdir, target)
+        # Targets of package relationships are relative to the package root
+        return rel.attrib['Target'].lstrip('/')
 
-    def create_custom_props_relationship(self):
-        assert self.get_by_type(NAMESPACES['CUSTOM_PROPS_REL']) is None
+    def get_custom_props_partname(self):
+        return self.get_partname_by_type(NAMESPACES['CUSTOM_PROPS_REL'])
+
+    def create_relationship(self, type, target):
+        assert self.get_by_type(type) is None
 
         max_rid = self.get_max_rid()
         new_rid = "rId{}".format(max_rid + 1)
@@ -243,39 +525,188 @@ class OOXMLRelationships(Part):
 
         new_relationship = etree.SubElement(root, '{%s}Relationship' %
                                             NAMESPACES['RELATIONSHIPS'])
-        new_relationship.attrib['Type'] = NAMESPACES['CUSTOM_PROPS_REL']
+        new_relationship.attrib['Type'] = type
         new_relationship.attrib['Id'] = new_rid
-        new_relationship.attrib['Target'] = CUSTOM_PROPERTY_DEFAULT_PATH
+        new_relationship.attrib['Target'] = target
 
-        self.write_xml_file()
+        self.mark_dirty()
+
+    def create_custom_props_relationship(self):
+        self.create_relationship(NAMESPACES['CUSTOM_PROPS_REL'],
+                                 CUSTOM_PROPERTY_DEFAULT_PATH)
 
     def get_max_rid(self):
-        return max(int(re.match('rId(\d+)', n.attrib['Id']).group(1))
-                   for n in self.relationships)
+        rids = [re.match('rId(\d+)$', n.attrib['Id'])
+                for n in self.relationships]
+        return max([int(match.group(1)) for match in rids if match] or [0])
 
 
 class OOXMLDocument(OOXMLPackage):
 
-    def __init__(self, zipped_path, read_only=False, force=False):
+    def __init__(self, zipped_path, read_only=False, force=False,
+                 in_memory=False, output=None, fsync=FSYNC_FILE, schema=None,
+                 on_stats=log_stats, keep_workdir=False, locking=False,
+                 lock_timeout=None):
         """A document can be initialised in force mode to overwrite properties
+
+        The PropertySchema `schema` declares the value types of custom
+        properties, metadata is validated against it before it is applied.
+
+        In `in_memory` mode the document is not extracted, only the parts
+        needed to handle the custom properties are read from the ZIP file.
+        See OOXMLPackage for the supported kinds of documents, `output`,
+        `fsync`, `on_stats`, `keep_workdir`, `locking` and `lock_timeout`.
+
+        A document must only be used by one thread at a time, but different
+        documents, even of the same file, can be used by many threads at
+        once. Options only apply to the document they are given to.
         """
-        super(OOXMLDocument, self).__init__(zipped_path, read_only=read_only)
+        super(OOXMLDocument, self).__init__(zipped_path, read_only=read_only,
+                                            in_memory=in_memory,
+                                            output=output, fsync=fsync,
+                                            on_stats=on_stats,
+                                            keep_workdir=keep_workdir,
+                                            locking=locking,
+                                            lock_timeout=lock_timeout)
         self._force = force
+        if schema is None:
+            schema = PropertySchema()
+        self.schema = schema
+        self._content_types = None
+        self._core_properties = None
+        self._extended_properties = None
+
+    def load(self):
+        self.relationships = OOXMLRelationships(self)
+        docprops_partname = self.relationships.get_custom_props_partname()
+        if docprops_partname is None:
+            self.properties = EmptyPropertiesPart(
+                self, self._force, self.schema)
+        else:
+            self.properties = CustomPropertiesPart(
+                self, docprops_partname, self._force, self.schema)
 
-    def __enter__(self):
-        super(OOXMLDocument, self).__enter__()
+    @property
+    def content_types(self):
+        if self._content_types is None:
+            self._content_types = OOXMLContentTypes(self)
+        return self._content_types
 
-        self.relationships = OOXMLRelationships(self.workdir)
-        docprops_path = self.relationships.get_custom_props_path()
-        if docprops_path is None:
-            self.properties = EmptyPropertiesPart(self.workdir, self._force)
-        else:
-            self.properties = CustomPropertiesPart(docprops_path, self._force)
-        return self
+    @property
+    def core_properties(self):
+        if self._core_properties is None:
+            self._core_properties = CorePropertiesPart(
+                self, self.relationships.get_partname_by_type(
+                    NAMESPACES['CORE_PROPS_REL']))
+        return self._core_properties
 
-    def update_properties(self, metadata):
+    @property
+    def extended_properties(self):
+        if self._extended_properties is None:
+            self._extended_properties = ExtendedPropertiesPart(
+                self, self.relationships.get_partname_by_type(
+                    NAMESPACES['EXTENDED_PROPS_REL']))
+        return self._extended_properties
+
+    def update_properties(self, metadata, core=None, extended=None,
+                          refresh_fields=False):
+        """Update the custom properties with `metadata`, and optionally the
+        core and extended properties with the dicts `core` and `extended`.
+
+        With `refresh_fields` set, the results of the DOCPROPERTY fields of
+        the properties in `metadata` are refreshed as well.
+        """
         assert not self._read_only, 'you may not update readonly documents!'
-        self.properties = self.properties.update(metadata)
+        with self.stats.measure('mutate'):
+            # Validate all values before any part is touched
+            metadata = self.schema.prepare(metadata)
+            self.properties = self.properties.update(metadata)
+            if core:
+                self.core_properties.update(core)
+            if extended:
+                self.extended_properties.update(extended)
+            if refresh_fields and metadata:
+                self.refresh_fields(metadata)
+
+    def get_field_partnames(self):
+        """Return the names of the parts of a WordprocessingML document
+        whose fields are refreshed: the main document part, headers and
+        footers. Other documents have none.
+        """
+        if self.get_main_content_type() not in \
+                WORDPROCESSING_MAIN_CONTENT_TYPES:
+            return []
+        main_partname = self.relationships.get_partname_by_type(
+            NAMESPACES['OFFICE_DOCUMENT_REL'])
+        directory, filename = posixpath.split(main_partname)
+        rels_partname = posixpath.join(directory, '_rels', filename + '.rels')
+
+        partnames = [main_partname]
+        if not self.has_part(rels_partname):
+            return partnames
+        root = etree.fromstring(self.read_part(rels_partname))
+        for rel in root.iterchildren(RELATIONSHIP_TAG):
+            if rel.get('Type') not in (NAMESPACES['HEADER_REL'],
+                                       NAMESPACES['FOOTER_REL']) or \
+                    rel.get('TargetMode') == 'External':
+                continue
+            target = rel.get('Target')
+            if target.startswith('/'):
+                partnames.append(target.lstrip('/'))
+            else:
+                partnames.append(posixpath.normpath(
+                    posixpath.join(directory, target)))
+        return partnames
+
+    def refresh_fields(self, values, format_value=format_field_value):
+        """Replace the results of the DOCPROPERTY fields of the properties
+        in the dict `values` in the main document part, headers and footers
+        by their new values, converted to text with `format_value`.
+
+        Parts are transformed incrementally and only written if a result
+        has changed.
+        """
+        with self.stats.measure('mutate'):
+            for partname in self.get_field_partnames():
+                source = self.open_part(partname)
+                target = SpooledTemporaryFile(FIELDS_SPOOL_SIZE)
+                try:
+                    changed = refresh_fields(source, target, values,
+                                             format_value)
+                except:
+                    target.close()
+                    raise
+                finally:
+                    source.close()
+                if changed:
+                    self.write_part(partname, target)
+                else:
+                    target.close()
+
+    def get_main_content_type(self):
+        """Return the content type of the main document part.
+        """
+        partname = self.relationships.get_partname_by_type(
+            NAMESPACES['OFFICE_DOCUMENT_REL'])
+        if partname is None:
+            return None
+        return self.content_types.get_content_type('/' + partname)
+
+    def get_mime_type(self):
+        """Return the MIME type of the document, determined by the
+        content type of its main part, or None for unknown types.
+        """
+        return MAIN_PART_MIME_TYPES.get(self.get_main_content_type())
+
+    def get_all_properties(self):
+        """Return a dict with the custom, core and extended properties,
+        each as an ordered dict mapping names to values.
+        """
+        return {
+            'custom': self.properties.get_properties(),
+            'core': self.core_properties.get_properties(),
+            'extended': self.extended_properties.get_properties(),
+        }
 
     def has_any_property(self, property_names):
         current_properties = set(self.properties.get_property_names())
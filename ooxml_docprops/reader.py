@@ -0,0 +1,195 @@
+"""Streaming read access to the custom properties of an OOXML Package.
+
+The package is never extracted. Only the package relationships and the
+custom properties part are read from the ZIP file, the latter with an
+incremental parser.
+"""
+
+from collections import namedtuple
+from config import CONTENT_TYPES_PATH
+from config import MAIN_PART_MIME_TYPES
+from config import NAMESPACES
+from config import RELATIONSHIPS_PATH
+from datatypes import variant_type_of
+from fnmatch import fnmatchcase
+from lxml import etree
+from zip_utils import as_zip_source
+from zipfile import BadZipfile
+from zipfile import ZipFile
+
+
+DEFAULT_TAG = '{%s}Default' % NAMESPACES['CONTENT_TYPES']
+OVERRIDE_TAG = '{%s}Override' % NAMESPACES['CONTENT_TYPES']
+PROPERTY_TAG = '{%s}property' % NAMESPACES['CUSTOM_PROPS']
+RELATIONSHIP_TAG = '{%s}Relationship' % NAMESPACES['RELATIONSHIPS']
+
+
+PropertyRecord = namedtuple('PropertyRecord', [
+    'name', 'pid', 'vtype', 'value'])
+
+PackageInfo = namedtuple('PackageInfo', [
+    'valid', 'error', 'mime_type', 'main_partname', 'main_content_type',
+    'custom_properties_partname'])
+
+
+def find_content_type(root, part_name):
+    """Return the content type of the absolute part name `part_name`
+    declared in the parsed content types `root`, or None.
+    """
+    # Part names are compared case-insensitive
+    for override in root.iterchildren(OVERRIDE_TAG):
+        if override.attrib['PartName'].lower() == part_name.lower():
+            return override.attrib['ContentType']
+
+    extension = part_name.rsplit('.', 1)[-1].lower()
+    for default in root.iterchildren(DEFAULT_TAG):
+        if default.attrib['Extension'].lower() == extension:
+            return default.attrib['ContentType']
+    return None
+
+
+def get_relationship_targets(zipfile):
+    """Return a dict mapping the types of all package relationships to
+    the part names they target.
+    """
+    targets = {}
+    root = etree.fromstring(zipfile.read(RELATIONSHIPS_PATH))
+    for rel in root.iterchildren(RELATIONSHIP_TAG):
+        # Targets of package relationships are relative to the root
+        targets.setdefault(rel.attrib['Type'],
+                           rel.attrib['Target'].lstrip('/'))
+    return targets
+
+
+def get_relationship_target(zipfile, rel_type):
+    """Return the part name targeted by the package relationship of type
+    `rel_type`, or None if the package has no such relationship.
+    """
+    return get_relationship_targets(zipfile).get(rel_type)
+
+
+def probe_package(zipped_path):
+    """Tell what kind of package `zipped_path` is without opening it as
+    document.
+
+    Only the ZIP central directory, the content types and the package
+    relationships are read. Returns a PackageInfo; packages that are not
+    valid OOXML packages are reported with `valid` set to False and the
+    reason in `error`. The MIME type is None for unsupported main parts.
+    """
+    try:
+        with ZipFile(as_zip_source(zipped_path), 'r') as z:
+            targets = get_relationship_targets(z)
+            content_types = etree.fromstring(z.read(CONTENT_TYPES_PATH))
+            names = z.NameToInfo
+    except (BadZipfile, KeyError, etree.XMLSyntaxError) as exc:
+        return PackageInfo(False, '%s: %s' % (type(exc).__name__, exc),
+                           None, None, None, None)
+
+    main_partname = targets.get(NAMESPACES['OFFICE_DOCUMENT_REL'])
+    if main_partname is None or main_partname not in names:
+        return PackageInfo(False, 'The package has no main document part',
+                           None, None, None, None)
+
+    main_content_type = find_content_type(content_types, '/' + main_partname)
+    custom_partname = targets.get(NAMESPACES['CUSTOM_PROPS_REL'])
+    if custom_partname not in names:
+        custom_partname = None
+    return PackageInfo(True, None, MAIN_PART_MIME_TYPES.get(main_content_type),
+                       main_partname, main_content_type, custom_partname)
+
+
+def iter_property_nodes(fileobj):
+    """Incrementally parse a custom properties part from `fileobj` and
+    yield its property nodes.
+
+    Each node is cleared after it has been consumed, so memory usage does
+    not grow with the size of the part.
+    """
+    # huge_tree lifts the limit on the size of text nodes, legacy
+    # documents may contain very large string values
+    for event, node in etree.iterparse(fileobj, events=('end',),
+                                       tag=PROPERTY_TAG, huge_tree=True):
+        yield node
+        node.clear()
+        while node.getprevious() is not None:
+            del node.getparent()[0]
+
+
+def property_matcher(prefix=None, pattern=None):
+    """Return a predicate telling whether a property name starts with
+    `prefix` or matches the glob `pattern`, or None without both.
+    """
+    if prefix is None and pattern is None:
+        return None
+
+    def match(name):
+        return ((prefix is not None and name.startswith(prefix)) or
+                (pattern is not None and fnmatchcase(name, pattern)))
+    return match
+
+
+def iter_property_records(fileobj, names=None, match=None):
+    """Incrementally parse a custom properties part from `fileobj` and
+    yield a PropertyRecord for every property.
+
+    If a set of `names` or a predicate `match` (see `property_matcher`)
+    is given, only the properties selected by either of them are converted
+    and yielded. With `names` alone, parsing stops as soon as all of them
+    have been found.
+
+    Of several properties with the same name only the first one is
+    yielded, which is the one OOXMLDocument reads and updates.
+    """
+    select = names is not None or match is not None
+    wanted = set(names or ())
+    if select and match is None and not wanted:
+        return
+
+    seen = set()
+    for node in iter_property_nodes(fileobj):
+        name = node.attrib['name']
+        if name in seen:
+            continue
+        seen.add(name)
+        if select:
+            if name in wanted:
+                wanted.discard(name)
+            elif match is None or not match(name):
+                continue
+
+        vtype = variant_type_of(node[0])
+        yield PropertyRecord(name, int(node.attrib['pid']), vtype.name,
+                             vtype.convert_node(node[0]))
+        if select and match is None and not wanted:
+            return
+
+
+def iter_custom_property_records(zipped_path, names=None, match=None):
+    """Yield a PropertyRecord for the custom properties of the package at
+    `zipped_path`, while the properties part is being parsed. See
+    `iter_property_records` for `names` and `match`.
+
+    Instead of a path, the package may also be given as bytes or seekable
+    file-like object.
+    """
+    with ZipFile(as_zip_source(zipped_path), 'r') as z:
+        partname = get_relationship_target(z, NAMESPACES['CUSTOM_PROPS_REL'])
+        if partname is None:
+            return
+
+        with z.open(partname) as f:
+            for record in iter_property_records(f, names, match):
+                yield record
+
+
+def iter_custom_properties(zipped_path, names=None, match=None):
+    """Yield (name, value) tuples for the custom properties of the package
+    at `zipped_path`, while the properties part is being parsed. See
+    `iter_property_records` for `names` and `match`.
+
+    Instead of a path, the package may also be given as bytes or seekable
+    file-like object.
+    """
+    for record in iter_custom_property_records(zipped_path, names, match):
+        yield (record.name, record.value)
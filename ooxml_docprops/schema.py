@@ -0,0 +1,97 @@
+"""Declarative schemas mapping custom property names to value types.
+"""
+
+from collections import OrderedDict
+from datatypes import ValidationError
+from datatypes import get_variant_type
+from datatypes import infer_variant_type
+
+
+class SchemaValidationError(ValidationError):
+    """Raised for a metadata dict with invalid values. `errors` maps the
+    names of all invalid properties to the reason.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super(SchemaValidationError, self).__init__(
+            'Invalid properties: %s' % '; '.join(
+                '%s: %s' % item for item in sorted(errors.items())))
+
+
+class PropertyDefinition(object):
+    """The value type of a custom property. Values are passed through the
+    callable `coerce`, if given, before they are validated.
+    """
+
+    def __init__(self, name, vtype, coerce=None):
+        self.name = name
+        self.vtype = vtype
+        self.coerce = coerce
+
+    def prepare(self, value):
+        if self.coerce is not None:
+            value = self.coerce(value)
+        self.vtype.validate(value)
+        return value
+
+
+class PropertySchema(object):
+    """Value types of custom properties, registered once by name.
+
+    Properties that are not registered keep the value type of an existing
+    property, new ones get the type determined by their Python type. A
+    `strict` schema rejects properties that are not registered.
+    """
+
+    def __init__(self, strict=False):
+        self.strict = strict
+        self._definitions = {}
+
+    def __contains__(self, name):
+        return name in self._definitions
+
+    def register(self, name, vtype, base_type=None, coerce=None):
+        """Register the property `name` with the value type `vtype` (e.g.
+        'r8'). Vectors and arrays also need a `base_type`.
+        """
+        definition = PropertyDefinition(
+            name, get_variant_type(vtype, base_type), coerce=coerce)
+        self._definitions[name] = definition
+        return definition
+
+    def get_variant_type(self, name):
+        """Return the registered VariantType of the property `name`, or
+        None.
+        """
+        definition = self._definitions.get(name)
+        if definition is None:
+            return None
+        return definition.vtype
+
+    def prepare(self, metadata):
+        """Coerce and validate all values of `metadata` in one pass.
+
+        Returns an ordered dict with the prepared values. If any value is
+        invalid, a SchemaValidationError listing all of them is raised.
+        """
+        prepared = OrderedDict()
+        errors = {}
+        for name, value in metadata.items():
+            definition = self._definitions.get(name)
+            try:
+                if definition is not None:
+                    value = definition.prepare(value)
+                elif self.strict:
+                    raise ValidationError('Unknown property')
+                else:
+                    infer_variant_type(value).validate(value)
+            except (ValidationError, ArithmeticError, TypeError,
+                    ValueError) as exc:
+                errors[name] = exc
+                continue
+            prepared[name] = value
+
+        if errors:
+            raise SchemaValidationError(errors)
+        return prepared
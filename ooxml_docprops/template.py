@@ -0,0 +1,140 @@
+"""Prepared templates for stamping many copies of the same document.
+"""
+
+from copy import deepcopy
+from instrumentation import OperationStats
+from instrumentation import log_stats
+from io import BytesIO
+from lxml import etree
+from package import FSYNC_FILE
+from package import write_atomically
+from properties import CustomPropertiesPart
+from properties import EmptyPropertiesPart
+from properties import OOXMLDocument
+from properties import get_parser
+from schema import PropertySchema
+from zip_utils import is_path
+from zip_utils import prepare_entry
+from zip_utils import write_prepared_entry
+from zipfile import ZIP_DEFLATED
+from zipfile import ZipFile
+from zipfile import ZipInfo
+import os
+
+
+class _Stamp(object):
+    """Collects the serialized custom properties part of one copy, in
+    place of the package a CustomPropertiesPart usually belongs to.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.data = None
+
+    def register_dirty_part(self, part):
+        pass
+
+    def write_part(self, partname, data):
+        self.data = data
+
+
+class PreparedTemplate(object):
+    """A template analysed once to stamp many copies with different custom
+    properties.
+
+    All entries except the custom properties part are kept compressed,
+    together with their local headers, and the custom properties part is
+    kept as parsed tree. Stamping a copy only serializes and compresses
+    the new custom properties part, everything else is written as it is.
+    Templates without custom properties get an empty part when prepared.
+
+    Prepared templates are not modified by stamping, so copies can be
+    stamped from many threads at once. See OOXMLDocument for `force` and
+    `schema`, and OOXMLPackage for `fsync` and `on_stats`, which is called
+    for every stamped copy.
+    """
+
+    def __init__(self, template, force=False, schema=None, fsync=FSYNC_FILE,
+                 on_stats=log_stats):
+        if schema is None:
+            schema = PropertySchema()
+        self.force = force
+        self.schema = schema
+        self.fsync = fsync
+        self.on_stats = on_stats
+        self._mode_source = None
+        if is_path(template):
+            self._mode_source = os.path.abspath(template)
+
+        # Add the custom properties part first, so every copy has it
+        prepared = BytesIO()
+        with OOXMLDocument(template, in_memory=True, output=prepared,
+                           on_stats=on_stats) as doc:
+            if isinstance(doc.properties, EmptyPropertiesPart):
+                doc.properties = doc.properties.create()
+            self.partname = doc.properties.partname
+
+        with ZipFile(prepared, 'r') as z:
+            self._tree = etree.parse(BytesIO(z.read(self.partname)),
+                                     get_parser())
+            self._entries = [prepare_entry(z, zinfo)
+                             for zinfo in z.infolist()]
+        self._index = [info.filename for info, header, raw
+                       in self._entries].index(self.partname)
+
+    def render_properties(self, metadata, stats=None):
+        """Return the custom properties part updated with `metadata`, or
+        None if it does not differ from the template.
+        """
+        if stats is None:
+            stats = OperationStats()
+        stamp = _Stamp(stats)
+        with stats.measure('mutate'):
+            metadata = self.schema.prepare(metadata)
+            part = CustomPropertiesPart(stamp, self.partname, self.force,
+                                        self.schema, tree=deepcopy(self._tree))
+            part.update(metadata)
+        if part.dirty:
+            part.write_xml_file()
+        return stamp.data
+
+    def stamp(self, metadata, output):
+        """Write a copy of the template with the custom properties updated
+        from `metadata` to `output`, a path or writable stream. Paths are
+        written atomically.
+        """
+        stats = OperationStats(
+            os.path.abspath(output) if is_path(output) else None)
+        try:
+            data = self.render_properties(metadata, stats)
+            if is_path(output):
+                with stats.measure('commit'):
+                    write_atomically(
+                        os.path.abspath(output),
+                        lambda f: self._write(f, data, stats),
+                        fsync=self.fsync, mode_source=self._mode_source)
+            else:
+                self._write(output, data, stats)
+        except:
+            stats.failed = True
+            raise
+        finally:
+            stats.finish()
+            if self.on_stats is not None:
+                self.on_stats(stats)
+
+    def _write(self, fileobj, data, stats):
+        with stats.measure('zip'):
+            start = fileobj.tell()
+            with ZipFile(fileobj, 'w', ZIP_DEFLATED) as target:
+                for index, (info, header, raw) in enumerate(self._entries):
+                    if index == self._index and data is not None:
+                        new_info = ZipInfo(info.filename, info.date_time)
+                        new_info.external_attr = info.external_attr
+                        new_info.compress_type = ZIP_DEFLATED
+                        target.writestr(new_info, data)
+                        stats.entries_recompressed += 1
+                    else:
+                        write_prepared_entry(target, info, header, raw)
+                        stats.entries_copied += 1
+            stats.bytes_written += fileobj.tell() - start
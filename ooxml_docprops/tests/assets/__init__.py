@@ -1,7 +1,11 @@
+from io import BytesIO
 from os.path import abspath
 from os.path import dirname
 from os.path import join
 from tempfile import NamedTemporaryFile
+from threading import Thread
+from zipfile import ZIP_DEFLATED
+from zipfile import ZipFile
 import os
 
 
@@ -41,3 +45,47 @@ class TestAsset(object):
 
     def __exit__(self, exc_type, exc_value, traceback):
         os.remove(self.tmpfile.name)
+
+
+def build_package(main_content_type, main_partname='main/document.xml'):
+    """Return the bytes of a minimal package without custom properties,
+    whose main part has the content type `main_content_type`.
+    """
+    output = BytesIO()
+    with ZipFile(output, 'w', ZIP_DEFLATED) as z:
+        z.writestr(
+            '[Content_Types].xml',
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/'
+            'content-types"><Default Extension="rels" ContentType="application'
+            '/vnd.openxmlformats-package.relationships+xml"/><Default '
+            'Extension="xml" ContentType="application/xml"/><Override '
+            'PartName="/%s" ContentType="%s"/></Types>' % (
+                main_partname, main_content_type))
+        z.writestr(
+            '_rels/.rels',
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+            '2006/relationships"><Relationship Id="rId1" Type="http://schemas'
+            '.openxmlformats.org/officeDocument/2006/relationships/'
+            'officeDocument" Target="%s"/></Relationships>' % main_partname)
+        z.writestr(main_partname, '<document/>')
+    return output.getvalue()
+
+
+def run_threads(targets):
+    """Run the callables `targets` on a thread each and return the
+    exceptions they raised.
+    """
+    errors = []
+
+    def run(target):
+        try:
+            target()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [Thread(target=run, args=(target,)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
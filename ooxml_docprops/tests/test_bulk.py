@@ -0,0 +1,106 @@
+from ooxml_docprops import read_properties
+from ooxml_docprops.bulk import bulk_update_properties
+from ooxml_docprops.bulk import iter_documents
+from ooxml_docprops.bulk import iter_manifest
+from ooxml_docprops.tests.assets import path_to
+from unittest2 import TestCase
+import json
+import os
+import shutil
+import tempfile
+
+
+class TestBulkUpdate(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tempdir, 'sub'))
+        self.with_props = os.path.join(self.tempdir, 'with.docx')
+        self.without_props = os.path.join(self.tempdir, 'sub', 'without.docx')
+        shutil.copy(path_to('with_custom_properties.docx'), self.with_props)
+        shutil.copy(path_to('without_custom_properties.docx'),
+                    self.without_props)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write_manifest(self, entries):
+        manifest_path = os.path.join(self.tempdir, 'manifest.jsonl')
+        with open(manifest_path, 'w') as manifest:
+            for path, metadata in entries:
+                manifest.write(json.dumps(
+                    {'path': path, 'metadata': metadata}) + '\n')
+            manifest.write('\n')
+        return manifest_path
+
+    def test_iter_manifest_resolves_relative_paths(self):
+        manifest_path = self.write_manifest([('with.docx', {'A': 1})])
+        self.assertEqual([(self.with_props, {'A': 1})],
+                         list(iter_manifest(manifest_path)))
+
+    def test_invalid_manifest_lines_are_reported_without_aborting(self):
+        manifest_path = self.write_manifest([('with.docx', {'Test': 'Hans'})])
+        with open(manifest_path, 'a') as manifest:
+            manifest.write('not json\n{"metadata": {}}\n')
+            manifest.write(json.dumps({'path': 'sub/without.docx',
+                                       'metadata': {'Number': 42}}) + '\n')
+
+        results = dict((result.path, result) for result in
+                       bulk_update_properties(iter_manifest(manifest_path),
+                                              processes=2))
+
+        self.assertTrue(results[self.with_props].success)
+        self.assertTrue(results[self.without_props].success)
+        self.assertIn('ValueError', results[manifest_path + ':3'].error)
+        self.assertEqual('ValueError: Entry has no path',
+                         results[manifest_path + ':4'].error)
+        self.assertFalse(results[manifest_path + ':3'].success)
+        self.assertEqual([('Number', 42)],
+                         list(read_properties(self.without_props)))
+
+    def test_iter_documents_matches_pattern_recursively(self):
+        open(os.path.join(self.tempdir, 'notes.txt'), 'w').close()
+        self.assertEqual([self.with_props, self.without_props],
+                         list(iter_documents(self.tempdir)))
+
+    def test_failures_are_reported_without_aborting(self):
+        missing = os.path.join(self.tempdir, 'missing.docx')
+        jobs = [(self.with_props, {'Test': 'Hans'}),
+                (missing, {'Test': 'Hans'}),
+                (self.without_props, {'Test': 'Hans'})]
+
+        results = dict((result.path, result) for result in
+                       bulk_update_properties(jobs, processes=1))
+
+        self.assertTrue(results[self.with_props].success)
+        self.assertTrue(results[self.without_props].success)
+        self.assertFalse(results[missing].success)
+        self.assertIn('IOError', results[missing].error)
+        self.assertEqual([('Test', 'Hans')],
+                         list(read_properties(self.without_props)))
+
+    def test_documents_are_updated_on_a_process_pool(self):
+        manifest_path = self.write_manifest([
+            ('with.docx', {'Test': 'Hans'}),
+            ('sub/without.docx', {'Number': 42})])
+
+        results = list(bulk_update_properties(iter_manifest(manifest_path),
+                                              processes=2))
+
+        self.assertItemsEqual([self.with_props, self.without_props],
+                              [result.path for result in results])
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual([('Test', 'Hans')],
+                         list(read_properties(self.with_props)))
+        self.assertEqual([('Number', 42)],
+                         list(read_properties(self.without_props)))
+
+    def test_unchanged_documents_are_reported(self):
+        jobs = [(self.with_props, {'Test': 'Peter'}),
+                (self.without_props, {'Test': 'Peter'})]
+
+        results = dict((result.path, result) for result in
+                       bulk_update_properties(jobs, processes=1))
+
+        self.assertFalse(results[self.with_props].changed)
+        self.assertTrue(results[self.without_props].changed)
@@ -0,0 +1,79 @@
+from ooxml_docprops import read_properties
+from ooxml_docprops import update_properties
+from ooxml_docprops.cache import PropertiesCache
+from ooxml_docprops.tests.assets import TestAsset
+from unittest2 import TestCase
+
+
+class TestPropertiesCache(TestCase):
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        cache = PropertiesCache()
+        with TestAsset('with_custom_properties.docx') as asset:
+            for i in range(3):
+                self.assertEqual([('Test', 'Peter')],
+                                 list(read_properties(asset.path, cache)))
+
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(2, cache.hits)
+
+    def test_content_hash_keys(self):
+        cache = PropertiesCache(key='content')
+        with TestAsset('with_custom_properties.docx') as asset:
+            cache.get_properties(asset.path)
+            self.assertEqual([('Test', 'Peter')],
+                             cache.get_properties(asset.path))
+
+        self.assertEqual(1, cache.hits)
+
+    def test_writing_a_document_invalidates_its_entries(self):
+        caches = [PropertiesCache(), PropertiesCache(key='content')]
+        with TestAsset('with_custom_properties.docx') as asset:
+            for cache in caches:
+                cache.get_properties(asset.path)
+                self.assertEqual(1, len(cache))
+
+            update_properties(asset.path, {'Test': 'Hans'})
+
+            for cache in caches:
+                self.assertEqual(0, len(cache))
+                self.assertEqual(0, cache.size)
+                self.assertEqual([('Test', 'Hans')],
+                                 cache.get_properties(asset.path))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = PropertiesCache(max_entries=2)
+        with TestAsset('with_custom_properties.docx') as first, \
+                TestAsset('with_custom_properties.docx') as second, \
+                TestAsset('without_custom_properties.docx') as third:
+            cache.get_properties(first.path)
+            cache.get_properties(second.path)
+            cache.get_properties(first.path)
+            cache.get_properties(third.path)
+
+            self.assertEqual(2, len(cache))
+            cache.get_properties(first.path)
+            self.assertEqual(2, cache.hits)
+            cache.get_properties(second.path)
+            self.assertEqual(4, cache.misses)
+
+    def test_entries_are_bounded_by_memory(self):
+        cache = PropertiesCache(max_size=1)
+        with TestAsset('with_custom_properties.docx') as asset:
+            cache.get_properties(asset.path)
+            cache.get_properties(asset.path)
+
+        self.assertEqual(0, len(cache))
+        self.assertEqual(2, cache.misses)
+
+    def test_cached_properties_are_projected(self):
+        cache = PropertiesCache()
+        with TestAsset('with_custom_properties.docx') as asset:
+            update_properties(asset.path, {'Number': 1})
+            list(read_properties(asset.path, cache))
+
+            self.assertEqual([('Number', 1)], list(read_properties(
+                asset.path, cache, names=['Number'])))
+            self.assertEqual([('Test', 'Peter')], list(read_properties(
+                asset.path, cache, prefix='Te')))
+        self.assertEqual(2, cache.hits)
@@ -1,7 +1,16 @@
+from datetime import date
 from datetime import datetime
+from decimal import Decimal
+from lxml import etree
+from ooxml_docprops.config import NSMAP_CUSTOM_PROPERTIES
+from ooxml_docprops.datatypes import ValidationError
+from ooxml_docprops.datatypes import convert_node
+from ooxml_docprops.datatypes import get_variant_type
+from ooxml_docprops.datatypes import infer_variant_type
 from ooxml_docprops.properties import OOXMLDocument
 from ooxml_docprops.tests.assets import TestAsset
 from unittest2 import TestCase
+from uuid import UUID
 
 
 class TestDocProperties(TestCase):
@@ -24,9 +33,88 @@ class TestDocProperties(TestCase):
                 doc.update_properties({'ischeswahr': True})
                 self.assertEqual(True, doc.properties.get_property_value('ischeswahr'))
 
+    def test_empty_strings_are_read_as_empty_strings(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({'leer': ''})
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                self.assertEqual(u'', doc.properties.get_property_value('leer'))
+
+    def test_bools_are_rejected_for_int_properties(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({'zahl': 1})
+                with self.assertRaises(ValidationError):
+                    doc.update_properties({'zahl': True})
+                self.assertEqual(1, doc.properties.get_property_value('zahl'))
+
     def test_can_write_datetime_properties(self):
         dt = datetime.now()
         with TestAsset('without_custom_properties.docx') as asset:
             with OOXMLDocument(asset.path) as doc:
                 doc.update_properties({'denn': dt})
                 self.assertEqual(dt, doc.properties.get_property_value('denn'))
+
+
+class TestVariantTypes(TestCase):
+
+    def roundtrip(self, vtype, value):
+        root = etree.Element('property', nsmap=NSMAP_CUSTOM_PROPERTIES)
+        vtype.validate(value)
+        node = vtype.add_node(root, value)
+        self.assertTrue(vtype.node_equals(node, value))
+        return convert_node(etree.fromstring(etree.tostring(root))[0])
+
+    def test_numeric_types(self):
+        self.assertEqual(255, self.roundtrip(get_variant_type('ui1'), 255))
+        self.assertEqual(2 ** 40, self.roundtrip(get_variant_type('i8'),
+                                                 2 ** 40))
+        self.assertEqual(1.5, self.roundtrip(get_variant_type('r8'), 1.5))
+        self.assertEqual(3.0, self.roundtrip(get_variant_type('r4'), 3))
+        self.assertEqual(Decimal('100.25'), self.roundtrip(
+            get_variant_type('decimal'), Decimal('1.0025E+2')))
+        self.assertEqual(Decimal('12.3456'), self.roundtrip(
+            get_variant_type('cy'), Decimal('12.3456')))
+        self.assertEqual(0x80004005, self.roundtrip(
+            get_variant_type('error'), 0x80004005))
+
+    def test_ranges_and_types_are_validated(self):
+        for name, value in (('ui1', 256), ('i1', -129), ('ui4', -1),
+                            ('i4', True), ('r8', '1.5'),
+                            ('cy', Decimal('0.00001')), ('lpwstr', 1),
+                            ('clsid', 'no guid')):
+            with self.assertRaises(ValidationError):
+                get_variant_type(name).validate(value)
+
+    def test_other_scalar_types(self):
+        guid = UUID('d5cdd505-2e9c-101b-9397-08002b2cf9ae')
+        self.assertEqual('{D5CDD505-2E9C-101B-9397-08002B2CF9AE}',
+                         self.roundtrip(get_variant_type('clsid'), guid))
+        self.assertEqual(datetime(2016, 10, 18), self.roundtrip(
+            get_variant_type('date'), date(2016, 10, 18)))
+        self.assertEqual(u'Peter', self.roundtrip(get_variant_type('bstr'),
+                                                  'Peter'))
+        self.assertEqual('\x00\xff', self.roundtrip(get_variant_type('blob'),
+                                                    '\x00\xff'))
+        self.assertIsNone(self.roundtrip(get_variant_type('null'), None))
+
+    def test_vectors(self):
+        vector = get_variant_type('vector', 'lpwstr')
+        self.assertEqual([u'a', u'b'], self.roundtrip(vector, ['a', 'b']))
+        self.assertEqual([u'a', 1, True], self.roundtrip(
+            get_variant_type('vector', 'variant'), ['a', 1, True]))
+        with self.assertRaises(ValidationError):
+            vector.validate(['a', 1])
+        with self.assertRaises(ValueError):
+            get_variant_type('vector', 'decimal')
+
+    def test_value_types_are_inferred_from_python_types(self):
+        self.assertEqual('i4', infer_variant_type(1).name)
+        self.assertEqual('i8', infer_variant_type(2 ** 40).name)
+        self.assertEqual('bool', infer_variant_type(False).name)
+        self.assertEqual('r8', infer_variant_type(1.5).name)
+        self.assertEqual('lpwstr', infer_variant_type(['a']).base_type.name)
+        self.assertEqual('variant',
+                         infer_variant_type(['a', 1]).base_type.name)
+        with self.assertRaises(ValidationError):
+            infer_variant_type(object())
@@ -1,3 +1,4 @@
+from copy import deepcopy
 from datetime import datetime
 from ooxml_docprops.datatypes import ValidationError
 from ooxml_docprops.properties import OOXMLDocument
@@ -62,3 +63,100 @@ class TestDocProperties(TestCase):
                                  doc.properties.get_property_value('Test'))
                 with self.assertRaises(ValidationError):
                     doc.update_properties({'Test': datetime.now()})
+
+    def test_batch_update_serializes_properties_part_once(self):
+        metadata = dict(('Property%d' % i, i) for i in range(40))
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({'Test': 'Hanspeter'})
+                properties = doc.properties
+                calls = []
+                original_write = properties.write_xml_file
+
+                def write_xml_file():
+                    calls.append(properties.partname)
+                    original_write()
+
+                properties.write_xml_file = write_xml_file
+                doc.update_properties(metadata)
+                self.assertEqual([], calls)
+
+            self.assertEqual(['docProps/custom.xml'], calls)
+
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                self.assertEqual('Hanspeter',
+                                 doc.properties.get_property_value('Test'))
+                self.assertEqual(
+                    39, doc.properties.get_property_value('Property39'))
+
+    def test_batch_update_allocates_consecutive_pids(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                max_pid = doc.properties.get_max_pid()
+                doc.update_properties({'A': 1, 'B': 2, 'C': 3, 'Test': 'x'})
+                pids = sorted(
+                    int(doc.properties.get_property_node(name).get('pid'))
+                    for name in ('A', 'B', 'C'))
+
+        self.assertEqual(range(max_pid + 1, max_pid + 4), pids)
+
+    def test_property_names_may_contain_quotes(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({'Say "Hi"': 'Peter', "It's": 1})
+                doc.update_properties({'Say "Hi"': 'Hans'})
+
+                self.assertEqual(
+                    'Hans', doc.properties.get_property_value('Say "Hi"'))
+                self.assertEqual(1, doc.properties.get_property_value("It's"))
+
+    def test_get_properties_returns_all_values(self):
+        now = datetime(2016, 10, 18, 13, 37)
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({'Date': now})
+
+                self.assertEqual({'Test': 'Peter', 'Date': now},
+                                 dict(doc.properties.get_properties()))
+
+    def test_properties_can_be_removed(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({'Hans': 'Peter'})
+                doc.properties.remove_property('Test')
+
+                self.assertFalse(doc.properties.has_property('Test'))
+                self.assertEqual(['Hans'],
+                                 doc.properties.get_property_names())
+
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                self.assertEqual(['Hans'],
+                                 doc.properties.get_property_names())
+
+    def test_duplicated_properties_are_removed_completely(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                root = doc.properties.tree.getroot()
+                duplicate = deepcopy(root[0])
+                duplicate.attrib['pid'] = '3'
+                root.append(duplicate)
+                doc.properties.mark_dirty()
+
+            with OOXMLDocument(asset.path) as doc:
+                self.assertEqual(['Test'],
+                                 doc.properties.get_property_names())
+                doc.properties.remove_property('Test')
+
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                self.assertFalse(doc.properties.has_property('Test'))
+                self.assertEqual(0, len(doc.properties.tree.getroot()))
+
+    def test_failed_additions_do_not_leave_empty_properties(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                with self.assertRaises(Exception):
+                    doc.update_properties({'Invalid': object()})
+
+                self.assertFalse(doc.properties.has_property('Invalid'))
+                self.assertEqual(['Test'],
+                                 doc.properties.get_property_names())
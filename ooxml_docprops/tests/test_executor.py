@@ -0,0 +1,113 @@
+from concurrent.futures import CancelledError
+from ooxml_docprops import read_properties
+from ooxml_docprops.executor import PropertiesExecutor
+from ooxml_docprops.tests.assets import TestAsset
+from unittest2 import TestCase
+import os
+import threading
+
+
+class TestPropertiesExecutor(TestCase):
+
+    def test_update_properties(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with PropertiesExecutor() as executor:
+                future = executor.update_properties(asset.path,
+                                                    {'Test': 'Hans'})
+                self.assertIsNone(future.result(timeout=10))
+
+            self.assertEqual([('Test', 'Hans')],
+                             list(read_properties(asset.path)))
+
+    def test_read_properties(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with PropertiesExecutor() as executor:
+                future = executor.read_properties(asset.path)
+                self.assertEqual([('Test', 'Peter')],
+                                 future.result(timeout=10))
+
+    def test_errors_are_raised_by_the_future(self):
+        with PropertiesExecutor() as executor:
+            future = executor.read_properties('/does/not/exist.docx')
+            with self.assertRaises(IOError):
+                future.result(timeout=10)
+
+    def test_process_document_returns_callback_result(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with PropertiesExecutor() as executor:
+                future = executor.process_document(
+                    asset.path,
+                    lambda doc: doc.properties.get_property_names(),
+                    read_only=True)
+                self.assertEqual(['Test'], future.result(timeout=10))
+
+    def test_cancelling_a_running_operation_discards_changes(self):
+        started = threading.Event()
+        proceed = threading.Event()
+        workdirs = []
+
+        def update(doc):
+            workdirs.append(doc.workdir)
+            doc.update_properties({'Test': 'Hans'})
+            started.set()
+            proceed.wait(10)
+
+        with TestAsset('with_custom_properties.docx') as asset:
+            with PropertiesExecutor(max_workers=1) as executor:
+                future = executor.process_document(asset.path, update)
+                started.wait(10)
+                self.assertTrue(future.cancel())
+                proceed.set()
+
+                with self.assertRaises(CancelledError):
+                    future.result(timeout=10)
+                self.assertTrue(future.cancel_requested)
+
+            self.assertFalse(os.path.exists(workdirs[0]))
+            self.assertEqual([('Test', 'Peter')],
+                             list(read_properties(asset.path)))
+
+    def test_committing_operations_cannot_be_cancelled(self):
+        committing = threading.Event()
+        proceed = threading.Event()
+
+        def update(doc):
+            doc.update_properties({'Test': 'Hans'})
+            # Packing starts once the callback returns
+            original_pack = doc.pack
+
+            def pack(*args, **kwargs):
+                committing.set()
+                proceed.wait(10)
+                return original_pack(*args, **kwargs)
+            doc.pack = pack
+
+        with TestAsset('with_custom_properties.docx') as asset:
+            with PropertiesExecutor(max_workers=1) as executor:
+                future = executor.process_document(asset.path, update)
+                committing.wait(10)
+                self.assertFalse(future.cancel())
+                proceed.set()
+
+                self.assertIsNone(future.result(timeout=10))
+                self.assertFalse(future.cancel_requested)
+
+            self.assertEqual([('Test', 'Hans')],
+                             list(read_properties(asset.path)))
+
+    def test_pending_operations_can_be_cancelled(self):
+        proceed = threading.Event()
+        with TestAsset('with_custom_properties.docx') as asset:
+            with PropertiesExecutor(max_workers=1) as executor:
+                blocking = executor.process_document(
+                    asset.path, lambda doc: proceed.wait(10), read_only=True)
+                pending = executor.update_properties(asset.path,
+                                                     {'Test': 'Hans'})
+                self.assertTrue(pending.cancel())
+                proceed.set()
+                blocking.result(timeout=10)
+
+            self.assertTrue(pending.cancelled())
+            self.assertTrue(pending.cancel_requested)
+            self.assertEqual([('Test', 'Peter')],
+                             list(read_properties(asset.path)))
@@ -0,0 +1,164 @@
+from datetime import datetime
+from decimal import Decimal
+from ooxml_docprops import update_properties
+from ooxml_docprops.bulk import bulk_read_properties
+from ooxml_docprops.export import CSVWriter
+from ooxml_docprops.export import Checkpoint
+from ooxml_docprops.export import JSONLinesWriter
+from ooxml_docprops.export import ParquetWriter
+from ooxml_docprops.export import export_properties
+from ooxml_docprops.export import guess_format
+from ooxml_docprops.export import pyarrow
+from ooxml_docprops.export import to_text
+from ooxml_docprops.tests.assets import path_to
+from unittest2 import TestCase
+from unittest2 import skipIf
+import csv
+import json
+import os
+import shutil
+import tempfile
+
+
+class TestExportProperties(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.with_props = os.path.join(self.tempdir, 'with.docx')
+        self.without_props = os.path.join(self.tempdir, 'without.docx')
+        shutil.copy(path_to('with_custom_properties.docx'), self.with_props)
+        shutil.copy(path_to('without_custom_properties.docx'),
+                    self.without_props)
+        update_properties(self.with_props, {
+            'Date': datetime(2016, 10, 18, 13, 37), 'Flag': True})
+        self.output = os.path.join(self.tempdir, 'export')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def export(self, writer_class, paths, **kwargs):
+        writer = writer_class(self.output)
+        try:
+            return list(export_properties(paths, writer, processes=1,
+                                          **kwargs))
+        finally:
+            writer.close()
+
+    def test_bulk_read_properties_reports_failures(self):
+        missing = os.path.join(self.tempdir, 'missing.docx')
+        results = dict((result.path, result) for result in
+                       bulk_read_properties([self.with_props, missing],
+                                            processes=2))
+
+        self.assertEqual(['Test', 'Date', 'Flag'],
+                         [r.name for r in results[self.with_props].records])
+        self.assertFalse(results[missing].success)
+
+    def test_values_as_text(self):
+        self.assertEqual(u'2016-10-18T13:37:00',
+                         to_text('filetime', datetime(2016, 10, 18, 13, 37)))
+        self.assertEqual(u'true', to_text('bool', True))
+        self.assertEqual(u'0.5', to_text('r8', 0.5))
+        self.assertEqual(u'100', to_text('decimal', Decimal('1E+2')))
+        self.assertEqual(u'["a", 1]', to_text('vector', [u'a', 1]))
+        self.assertEqual(u'AP8=', to_text('blob', '\x00\xff'))
+
+    def test_csv_export(self):
+        self.export(CSVWriter, [self.with_props, self.without_props])
+
+        with open(self.output, 'rb') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual([
+            ['path', 'name', 'pid', 'vtype', 'value'],
+            [self.with_props, 'Test', '2', 'lpwstr', 'Peter'],
+            [self.with_props, 'Date', '3', 'filetime', '2016-10-18T13:37:00'],
+            [self.with_props, 'Flag', '4', 'bool', 'true'],
+            [self.without_props, '', '', '', ''],
+        ], rows)
+
+    def test_json_lines_export(self):
+        self.export(JSONLinesWriter, [self.with_props, self.without_props])
+
+        with open(self.output) as f:
+            documents = [json.loads(line) for line in f]
+        self.assertEqual([self.with_props, self.without_props],
+                         [document['path'] for document in documents])
+        self.assertEqual(
+            {'name': 'Flag', 'pid': 4, 'vtype': 'bool', 'value': True},
+            documents[0]['properties'][2])
+        self.assertEqual([], documents[1]['properties'])
+
+    def test_export_resumes_from_checkpoint(self):
+        checkpoint_path = os.path.join(self.tempdir, 'checkpoint')
+        missing = os.path.join(self.tempdir, 'missing.docx')
+
+        results = self.export(JSONLinesWriter, [self.with_props, missing],
+                              checkpoint=Checkpoint(checkpoint_path))
+        self.assertEqual([True, False], [r.success for r in results])
+
+        results = self.export(
+            JSONLinesWriter, [self.with_props, missing, self.without_props],
+            checkpoint=Checkpoint(checkpoint_path))
+        self.assertEqual([missing, self.without_props],
+                         [r.path for r in results])
+
+        with open(self.output) as f:
+            self.assertEqual([self.with_props, self.without_props],
+                             [json.loads(line)['path'] for line in f])
+        self.assertIn(self.without_props, Checkpoint(checkpoint_path))
+
+    def test_partial_rows_are_discarded_when_resuming(self):
+        checkpoint_path = os.path.join(self.tempdir, 'checkpoint')
+        self.export(CSVWriter, [self.with_props],
+                    checkpoint=Checkpoint(checkpoint_path))
+        with open(self.output, 'ab') as f:
+            f.write('%s,Partial,5,lpw' % self.without_props)
+
+        self.export(CSVWriter, [self.with_props, self.without_props],
+                    checkpoint=Checkpoint(checkpoint_path))
+
+        with open(self.output, 'rb') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual([self.with_props] * 3 + [self.without_props],
+                         [row[0] for row in rows[1:]])
+        self.assertEqual(['', '', '', ''], rows[-1][1:])
+
+    def test_output_of_interrupted_first_batch_is_discarded(self):
+        checkpoint_path = os.path.join(self.tempdir, 'checkpoint')
+        self.export(JSONLinesWriter, [],
+                    checkpoint=Checkpoint(checkpoint_path))
+        with open(self.output, 'ab') as f:
+            f.write('{"path": "%s", "properties": []}\n{"path": "partial' %
+                    self.with_props)
+
+        self.export(JSONLinesWriter, [self.with_props],
+                    checkpoint=Checkpoint(checkpoint_path))
+
+        with open(self.output) as f:
+            self.assertEqual([self.with_props],
+                             [json.loads(line)['path'] for line in f])
+
+    def test_incomplete_checkpoint_lines_are_ignored(self):
+        checkpoint_path = os.path.join(self.tempdir, 'checkpoint')
+        with open(checkpoint_path, 'wb') as f:
+            f.write('%s\n%s' % (self.with_props, self.without_props))
+
+        checkpoint = Checkpoint(checkpoint_path)
+        self.assertIn(self.with_props, checkpoint)
+        self.assertNotIn(self.without_props, checkpoint)
+
+    def test_guess_format(self):
+        self.assertEqual('csv', guess_format('export.CSV'))
+        self.assertEqual('jsonl', guess_format('export.json'))
+        self.assertEqual('parquet', guess_format('export.parquet'))
+        self.assertIsNone(guess_format('export'))
+
+    @skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet_export(self):
+        import pyarrow.parquet
+        self.export(ParquetWriter, [self.with_props, self.without_props])
+
+        table = pyarrow.parquet.read_table(
+            os.path.join(self.output, 'part-00000.parquet'))
+        self.assertEqual([None, None, True],
+                         table.column('bool_value').to_pylist())
@@ -0,0 +1,205 @@
+from io import BytesIO
+from lxml import etree
+from ooxml_docprops import read_properties
+from ooxml_docprops import update_properties
+from ooxml_docprops.fields import format_field_value
+from ooxml_docprops.fields import refresh_fields
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.tests.assets import build_package
+from ooxml_docprops.tests.assets import path_to
+from ooxml_docprops.zip_utils import rewrite_zip
+from unittest2 import TestCase
+from zipfile import ZipFile
+import datetime
+import os
+import shutil
+import tempfile
+
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+W14_NS = 'http://schemas.microsoft.com/office/word/2010/wordml'
+
+DOCUMENT_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+    '<w:document xmlns:w="%s" xmlns:mc="http://schemas.openxmlformats.org/'
+    'markup-compatibility/2006" xmlns:w14="%s" mc:Ignorable="w14">'
+    '<w:body>%%s<w:sectPr/></w:body></w:document>' % (W_NS, W14_NS))
+
+HEADER_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+    '<w:hdr xmlns:w="%s">%%s</w:hdr>' % W_NS)
+
+HEADER_REL = (
+    '<Relationship Id="rId99" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/header" Target="header1.xml"/>')
+
+
+def simple_field(name, result):
+    return ('<w:p><w:fldSimple w:instr=" DOCPROPERTY  %s  \\* MERGEFORMAT ">'
+            '<w:r><w:rPr><w:b/></w:rPr><w:t>%s</w:t></w:r></w:fldSimple>'
+            '</w:p>' % (name, result))
+
+
+def complex_field(instruction, result):
+    return ('<w:p w14:paraId="1"><w:r><w:fldChar w:fldCharType="begin"/></w:r>'
+            '<w:r><w:instrText xml:space="preserve">%s</w:instrText></w:r>'
+            '<w:r><w:fldChar w:fldCharType="separate"/></w:r>'
+            '<w:r><w:t>%s</w:t></w:r>'
+            '<w:r><w:fldChar w:fldCharType="end"/></w:r></w:p>' % (
+                instruction, result))
+
+
+def get_texts(xml):
+    return [node.text for node in etree.fromstring(xml).iter('{%s}t' % W_NS)]
+
+
+class TestFieldRefresh(TestCase):
+
+    def refresh(self, body, values):
+        output = BytesIO()
+        changed = refresh_fields(BytesIO(DOCUMENT_XML % body), output, values)
+        return changed, output.getvalue()
+
+    def test_simple_fields_are_refreshed(self):
+        changed, xml = self.refresh(simple_field('Test', 'Peter'),
+                                    {'Test': 'Hans'})
+        self.assertTrue(changed)
+        self.assertEqual(['Hans'], get_texts(xml))
+        self.assertIn('<w:rPr><w:b/></w:rPr><w:t>Hans</w:t>', xml)
+
+    def test_complex_fields_are_refreshed(self):
+        changed, xml = self.refresh(
+            complex_field(' DOCPROPERTY "Case Number" ', 'old'),
+            {'case number': 42})
+        self.assertTrue(changed)
+        self.assertEqual(['42'], get_texts(xml))
+
+    def test_other_fields_are_left_alone(self):
+        changed, xml = self.refresh(
+            complex_field(' DOCPROPERTY Other ', 'old') +
+            complex_field(' PAGE ', '1'), {'Test': 'Hans'})
+        self.assertFalse(changed)
+        self.assertEqual(['old', '1'], get_texts(xml))
+
+    def test_unchanged_results_are_reported(self):
+        changed, xml = self.refresh(simple_field('Test', 'Peter'),
+                                    {'Test': 'Peter'})
+        self.assertFalse(changed)
+
+    def test_fields_spanning_paragraphs_are_refreshed(self):
+        body = ('<w:p><w:r><w:fldChar w:fldCharType="begin"/></w:r>'
+                '<w:r><w:instrText>DOCPROPERTY Te</w:instrText></w:r>'
+                '<w:r><w:instrText>st</w:instrText></w:r>'
+                '<w:r><w:fldChar w:fldCharType="separate"/></w:r>'
+                '<w:r><w:t>first</w:t></w:r></w:p>'
+                '<w:p><w:r><w:t>second</w:t><w:tab/></w:r>'
+                '<w:r><w:fldChar w:fldCharType="end"/></w:r></w:p>')
+        changed, xml = self.refresh(body, {'Test': ' Hans '})
+        self.assertTrue(changed)
+        self.assertEqual([' Hans '], get_texts(xml))
+        self.assertNotIn('<w:tab/>', xml)
+        self.assertIn('xml:space="preserve"> Hans </w:t>', xml)
+
+    def test_fields_without_result_get_one(self):
+        body = ('<w:p><w:r><w:fldChar w:fldCharType="begin"/></w:r>'
+                '<w:r><w:instrText>DOCPROPERTY Test</w:instrText></w:r>'
+                '<w:r><w:fldChar w:fldCharType="end"/></w:r></w:p>')
+        changed, xml = self.refresh(body, {'Test': 'Hans'})
+        self.assertTrue(changed)
+        self.assertEqual(['Hans'], get_texts(xml))
+        self.assertEqual(
+            ['begin', 'separate', 'end'],
+            [node.get('{%s}fldCharType' % W_NS) for node in
+             etree.fromstring(xml).iter('{%s}fldChar' % W_NS)])
+
+    def test_namespaces_are_only_declared_on_the_root(self):
+        changed, xml = self.refresh(
+            complex_field('DOCPROPERTY Test', 'old') * 100, {'Test': 'Hans'})
+        self.assertEqual(3, xml.count('xmlns:'))
+        self.assertEqual(['Hans'] * 100, get_texts(xml))
+        root = etree.fromstring(xml)
+        self.assertEqual('{%s}document' % W_NS, root.tag)
+        self.assertEqual('w14', root.get('{http://schemas.openxmlformats.org/'
+                                         'markup-compatibility/2006}Ignorable'))
+
+    def test_content_between_and_inside_blocks_is_kept(self):
+        body = ('<w:bookmarkStart w:id="0" w:name="start"/>' +
+                simple_field('Test', 'Peter') +
+                '<w:bookmarkEnd w:id="0"/><w:tbl><w:tr><w:tc>' +
+                simple_field('Test', 'Peter') +
+                '</w:tc></w:tr></w:tbl>')
+        changed, xml = self.refresh(body, {'Test': 'Hans'})
+        self.assertTrue(changed)
+        self.assertEqual(['Hans', 'Hans'], get_texts(xml))
+        self.assertEqual(
+            ['bookmarkStart', 'p', 'bookmarkEnd', 'tbl', 'sectPr'],
+            [etree.QName(node).localname for node in
+             etree.fromstring(xml).find('{%s}body' % W_NS)])
+
+    def test_values_are_formatted_as_text(self):
+        self.assertEqual(u'Y', format_field_value(True))
+        self.assertEqual(u'3', format_field_value(3.0))
+        self.assertEqual(u'2016-10-18', format_field_value(
+            datetime.datetime(2016, 10, 18, 12, 30)))
+        self.assertEqual(u'a, b', format_field_value([u'a', u'b']))
+
+
+class TestDocumentFieldRefresh(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'fields.docx')
+        source = path_to('with_custom_properties.docx')
+        with ZipFile(source) as z:
+            rels = z.read('word/_rels/document.xml.rels')
+        with open(self.path, 'wb') as f:
+            rewrite_zip(source, f, {
+                'word/document.xml': DOCUMENT_XML % (
+                    simple_field('Test', 'Peter') +
+                    complex_field('DOCPROPERTY Other', 'Fritz')),
+                'word/header1.xml': HEADER_XML % complex_field(
+                    'DOCPROPERTY Test', 'Peter').replace(
+                        ' w14:paraId="1"', ''),
+                'word/_rels/document.xml.rels': rels.replace(
+                    '</Relationships>', HEADER_REL + '</Relationships>'),
+            })
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def read_part(self, partname):
+        with ZipFile(self.path) as z:
+            return z.read(partname)
+
+    def test_fields_are_refreshed_in_document_and_headers(self):
+        update_properties(self.path, {'Test': 'Hans'}, refresh_fields=True)
+
+        self.assertEqual([('Test', 'Hans')], list(read_properties(self.path)))
+        self.assertEqual(['Hans', 'Fritz'],
+                         get_texts(self.read_part('word/document.xml')))
+        self.assertEqual(['Hans'],
+                         get_texts(self.read_part('word/header1.xml')))
+
+    def test_fields_are_only_refreshed_when_asked_for(self):
+        update_properties(self.path, {'Test': 'Hans'})
+        self.assertEqual(['Peter', 'Fritz'],
+                         get_texts(self.read_part('word/document.xml')))
+
+    def test_parts_without_changed_fields_are_not_rewritten(self):
+        collected = []
+        update_properties(self.path, {'Other': 'Fritz'}, refresh_fields=True,
+                          on_stats=collected.append)
+        stats, = collected
+        self.assertEqual(1, stats.entries_recompressed)
+
+    def test_fields_are_refreshed_in_extracted_documents(self):
+        with OOXMLDocument(self.path) as doc:
+            doc.update_properties({'Test': 'Hans'}, refresh_fields=True)
+        self.assertEqual(['Hans'],
+                         get_texts(self.read_part('word/header1.xml')))
+
+    def test_other_documents_have_no_fields_to_refresh(self):
+        data = build_package('application/vnd.openxmlformats-officedocument.'
+                             'spreadsheetml.sheet.main+xml')
+        with OOXMLDocument(data, in_memory=True, read_only=True) as doc:
+            self.assertEqual([], doc.get_field_partnames())
@@ -0,0 +1,63 @@
+from io import BytesIO
+from ooxml_docprops import is_supported_mimetype
+from ooxml_docprops import read_properties
+from ooxml_docprops import update_properties
+from ooxml_docprops.config import MAIN_PART_MIME_TYPES
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.tests.assets import TestAsset
+from ooxml_docprops.tests.assets import build_package
+from unittest2 import TestCase
+from zipfile import ZipFile
+
+
+class TestSupportedFormats(TestCase):
+
+    def test_all_main_part_types_are_supported(self):
+        for mime_type in MAIN_PART_MIME_TYPES.values():
+            self.assertTrue(is_supported_mimetype(mime_type), mime_type)
+
+    def test_spreadsheets_presentations_and_templates_are_supported(self):
+        for mime_type in (
+                'application/vnd.openxmlformats-officedocument.'
+                'spreadsheetml.sheet',
+                'application/vnd.openxmlformats-officedocument.'
+                'presentationml.presentation',
+                'application/vnd.openxmlformats-officedocument.'
+                'wordprocessingml.template',
+                'application/vnd.ms-excel.sheet.macroEnabled.12'):
+            self.assertTrue(is_supported_mimetype(mime_type))
+        self.assertFalse(is_supported_mimetype('application/msword'))
+
+    def test_mime_type_is_determined_by_the_main_part(self):
+        for content_type, mime_type in MAIN_PART_MIME_TYPES.items():
+            with OOXMLDocument(build_package(content_type), read_only=True,
+                               in_memory=True) as doc:
+                self.assertEqual(content_type, doc.get_main_content_type())
+                self.assertEqual(mime_type, doc.get_mime_type())
+
+    def test_mime_type_of_docx(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                self.assertEqual(
+                    'application/vnd.openxmlformats-officedocument.'
+                    'wordprocessingml.document', doc.get_mime_type())
+
+    def test_content_type_falls_back_to_default_by_extension(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                self.assertEqual(
+                    'application/vnd.openxmlformats-package.'
+                    'relationships+xml',
+                    doc.content_types.get_content_type('/_rels/.RELS'))
+                self.assertIsNone(
+                    doc.content_types.get_content_type('/media/image.gif'))
+
+    def test_properties_are_updated_in_every_format(self):
+        for content_type in MAIN_PART_MIME_TYPES:
+            package = build_package(content_type, 'xl/workbook.xml')
+            updated = update_properties(package, {'Test': 'Hans'})
+
+            self.assertEqual([('Test', 'Hans')],
+                             list(read_properties(updated)))
+            with ZipFile(BytesIO(updated)) as z:
+                self.assertEqual('<document/>', z.read('xl/workbook.xml'))
@@ -0,0 +1,119 @@
+from io import BytesIO
+from ooxml_docprops import read_all_properties
+from ooxml_docprops import update_properties
+from ooxml_docprops.instrumentation import OperationStats
+from ooxml_docprops.instrumentation import PHASES
+from ooxml_docprops.instrumentation import log_stats
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.template import PreparedTemplate
+from ooxml_docprops.tests.assets import TestAsset
+from ooxml_docprops.tests.assets import path_to
+from unittest2 import TestCase
+from zipfile import ZipFile
+import logging
+import os
+import time
+
+
+class CollectingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestOperationStats(TestCase):
+
+    def test_nested_phases_do_not_overlap(self):
+        stats = OperationStats()
+        with stats.measure('commit'):
+            with stats.measure('zip'):
+                time.sleep(0.02)
+        self.assertGreaterEqual(stats.timings['zip'], 0.02)
+        self.assertLess(stats.timings['commit'], 0.02)
+
+    def test_stats_are_logged_as_structured_record(self):
+        logger = logging.getLogger('ooxml_docprops.tests.instrumentation')
+        handler = CollectingHandler()
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        try:
+            stats = OperationStats('/tmp/test.docx')
+            stats.bytes_written = 42
+            stats.finish()
+            log_stats(stats, logger=logger)
+        finally:
+            logger.removeHandler(handler)
+
+        record, = handler.records
+        self.assertEqual(42, record.ooxml_stats['bytes_written'])
+        self.assertEqual('/tmp/test.docx', record.ooxml_stats['document'])
+        self.assertEqual(set(PHASES), set(record.ooxml_stats['timings']))
+
+
+class TestOperationInstrumentation(TestCase):
+
+    def test_update_in_place_is_measured(self):
+        collected = []
+        with TestAsset('with_custom_properties.docx') as asset:
+            update_properties(asset.path, {'Test': 'Hans'},
+                              on_stats=collected.append)
+            size = os.path.getsize(asset.path)
+
+        stats, = collected
+        self.assertEqual(asset.path, stats.document)
+        self.assertFalse(stats.failed)
+        self.assertEqual(size, stats.bytes_written)
+        self.assertEqual(1, stats.entries_recompressed)
+        self.assertGreater(stats.entries_copied, 0)
+        self.assertGreater(stats.bytes_read, 0)
+        for phase in ('parse', 'mutate', 'serialize', 'zip', 'commit'):
+            self.assertGreater(stats.timings[phase], 0, phase)
+        self.assertGreaterEqual(stats.duration, sum(stats.timings.values()))
+
+    def test_source_bytes_are_counted_once(self):
+        for in_memory in (True, False):
+            collected = []
+            with TestAsset('with_custom_properties.docx') as asset:
+                with ZipFile(asset.path) as z:
+                    size = sum(zinfo.compress_size for zinfo in z.infolist())
+                with OOXMLDocument(asset.path, in_memory=in_memory,
+                                   on_stats=collected.append) as doc:
+                    doc.update_properties({'Test': 'Hans'})
+
+            stats, = collected
+            self.assertEqual(size, stats.bytes_read, in_memory)
+
+    def test_unchanged_documents_are_not_rewritten(self):
+        collected = []
+        with TestAsset('with_custom_properties.docx') as asset:
+            update_properties(asset.path, {'Test': 'Peter'},
+                              on_stats=collected.append)
+
+        stats, = collected
+        self.assertEqual(0, stats.bytes_written)
+        self.assertEqual(0, stats.entries_recompressed)
+
+    def test_failed_operations_are_reported(self):
+        collected = []
+        with self.assertRaises(IOError):
+            read_all_properties(path_to('missing.docx'),
+                                on_stats=collected.append)
+
+        stats, = collected
+        self.assertTrue(stats.failed)
+
+    def test_stamped_copies_are_measured(self):
+        collected = []
+        template = PreparedTemplate(path_to('with_custom_properties.docx'),
+                                    on_stats=collected.append)
+        output = BytesIO()
+        template.stamp({'Test': 'Hans'}, output)
+
+        stats = collected[-1]
+        self.assertEqual(len(output.getvalue()), stats.bytes_written)
+        self.assertEqual(1, stats.entries_recompressed)
+        self.assertGreater(stats.timings['serialize'], 0)
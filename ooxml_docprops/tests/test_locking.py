@@ -0,0 +1,116 @@
+from ooxml_docprops import ConcurrentModificationError
+from ooxml_docprops import LockTimeout
+from ooxml_docprops import locking
+from ooxml_docprops import read_properties
+from ooxml_docprops import update_properties
+from ooxml_docprops.locking import DocumentLock
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.tests.assets import path_to
+from ooxml_docprops.tests.assets import run_threads
+from unittest2 import TestCase
+import os
+import shutil
+import tempfile
+
+
+class TestDocumentLock(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'test.docx')
+        shutil.copy(path_to('with_custom_properties.docx'), self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_lock_is_held_by_one_user_at_a_time(self):
+        with DocumentLock(self.path):
+            with self.assertRaises(LockTimeout):
+                DocumentLock(self.path, timeout=0).acquire()
+
+        with DocumentLock(self.path, timeout=0) as lock:
+            self.assertTrue(lock.locked)
+        self.assertFalse(lock.locked)
+
+    def test_lock_file_only_exists_while_locked(self):
+        with DocumentLock(self.path):
+            self.assertIn('.test.docx.lock', os.listdir(self.tempdir))
+        self.assertEqual(['test.docx'], os.listdir(self.tempdir))
+
+    def test_lock_files_of_crashed_processes_are_reused(self):
+        open(os.path.join(self.tempdir, '.test.docx.lock'), 'w').close()
+        with DocumentLock(self.path, timeout=0) as lock:
+            self.assertTrue(lock.locked)
+        self.assertEqual(['test.docx'], os.listdir(self.tempdir))
+
+    def test_lock_files_are_created_exclusively_without_fcntl(self):
+        original_fcntl = locking.fcntl
+        locking.fcntl = None
+        try:
+            with DocumentLock(self.path):
+                with self.assertRaises(LockTimeout):
+                    DocumentLock(self.path, timeout=0.1).acquire()
+            self.assertEqual(['test.docx'], os.listdir(self.tempdir))
+        finally:
+            locking.fcntl = original_fcntl
+
+    def test_stale_lock_files_are_broken_without_fcntl(self):
+        lock_path = os.path.join(self.tempdir, '.test.docx.lock')
+        open(lock_path, 'w').close()
+        original_fcntl = locking.fcntl
+        locking.fcntl = None
+        try:
+            with self.assertRaises(LockTimeout):
+                DocumentLock(self.path, timeout=0.1).acquire()
+
+            os.utime(lock_path, (0, 0))
+            with DocumentLock(self.path, timeout=1) as lock:
+                self.assertTrue(lock.locked)
+        finally:
+            locking.fcntl = original_fcntl
+
+
+class TestConcurrentUpdates(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'test.docx')
+        shutil.copy(path_to('with_custom_properties.docx'), self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_changes_made_since_reading_are_not_overwritten(self):
+        with self.assertRaises(ConcurrentModificationError):
+            with OOXMLDocument(self.path, in_memory=True) as doc:
+                doc.update_properties({'Test': 'Hans'})
+                update_properties(self.path, {'Other': 'Fritz'})
+
+        self.assertEqual([('Test', 'Peter'), ('Other', 'Fritz')],
+                         list(read_properties(self.path)))
+        self.assertItemsEqual(['test.docx'],
+                              [filename for filename in
+                               os.listdir(self.tempdir)
+                               if not filename.endswith('.lock')])
+
+    def test_locked_updates_fail_fast_with_timeout(self):
+        with DocumentLock(self.path):
+            with self.assertRaises(LockTimeout):
+                update_properties(self.path, {'Test': 'Hans'},
+                                  locking=True, lock_timeout=0)
+
+        self.assertEqual([('Test', 'Peter')],
+                         list(read_properties(self.path)))
+
+    def test_locked_updates_of_the_same_document_are_queued(self):
+        def update(index):
+            update_properties(self.path, {'Worker%d' % index: index},
+                              locking=True)
+
+        errors = run_threads([lambda index=index: update(index)
+                              for index in range(8)])
+
+        self.assertEqual([], errors)
+        properties = dict(read_properties(self.path))
+        for index in range(8):
+            self.assertEqual(index, properties['Worker%d' % index])
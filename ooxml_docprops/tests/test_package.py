@@ -0,0 +1,285 @@
+from datetime import datetime
+from io import BytesIO
+from ooxml_docprops import read_properties
+from ooxml_docprops import copy_with_properties
+from ooxml_docprops import package
+from ooxml_docprops import update_properties
+from ooxml_docprops.package import FSYNC_POLICIES
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.tests.assets import path_to
+from ooxml_docprops.tests.assets import TestAsset
+from unittest2 import TestCase
+from zipfile import ZipFile
+from threading import Thread
+import os
+import shutil
+import stat
+import tempfile
+
+
+class TestInMemoryPackage(TestCase):
+
+    def test_in_memory_documents_are_not_extracted(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path, in_memory=True) as doc:
+                self.assertIsNone(doc.workdir)
+                self.assertEqual('Peter',
+                                 doc.properties.get_property_value('Test'))
+
+    def test_in_memory_documents_do_not_create_temporary_files(self):
+        tempdir = tempfile.mkdtemp()
+        original_tempdir = tempfile.tempdir
+        tempfile.tempdir = tempdir
+        try:
+            with TestAsset('with_custom_properties.docx') as asset:
+                with OOXMLDocument(asset.path, in_memory=True,
+                                   read_only=True) as doc:
+                    doc.properties.get_property_names()
+                    self.assertEqual([os.path.basename(asset.path)],
+                                     os.listdir(tempdir))
+        finally:
+            tempfile.tempdir = original_tempdir
+            os.rmdir(tempdir)
+
+    def test_properties_can_be_updated_in_memory(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path, in_memory=True) as doc:
+                doc.update_properties({'Test': 'Hanspeter'})
+
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                self.assertEqual('Hanspeter',
+                                 doc.properties.get_property_value('Test'))
+
+    def test_properties_can_be_added_in_memory(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path, in_memory=True) as doc:
+                self.assertEqual([], doc.properties.get_property_names())
+                doc.update_properties({'Hans': 'Peter'})
+                self.assertEqual(['Hans'],
+                                 doc.properties.get_property_names())
+
+            with ZipFile(asset.path) as z:
+                self.assertIn('docProps/custom.xml', z.namelist())
+                self.assertIn('/docProps/custom.xml',
+                              z.read('[Content_Types].xml'))
+
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                self.assertEqual('Peter',
+                                 doc.properties.get_property_value('Hans'))
+
+
+class TestPackageStreams(TestCase):
+
+    def asset_data(self, filename):
+        with open(path_to(filename), 'rb') as f:
+            return f.read()
+
+    def test_update_properties_of_bytes_returns_bytes(self):
+        data = self.asset_data('with_custom_properties.docx')
+        updated = update_properties(data, {'Test': 'Hans'})
+
+        self.assertEqual([('Test', 'Hans')], list(read_properties(updated)))
+        self.assertEqual([('Test', 'Peter')], list(read_properties(data)))
+
+    def test_bytearray_and_memoryview_are_supported(self):
+        data = self.asset_data('with_custom_properties.docx')
+        for document in (bytearray(data), memoryview(data)):
+            updated = update_properties(document, {'Test': 'Hans'})
+            self.assertEqual([('Test', 'Hans')],
+                             list(read_properties(updated)))
+            self.assertEqual([('Test', 'Peter')],
+                             list(read_properties(document)))
+
+    def test_file_like_objects_can_be_updated_into_output_streams(self):
+        data = self.asset_data('without_custom_properties.docx')
+        for in_memory in (False, True):
+            output = BytesIO()
+            with OOXMLDocument(BytesIO(data), output=output,
+                               in_memory=in_memory) as doc:
+                doc.update_properties({'Hans': 'Peter'})
+
+            self.assertIsNone(doc.getvalue())
+            output.seek(0)
+            self.assertEqual([('Hans', 'Peter')],
+                             list(read_properties(output)))
+
+    def test_documents_given_as_path_are_not_modified_with_output(self):
+        output = BytesIO()
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path, output=output,
+                               in_memory=True) as doc:
+                doc.update_properties({'Test': 'Hans'})
+
+            self.assertEqual([('Test', 'Peter')],
+                             list(read_properties(asset.path)))
+        self.assertEqual([('Test', 'Hans')],
+                         list(read_properties(output.getvalue())))
+
+    def test_unicode_paths_are_supported(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            self.assertIsNone(update_properties(unicode(asset.path),
+                                                {'Test': 'Hans'}))
+            self.assertEqual([('Test', 'Hans')],
+                             list(read_properties(asset.path)))
+
+
+class TestAtomicCommit(TestCase):
+
+    def setUp(self):
+        # A private directory, so other files do not show up in listings
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'test.docx')
+        shutil.copy(path_to('with_custom_properties.docx'), self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_file_mode_is_preserved(self):
+        os.chmod(self.path, 0o640)
+        update_properties(self.path, {'Test': 'Hans'})
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(self.path).st_mode))
+
+    def test_original_is_replaced_by_a_sibling_file(self):
+        inode_before = os.stat(self.path).st_ino
+
+        for fsync in FSYNC_POLICIES:
+            with OOXMLDocument(self.path, fsync=fsync) as doc:
+                doc.update_properties({'Test': fsync})
+            self.assertEqual([('Test', fsync)],
+                             list(read_properties(self.path)))
+
+        self.assertNotEqual(inode_before, os.stat(self.path).st_ino)
+        self.assertEqual(['test.docx'], os.listdir(self.tempdir))
+
+    def test_original_is_kept_if_packing_fails(self):
+        def failing_rewrite_zip(*args, **kwargs):
+            raise IOError('disk full')
+
+        original_rewrite_zip = package.rewrite_zip
+        package.rewrite_zip = failing_rewrite_zip
+        try:
+            with self.assertRaises(IOError):
+                update_properties(self.path, {'Test': 'Hans'})
+        finally:
+            package.rewrite_zip = original_rewrite_zip
+
+        self.assertEqual(['test.docx'], os.listdir(self.tempdir))
+        self.assertEqual([('Test', 'Peter')],
+                         list(read_properties(self.path)))
+
+
+class TestCopyWithProperties(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tempdir, 'template.docx')
+        shutil.copy(path_to('with_custom_properties.docx'), self.source)
+        os.chmod(self.source, 0o640)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_copy_is_written_to_destination_path(self):
+        destination = os.path.join(self.tempdir, 'copy.docx')
+        with open(self.source, 'rb') as f:
+            source_data = f.read()
+
+        copy_with_properties(self.source, destination, {'Test': 'Hans'})
+
+        self.assertEqual([('Test', 'Hans')],
+                         list(read_properties(destination)))
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(destination).st_mode))
+        with open(self.source, 'rb') as f:
+            self.assertEqual(source_data, f.read())
+        self.assertEqual(['copy.docx', 'template.docx'],
+                         sorted(os.listdir(self.tempdir)))
+
+    def test_copies_of_data_get_the_default_mode(self):
+        destination = os.path.join(self.tempdir, 'copy.docx')
+        with open(self.source, 'rb') as f:
+            data = f.read()
+
+        umask = os.umask(0o027)
+        try:
+            copy_with_properties(data, destination, {'Test': 'Hans'})
+        finally:
+            os.umask(umask)
+
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(destination).st_mode))
+        self.assertEqual([('Test', 'Hans')],
+                         list(read_properties(destination)))
+
+    def test_unchanged_copies_are_written_as_well(self):
+        destination = os.path.join(self.tempdir, 'copy.docx')
+        copy_with_properties(self.source, destination, {'Test': 'Peter'})
+        self.assertEqual([('Test', 'Peter')],
+                         list(read_properties(destination)))
+
+    def test_existing_destinations_are_replaced(self):
+        destination = os.path.join(self.tempdir, 'copy.docx')
+        copy_with_properties(self.source, destination, {'Test': 'Hans'})
+        copy_with_properties(self.source, destination, {'Test': 'Fritz'})
+        self.assertEqual([('Test', 'Fritz')],
+                         list(read_properties(destination)))
+
+    def test_source_cannot_be_its_own_destination(self):
+        with self.assertRaises(ValueError):
+            copy_with_properties(self.source, self.source, {'Test': 'Hans'})
+
+    def test_concurrent_copies_of_the_same_source(self):
+        def copy(i):
+            copy_with_properties(
+                self.source, os.path.join(self.tempdir, '%d.docx' % i),
+                {'Test': 'Copy %d' % i})
+
+        threads = [Thread(target=copy, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i in range(8):
+            self.assertEqual(
+                [('Test', 'Copy %d' % i)],
+                list(read_properties(
+                    os.path.join(self.tempdir, '%d.docx' % i))))
+        self.assertEqual([('Test', 'Peter')],
+                         list(read_properties(self.source)))
+
+
+class TestSkipUnchanged(TestCase):
+
+    def test_documents_are_not_rewritten_if_nothing_changed(self):
+        now = datetime(2016, 10, 18, 13, 37)
+        metadata = {'Test': 'Peter', 'Number': 42, 'Flag': True, 'Date': now}
+        with TestAsset('with_custom_properties.docx') as asset:
+            update_properties(asset.path, metadata)
+            stat_before = os.stat(asset.path)
+
+            for in_memory in (False, True):
+                with OOXMLDocument(asset.path, in_memory=in_memory) as doc:
+                    doc.update_properties(metadata)
+                    self.assertFalse(doc.is_modified)
+
+                self.assertFalse(doc.changed)
+                stat_after = os.stat(asset.path)
+                self.assertEqual(stat_before.st_ino, stat_after.st_ino)
+                self.assertEqual(stat_before.st_mtime, stat_after.st_mtime)
+
+    def test_documents_are_rewritten_if_a_value_changed(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            inode_before = os.stat(asset.path).st_ino
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({'Test': 'Peter', 'New': 1})
+                self.assertTrue(doc.is_modified)
+
+            self.assertTrue(doc.changed)
+            self.assertNotEqual(inode_before, os.stat(asset.path).st_ino)
+
+    def test_empty_update_of_document_without_properties(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({})
+                self.assertEqual([], doc.properties.get_property_names())
+
+            self.assertFalse(doc.changed)
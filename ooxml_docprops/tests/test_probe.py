@@ -0,0 +1,72 @@
+from io import BytesIO
+from ooxml_docprops import probe_package
+from ooxml_docprops.tests.assets import TestAsset
+from ooxml_docprops.tests.assets import build_package
+from ooxml_docprops.tests.assets import path_to
+from unittest2 import TestCase
+from zipfile import ZipFile
+
+
+class TestProbePackage(TestCase):
+
+    def test_document_with_custom_properties(self):
+        info = probe_package(path_to('with_custom_properties.docx'))
+
+        self.assertTrue(info.valid)
+        self.assertIsNone(info.error)
+        self.assertEqual('application/vnd.openxmlformats-officedocument.'
+                         'wordprocessingml.document', info.mime_type)
+        self.assertEqual('word/document.xml', info.main_partname)
+        self.assertEqual('docProps/custom.xml',
+                         info.custom_properties_partname)
+
+    def test_document_without_custom_properties(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            info = probe_package(asset.path)
+
+        self.assertTrue(info.valid)
+        self.assertIsNone(info.custom_properties_partname)
+
+    def test_spreadsheet_given_as_bytes(self):
+        info = probe_package(build_package(
+            'application/vnd.ms-excel.sheet.macroEnabled.main+xml',
+            'xl/workbook.xml'))
+
+        self.assertTrue(info.valid)
+        self.assertEqual('application/vnd.ms-excel.sheet.macroEnabled.12',
+                         info.mime_type)
+        self.assertEqual(
+            'application/vnd.ms-excel.sheet.macroEnabled.main+xml',
+            info.main_content_type)
+
+    def test_unknown_main_part_content_type(self):
+        info = probe_package(build_package('application/xml'))
+
+        self.assertTrue(info.valid)
+        self.assertIsNone(info.mime_type)
+
+    def test_invalid_packages(self):
+        self.assertFalse(probe_package(b'no zip file\x00').valid)
+        self.assertFalse(probe_package(b'PK\x03\x04 truncated').valid)
+        self.assertIn('BadZipfile',
+                      probe_package(b'%PDF-1.4\n\x00\xe2\xe3').error)
+        self.assertIn('BadZipfile',
+                      probe_package(BytesIO(b'no zip file')).error)
+
+        output = BytesIO()
+        with ZipFile(output, 'w') as z:
+            z.writestr('document.xml', '<document/>')
+        info = probe_package(output.getvalue())
+        self.assertFalse(info.valid)
+        self.assertIn('KeyError', info.error)
+
+    def test_package_without_main_part(self):
+        output = BytesIO()
+        with ZipFile(BytesIO(build_package('application/xml'))) as source:
+            with ZipFile(output, 'w') as z:
+                for name in ('[Content_Types].xml', '_rels/.rels'):
+                    z.writestr(name, source.read(name))
+
+        info = probe_package(output.getvalue())
+        self.assertFalse(info.valid)
+        self.assertEqual('The package has no main document part', info.error)
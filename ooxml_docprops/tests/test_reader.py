@@ -0,0 +1,144 @@
+from collections import OrderedDict
+from copy import deepcopy
+from datetime import datetime
+from io import BytesIO
+from ooxml_docprops import iter_custom_property_records
+from ooxml_docprops import read_properties
+from ooxml_docprops import update_properties
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.reader import PropertyRecord
+from ooxml_docprops.reader import iter_property_records
+from ooxml_docprops.tests.assets import TestAsset
+from unittest2 import TestCase
+import os
+import tempfile
+
+
+class TestReadProperties(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.original_tempdir = tempfile.tempdir
+        tempfile.tempdir = self.tempdir
+
+    def tearDown(self):
+        tempfile.tempdir = self.original_tempdir
+        os.rmdir(self.tempdir)
+
+    def test_read_properties_of_document_with_properties(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            self.assertEqual([('Test', 'Peter')],
+                             list(read_properties(asset.path)))
+
+    def test_read_properties_of_document_without_properties(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            self.assertEqual([], list(read_properties(asset.path)))
+
+    def test_read_properties_returns_typed_values_in_document_order(self):
+        now = datetime(2016, 10, 18, 13, 37)
+        with TestAsset('with_custom_properties.docx') as asset:
+            update_properties(asset.path, {'Number': 42})
+            update_properties(asset.path, {'Flag': True})
+            update_properties(asset.path, {'Date': now})
+
+            self.assertEqual(
+                [('Test', 'Peter'), ('Number', 42), ('Flag', True),
+                 ('Date', now)],
+                list(read_properties(asset.path)))
+
+    def test_read_properties_projection(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            update_properties(asset.path, OrderedDict([
+                ('dossier_reference', 'A-1'), ('document_id', 7),
+                ('dossier_title', 'Test')]))
+
+            self.assertEqual(
+                [('Test', 'Peter'), ('document_id', 7)],
+                list(read_properties(asset.path,
+                                     names=['document_id', 'Test'])))
+            self.assertEqual(
+                ['dossier_reference', 'dossier_title'],
+                [name for name, value in read_properties(
+                    asset.path, prefix='dossier_')])
+            self.assertEqual(
+                [('document_id', 7), ('dossier_title', 'Test')],
+                list(read_properties(asset.path, names=['document_id'],
+                                     pattern='*_title')))
+            self.assertEqual([], list(read_properties(asset.path, names=[])))
+
+    def test_first_of_duplicated_properties_is_read(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                root = doc.properties.tree.getroot()
+                duplicate = deepcopy(root[0])
+                duplicate.attrib['pid'] = '3'
+                duplicate[0].text = u'Dup'
+                root.append(duplicate)
+                doc.properties.mark_dirty()
+
+            self.assertEqual([('Test', 'Peter')],
+                             list(read_properties(asset.path)))
+            update_properties(asset.path, {'Test': 'New'})
+            self.assertEqual([('Test', 'New')],
+                             list(read_properties(asset.path)))
+            self.assertEqual([('Test', 'New')],
+                             list(read_properties(asset.path, prefix='T')))
+
+    def test_read_properties_does_not_leave_temporary_files(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            list(read_properties(asset.path))
+            self.assertEqual([os.path.basename(asset.path)],
+                             os.listdir(self.tempdir))
+
+    def test_read_only_documents_remove_their_workdir(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                self.assertTrue(os.path.isdir(doc.workdir))
+            self.assertFalse(os.path.exists(doc.workdir))
+            self.assertEqual([os.path.basename(asset.path)],
+                             os.listdir(self.tempdir))
+
+
+class TestPropertyRecords(TestCase):
+
+    PART = (
+        '<Properties xmlns="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/custom-properties" xmlns:vt="http://schemas.'
+        'openxmlformats.org/officeDocument/2006/docPropsVTypes">'
+        '<property fmtid="{D5CDD505-2E9C-101B-9397-08002B2CF9AE}" pid="2" '
+        'name="A"><vt:lpwstr>a</vt:lpwstr></property>'
+        '<property fmtid="{D5CDD505-2E9C-101B-9397-08002B2CF9AE}" pid="3" '
+        'name="B"><vt:i4>2</vt:i4></property>'
+        '<property fmtid="{D5CDD505-2E9C-101B-9397-08002B2CF9AE}" pid="4" '
+        'name="C"><vt:r8>0.5</vt:r8></property>')
+
+    def test_records_contain_pid_and_value_type(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            update_properties(asset.path, {'Number': 42})
+            self.assertEqual(
+                [PropertyRecord('Test', 2, 'lpwstr', 'Peter'),
+                 PropertyRecord('Number', 3, 'i4', 42)],
+                list(iter_custom_property_records(asset.path)))
+
+    def test_only_wanted_properties_are_yielded(self):
+        records = iter_property_records(BytesIO(self.PART + '</Properties>'),
+                                        names=['C', 'A', 'Missing'])
+        self.assertEqual([('A', 'a'), ('C', 0.5)],
+                         [(record.name, record.value) for record in records])
+
+    def test_parsing_stops_when_all_wanted_properties_are_found(self):
+        # The part is truncated after property C
+        self.assertEqual(
+            [PropertyRecord('B', 3, 'i4', 2)],
+            list(iter_property_records(BytesIO(self.PART), names=['B'])))
+        self.assertEqual(
+            [], list(iter_property_records(BytesIO(self.PART), names=[])))
+
+    def test_very_large_values_are_read(self):
+        value = u'x' * (11 * 1024 * 1024)
+        with TestAsset('without_custom_properties.docx') as asset:
+            update_properties(asset.path, {'Blob': value})
+            update_properties(asset.path, {'After': 1})
+            properties = dict(read_properties(asset.path))
+            self.assertEqual(1, properties['After'])
+            self.assertTrue(properties['Blob'] == value)
@@ -0,0 +1,73 @@
+from decimal import Decimal
+from ooxml_docprops import read_properties
+from ooxml_docprops import update_properties
+from ooxml_docprops.datatypes import ValidationError
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.schema import PropertySchema
+from ooxml_docprops.schema import SchemaValidationError
+from ooxml_docprops.tests.assets import TestAsset
+from unittest2 import TestCase
+
+
+class TestPropertySchema(TestCase):
+
+    def setUp(self):
+        self.schema = PropertySchema()
+        self.schema.register('Amount', 'cy', coerce=Decimal)
+        self.schema.register('Ratio', 'r8')
+        self.schema.register('Tags', 'vector', base_type='lpwstr')
+
+    def test_values_are_coerced(self):
+        self.assertEqual({'Amount': Decimal('1.5'), 'Other': 1},
+                         dict(self.schema.prepare(
+                             {'Amount': '1.5', 'Other': 1})))
+
+    def test_all_invalid_values_are_reported_at_once(self):
+        with self.assertRaises(SchemaValidationError) as cm:
+            self.schema.prepare({'Amount': 'abc', 'Ratio': 'x', 'Tags': [],
+                                 'Other': object()})
+        self.assertEqual(['Amount', 'Other', 'Ratio'],
+                         sorted(cm.exception.errors))
+
+    def test_strict_schemas_reject_unknown_properties(self):
+        self.schema.strict = True
+        with self.assertRaises(SchemaValidationError) as cm:
+            self.schema.prepare({'Ratio': 0.5, 'Other': 1})
+        self.assertEqual(['Other'], cm.exception.errors.keys())
+
+    def test_unknown_value_types_cannot_be_registered(self):
+        with self.assertRaises(ValueError):
+            self.schema.register('Test', 'i3')
+
+    def test_documents_are_updated_according_to_the_schema(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            update_properties(asset.path, {
+                'Amount': 3, 'Ratio': 2, 'Tags': ('a', 'b')},
+                schema=self.schema)
+
+            self.assertEqual(
+                {'Amount': Decimal('3'), 'Ratio': 2.0, 'Tags': ['a', 'b']},
+                dict(read_properties(asset.path)))
+
+    def test_invalid_metadata_leaves_the_document_untouched(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            with open(asset.path, 'rb') as f:
+                original = f.read()
+            with self.assertRaises(SchemaValidationError):
+                with OOXMLDocument(asset.path, schema=self.schema) as doc:
+                    doc.update_properties({'Ratio': 1.0, 'Amount': 'abc'})
+
+            with open(asset.path, 'rb') as f:
+                self.assertEqual(original, f.read())
+
+    def test_schema_type_must_match_existing_properties(self):
+        self.schema.register('Test', 'i4', coerce=int)
+        with TestAsset('with_custom_properties.docx') as asset:
+            with self.assertRaises(ValidationError):
+                update_properties(asset.path, {'Test': '5'},
+                                  schema=self.schema)
+
+            with OOXMLDocument(asset.path, force=True,
+                               schema=self.schema) as doc:
+                doc.update_properties({'Test': '5'})
+            self.assertEqual([('Test', 5)], list(read_properties(asset.path)))
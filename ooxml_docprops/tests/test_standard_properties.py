@@ -0,0 +1,136 @@
+from datetime import datetime
+from io import BytesIO
+from ooxml_docprops import read_all_properties
+from ooxml_docprops import update_properties
+from ooxml_docprops.datatypes import ValidationError
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.tests.assets import TestAsset
+from unittest2 import TestCase
+from zipfile import ZipFile
+import iso8601
+import re
+
+
+def remove_standard_properties(path):
+    """Strip the core and extended properties parts from the package."""
+    with open(path, 'rb') as f:
+        source_data = BytesIO(f.read())
+    with ZipFile(source_data) as source, ZipFile(path, 'w') as target:
+        for info in source.infolist():
+            if info.filename in ('docProps/core.xml', 'docProps/app.xml'):
+                continue
+            data = source.read(info)
+            if info.filename in ('_rels/.rels', '[Content_Types].xml'):
+                data = re.sub(r'<(Relationship|Override)[^>]*'
+                              r'(core-properties|extended-properties)[^>]*/>',
+                              '', data)
+            target.writestr(info, data)
+
+
+class TestCoreProperties(TestCase):
+
+    def test_read_core_properties(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                core = doc.core_properties
+                self.assertEqual('David Erni',
+                                 core.get_property_value('creator'))
+                self.assertEqual(
+                    datetime(2014, 5, 21, 12, 46, tzinfo=iso8601.UTC),
+                    core.get_property_value('modified'))
+                self.assertEqual(u'', core.get_property_value('title'))
+                self.assertIsNone(core.get_property_value('language'))
+
+    def test_update_core_properties(self):
+        modified = datetime(2016, 10, 18, 13, 37, tzinfo=iso8601.UTC)
+        with TestAsset('with_custom_properties.docx') as asset:
+            update_properties(asset.path, {'Test': 'Hans'},
+                              core={'title': 'Report', 'modified': modified,
+                                    'language': 'de-CH'})
+
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                core = doc.core_properties
+                self.assertEqual('Report', core.get_property_value('title'))
+                self.assertEqual('de-CH', core.get_property_value('language'))
+                self.assertEqual(modified,
+                                 core.get_property_value('modified'))
+                self.assertEqual('Hans',
+                                 doc.properties.get_property_value('Test'))
+
+    def test_unknown_or_invalid_core_properties_raise(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                with self.assertRaises(ValidationError):
+                    doc.update_properties({}, core={'foo': 'bar'})
+                with self.assertRaises(ValidationError):
+                    doc.update_properties({}, core={'modified': 'today'})
+                with self.assertRaises(ValidationError):
+                    doc.update_properties(
+                        {}, core={'modified': datetime(2016, 10, 18)})
+
+    def test_datetimes_in_other_timezones_are_read_back_equal(self):
+        created = iso8601.parse_date('2016-10-18T15:37:00+02:00')
+        with TestAsset('with_custom_properties.docx') as asset:
+            update_properties(asset.path, {}, core={'created': created})
+
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                read = doc.core_properties.get_property_value('created')
+        self.assertEqual(created, read)
+        self.assertEqual(iso8601.UTC, read.tzinfo)
+
+    def test_missing_parts_are_created_when_updated(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            remove_standard_properties(asset.path)
+            with OOXMLDocument(asset.path, in_memory=True) as doc:
+                self.assertEqual({}, doc.core_properties.get_properties())
+                doc.update_properties({}, core={'title': 'Report'},
+                                      extended={'Company': '4teamwork'})
+
+            with ZipFile(asset.path) as z:
+                self.assertIn('/docProps/core.xml',
+                              z.read('[Content_Types].xml'))
+                self.assertIn('core-properties', z.read('_rels/.rels'))
+
+            properties = read_all_properties(asset.path)
+            self.assertEqual({'title': 'Report'}, properties['core'])
+            self.assertEqual({'Company': '4teamwork'},
+                             properties['extended'])
+
+    def test_missing_parts_are_not_created_when_only_read(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            remove_standard_properties(asset.path)
+            with OOXMLDocument(asset.path) as doc:
+                doc.get_all_properties()
+            self.assertFalse(doc.changed)
+
+
+class TestExtendedProperties(TestCase):
+
+    def test_read_all_properties(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            properties = read_all_properties(asset.path)
+
+        self.assertEqual({'Test': 'Peter'}, properties['custom'])
+        self.assertEqual('David Erni', properties['core']['creator'])
+        self.assertEqual('Normal.dotm', properties['extended']['Template'])
+        self.assertEqual(1, properties['extended']['Pages'])
+        self.assertEqual(False, properties['extended']['ScaleCrop'])
+        self.assertNotIn('HeadingPairs', properties['extended'])
+
+    def test_update_extended_properties(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            update_properties(asset.path, {},
+                              extended={'Company': '4teamwork', 'Pages': 3,
+                                        'SharedDoc': True})
+
+            extended = read_all_properties(asset.path)['extended']
+            self.assertEqual('4teamwork', extended['Company'])
+            self.assertEqual(3, extended['Pages'])
+            self.assertTrue(extended['SharedDoc'])
+
+    def test_unchanged_extended_properties_do_not_rewrite(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({}, extended={'Pages': 1,
+                                                    'ScaleCrop': False})
+            self.assertFalse(doc.changed)
@@ -0,0 +1,115 @@
+from io import BytesIO
+from ooxml_docprops import read_properties
+from ooxml_docprops.schema import PropertySchema
+from ooxml_docprops.schema import SchemaValidationError
+from ooxml_docprops.template import PreparedTemplate
+from ooxml_docprops.tests.assets import path_to
+from threading import Thread
+from unittest2 import TestCase
+from zipfile import ZipFile
+import os
+import shutil
+import stat
+import tempfile
+
+
+class TestPreparedTemplate(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def stamp(self, template, metadata):
+        output = BytesIO()
+        template.stamp(metadata, output)
+        return output.getvalue()
+
+    def test_copies_are_stamped_with_properties(self):
+        template = PreparedTemplate(path_to('with_custom_properties.docx'))
+
+        first = self.stamp(template, {'Test': 'Hans', 'Case': 1})
+        second = self.stamp(template, {'Case': 2})
+
+        self.assertEqual([('Test', 'Hans'), ('Case', 1)],
+                         list(read_properties(first)))
+        self.assertEqual([('Test', 'Peter'), ('Case', 2)],
+                         list(read_properties(second)))
+
+    def test_copies_stamped_from_data_get_the_default_mode(self):
+        with open(path_to('with_custom_properties.docx'), 'rb') as f:
+            template = PreparedTemplate(f.read())
+        destination = os.path.join(self.tempdir, 'copy.docx')
+
+        umask = os.umask(0o022)
+        try:
+            template.stamp({'Test': 'Hans'}, destination)
+        finally:
+            os.umask(umask)
+
+        self.assertEqual(0o644, stat.S_IMODE(os.stat(destination).st_mode))
+
+    def test_unchanged_entries_are_copied_as_they_are(self):
+        source_path = path_to('with_custom_properties.docx')
+        template = PreparedTemplate(source_path)
+        copy = self.stamp(template, {'Test': 'Hans'})
+
+        with ZipFile(source_path) as source, ZipFile(BytesIO(copy)) as z:
+            self.assertEqual(source.namelist(), z.namelist())
+            self.assertIsNone(z.testzip())
+            for info in source.infolist():
+                if info.filename != 'docProps/custom.xml':
+                    self.assertEqual(info.CRC, z.getinfo(info.filename).CRC)
+                    self.assertEqual(
+                        info.compress_size,
+                        z.getinfo(info.filename).compress_size)
+
+    def test_templates_without_custom_properties(self):
+        template = PreparedTemplate(
+            path_to('without_custom_properties.docx'))
+
+        self.assertEqual([('Test', 'Hans')], list(read_properties(
+            self.stamp(template, {'Test': 'Hans'}))))
+        self.assertEqual([], list(read_properties(self.stamp(template, {}))))
+
+    def test_copies_are_written_to_paths(self):
+        source_path = os.path.join(self.tempdir, 'template.docx')
+        shutil.copy(path_to('with_custom_properties.docx'), source_path)
+        os.chmod(source_path, 0o640)
+        template = PreparedTemplate(source_path)
+        destination = os.path.join(self.tempdir, 'copy.docx')
+
+        template.stamp({'Test': 'Hans'}, destination)
+
+        self.assertEqual([('Test', 'Hans')],
+                         list(read_properties(destination)))
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(destination).st_mode))
+        self.assertEqual(['copy.docx', 'template.docx'],
+                         sorted(os.listdir(self.tempdir)))
+
+    def test_metadata_is_validated_against_the_schema(self):
+        schema = PropertySchema(strict=True)
+        schema.register('Case', 'i4')
+        template = PreparedTemplate(path_to('with_custom_properties.docx'),
+                                    schema=schema)
+
+        with self.assertRaises(SchemaValidationError):
+            template.stamp({'Case': 'one'}, BytesIO())
+
+    def test_copies_are_stamped_concurrently(self):
+        template = PreparedTemplate(path_to('with_custom_properties.docx'))
+        results = {}
+
+        def stamp(i):
+            results[i] = self.stamp(template, {'Case': i})
+
+        threads = [Thread(target=stamp, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i in range(8):
+            self.assertEqual([('Test', 'Peter'), ('Case', i)],
+                             list(read_properties(results[i])))
@@ -0,0 +1,74 @@
+from ooxml_docprops import read_all_properties
+from ooxml_docprops import read_properties
+from ooxml_docprops import update_properties
+from ooxml_docprops.cache import PropertiesCache
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.properties import get_parser
+from ooxml_docprops.tests.assets import path_to
+from ooxml_docprops.tests.assets import run_threads
+from unittest2 import TestCase
+import os
+import shutil
+import tempfile
+
+
+class TestThreadSafety(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def copy_asset(self, index):
+        path = os.path.join(self.tempdir, '%d.docx' % index)
+        shutil.copy(path_to('with_custom_properties.docx'), path)
+        return path
+
+    def test_documents_are_updated_and_read_from_many_threads(self):
+        paths = [self.copy_asset(index) for index in range(8)]
+        cache = PropertiesCache()
+        source = path_to('with_custom_properties.docx')
+
+        def update(path, index):
+            for round_ in range(5):
+                update_properties(path, {'Test': u'Hans', 'Index': index,
+                                         'Round': round_})
+
+        def read():
+            for round_ in range(5):
+                self.assertEqual([('Test', 'Peter')],
+                                 list(read_properties(source, cache=cache)))
+                self.assertEqual(
+                    'Peter', read_all_properties(source)['custom']['Test'])
+
+        errors = run_threads(
+            [lambda path=path, index=index: update(path, index)
+             for index, path in enumerate(paths)] + [read] * 4)
+
+        self.assertEqual([], errors)
+        for index, path in enumerate(paths):
+            self.assertEqual([('Test', 'Hans'), ('Index', index),
+                              ('Round', 4)],
+                             list(read_properties(path)))
+
+    def test_every_thread_parses_with_its_own_parser(self):
+        parsers = []
+        errors = run_threads([lambda: parsers.append(get_parser())] * 2)
+
+        self.assertEqual([], errors)
+        self.assertIsNot(parsers[0], parsers[1])
+        self.assertIs(get_parser(), get_parser())
+
+    def test_workdir_is_only_kept_when_asked_for(self):
+        path = self.copy_asset(0)
+        with OOXMLDocument(path, read_only=True) as doc:
+            pass
+        self.assertFalse(os.path.exists(doc.workdir))
+
+        with OOXMLDocument(path, read_only=True, keep_workdir=True) as doc:
+            pass
+        try:
+            self.assertTrue(os.path.isdir(doc.workdir))
+        finally:
+            shutil.rmtree(doc.workdir)
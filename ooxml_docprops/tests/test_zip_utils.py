@@ -0,0 +1,66 @@
+from io import BytesIO
+from ooxml_docprops.properties import OOXMLDocument
+from ooxml_docprops.tests.assets import TestAsset
+from ooxml_docprops.zip_utils import is_path
+from ooxml_docprops.zip_utils import read_raw_entry
+from unittest2 import TestCase
+from zipfile import ZipFile
+
+
+def read_raw_entries(path):
+    with ZipFile(path) as z:
+        return dict((info.filename, read_raw_entry(z, info))
+                    for info in z.infolist())
+
+
+class TestIsPath(TestCase):
+
+    def test_byte_strings_are_data_only_with_zip_signature(self):
+        self.assertFalse(is_path('PK\x03\x04stored without NUL'))
+        self.assertFalse(is_path('PK\x05\x06' + '\x00' * 18))
+        self.assertTrue(is_path('/tmp/test.docx'))
+        self.assertFalse(is_path('%PDF-1.4\n\x00'))
+        self.assertTrue(is_path(u'PK\x03\x04.docx'))
+        self.assertFalse(is_path(bytearray('PK\x03\x04')))
+        self.assertFalse(is_path(BytesIO()))
+
+
+class TestRewriteZip(TestCase):
+
+    def test_unchanged_entries_are_copied_without_recompression(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            before = read_raw_entries(asset.path)
+
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({'Test': 'Hanspeter'})
+
+            after = read_raw_entries(asset.path)
+
+        self.assertItemsEqual(before.keys(), after.keys())
+        self.assertNotEqual(before.pop('docProps/custom.xml'),
+                            after.pop('docProps/custom.xml'))
+        self.assertEqual(before, after)
+
+    def test_entry_order_is_preserved_and_new_parts_are_appended(self):
+        with TestAsset('without_custom_properties.docx') as asset:
+            with ZipFile(asset.path) as z:
+                names_before = z.namelist()
+
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({'Foo': 'Bar'})
+
+            with ZipFile(asset.path) as z:
+                self.assertIsNone(z.testzip())
+                names_after = z.namelist()
+
+        self.assertEqual(names_before + ['docProps/custom.xml'], names_after)
+
+    def test_rewritten_package_can_be_read_again(self):
+        with TestAsset('with_custom_properties.docx') as asset:
+            with OOXMLDocument(asset.path) as doc:
+                doc.update_properties({'Test': 'Hanspeter', 'Foo': 1})
+
+            with OOXMLDocument(asset.path, read_only=True) as doc:
+                self.assertEqual('Hanspeter',
+                                 doc.properties.get_property_value('Test'))
+                self.assertEqual(1, doc.properties.get_property_value('Foo'))
@@ -1,10 +1,31 @@
 """Utility functions for dealing with ZIP files.
 """
 
+from io import BytesIO
+from os.path import abspath
 from os.path import relpath
-from zipfile import ZipFile
+from zipfile import sizeFileHeader
+from zipfile import structFileHeader
+from zipfile import ZIP64_LIMIT
 from zipfile import ZIP_DEFLATED
+from zipfile import ZipFile
+from zipfile import ZipInfo
+import copy
 import os
+import struct
+import time
+import zlib
+
+
+# Indexes into the unpacked local file header, see zipfile.structFileHeader
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
+
+# General purpose flag bit signalling a trailing data descriptor
+_FLAG_DATA_DESCRIPTOR = 0x08
+
+# Signatures a ZIP file starts with, the latter if it has no entries
+ZIP_SIGNATURES = ('PK\x03\x04', 'PK\x05\x06')
 
 
 def zipdir(basedir, archivename):
@@ -16,3 +37,184 @@ def zipdir(basedir, archivename):
                 absolute_path = os.path.join(root, fn)
                 relative_path = relpath(absolute_path, basedir)
                 z.write(absolute_path, relative_path)
+
+
+def is_path(document):
+    """Tell whether `document` is given as path.
+
+    Unicode strings are always paths, byte strings unless they start with
+    the signature of a ZIP file or contain NUL bytes, which paths cannot.
+    Other data, such as a PDF, is then reported as invalid ZIP file.
+    """
+    if isinstance(document, unicode):
+        return True
+    return (isinstance(document, str) and
+            not document.startswith(ZIP_SIGNATURES) and
+            '\x00' not in document)
+
+
+def as_zip_source(document):
+    """Return what ZipFile needs to open `document`.
+
+    `document` is either a path, bytes, a bytearray, a memoryview or a
+    seekable file-like object.
+    """
+    if is_path(document):
+        return abspath(document)
+    if isinstance(document, memoryview):
+        return BytesIO(document.tobytes())
+    if isinstance(document, (basestring, bytearray)):
+        return BytesIO(bytes(document))
+    return document
+
+
+def read_raw_entry(source, zinfo):
+    """Return the still compressed bytes of the entry `zinfo` in the open
+    ZipFile `source`.
+    """
+    fp = source.fp
+    fp.seek(zinfo.header_offset)
+    fheader = struct.unpack(structFileHeader, fp.read(sizeFileHeader))
+    fp.seek(fheader[_FH_FILENAME_LENGTH] +
+            fheader[_FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+    return fp.read(zinfo.compress_size)
+
+
+def prepare_entry(source, zinfo):
+    """Return the entry `zinfo` of the open ZipFile `source` as (info,
+    header, raw) tuple, ready to be written to other ZIP files with
+    `write_prepared_entry` without decompressing and recompressing it.
+    """
+    raw = read_raw_entry(source, zinfo)
+
+    info = copy.copy(zinfo)
+    # CRC and sizes are known, so they go into the local header directly
+    info.flag_bits &= ~_FLAG_DATA_DESCRIPTOR
+    return info, info.FileHeader(), raw
+
+
+def write_prepared_entry(target, info, header, raw):
+    """Append an entry prepared with `prepare_entry` to the ZipFile
+    `target`.
+    """
+    info = copy.copy(info)
+    info.header_offset = target.fp.tell()
+
+    # zipfile has no public API for adding precompressed data, so we
+    # write the entry the same way ZipFile.writestr does.
+    target.fp.write(header)
+    target.fp.write(raw)
+    target.filelist.append(info)
+    target.NameToInfo[info.filename] = info
+    target._didModify = True
+
+
+def write_stream_entry(target, zinfo, fileobj, chunk_size=1024 * 1024):
+    """Append the entry `zinfo` with the contents of the seekable
+    file-like object `fileobj` to the ZipFile `target`, compressing it
+    chunk by chunk instead of reading it into memory at once.
+    """
+    # Same as ZipFile.write, which only accepts file names
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    zip64 = target._allowZip64 and size * 1.05 > ZIP64_LIMIT
+
+    info = copy.copy(zinfo)
+    info.flag_bits = 0
+    info.file_size = size
+    info.CRC = crc = 0
+    info.compress_size = compress_size = 0
+    info.header_offset = target.fp.tell()
+    target._writecheck(info)
+    target._didModify = True
+    target.fp.write(info.FileHeader(zip64))
+
+    compressor = None
+    if info.compress_type == ZIP_DEFLATED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
+                                      zlib.DEFLATED, -15)
+    for chunk in iter(lambda: fileobj.read(chunk_size), ''):
+        crc = zlib.crc32(chunk, crc) & 0xffffffff
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        compress_size += len(chunk)
+        target.fp.write(chunk)
+    if compressor is not None:
+        chunk = compressor.flush()
+        compress_size += len(chunk)
+        target.fp.write(chunk)
+
+    # Rewrite the local header with the CRC and sizes now known
+    info.CRC = crc
+    info.compress_size = compress_size
+    position = target.fp.tell()
+    target.fp.seek(info.header_offset)
+    target.fp.write(info.FileHeader(zip64))
+    target.fp.seek(position)
+    target.filelist.append(info)
+    target.NameToInfo[info.filename] = info
+
+
+def write_entry(target, zinfo, data):
+    """Append the entry `zinfo` with `data`, either bytes or a seekable
+    file-like object, to the ZipFile `target`.
+    """
+    if hasattr(data, 'read'):
+        write_stream_entry(target, zinfo, data)
+    else:
+        target.writestr(zinfo, data)
+
+
+def copy_entry(source, target, zinfo):
+    """Copy the entry `zinfo` from the ZipFile `source` to the ZipFile
+    `target` without decompressing and recompressing its data.
+    """
+    write_prepared_entry(target, *prepare_entry(source, zinfo))
+
+
+def rewrite_zip(source_path, archivename, replacements, stats=None):
+    """Write a copy of the ZIP file `source_path` to `archivename`. Both
+    may be a path or a file-like object.
+
+    `replacements` maps entry names to their new contents, bytes or
+    seekable file-like objects. Only these entries are compressed again,
+    all other entries are copied over as they are. Entries in
+    `replacements` missing in the source are appended.
+    The entries and bytes copied and written are counted in the
+    OperationStats `stats`, if given.
+    """
+    pending = dict(replacements)
+    copied = recompressed = 0
+    start = None
+    if not isinstance(archivename, basestring):
+        start = archivename.tell()
+    with ZipFile(source_path, 'r') as source:
+        with ZipFile(archivename, 'w', ZIP_DEFLATED) as target:
+            for zinfo in source.infolist():
+                if zinfo.filename in pending:
+                    info = ZipInfo(zinfo.filename, zinfo.date_time)
+                    info.external_attr = zinfo.external_attr
+                    info.compress_type = ZIP_DEFLATED
+                    write_entry(target, info, pending.pop(zinfo.filename))
+                    recompressed += 1
+                else:
+                    copy_entry(source, target, zinfo)
+                    copied += 1
+                    if stats is not None:
+                        stats.count_read(zinfo.filename, zinfo.compress_size)
+
+            for name in sorted(pending):
+                info = ZipInfo(name, time.localtime(time.time())[:6])
+                info.external_attr = 0600 << 16
+                info.compress_type = ZIP_DEFLATED
+                write_entry(target, info, pending[name])
+                recompressed += 1
+
+    if stats is not None:
+        stats.entries_copied += copied
+        stats.entries_recompressed += recompressed
+        if start is None:
+            stats.bytes_written += os.path.getsize(archivename)
+        else:
+            stats.bytes_written += archivename.tell() - start
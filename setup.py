@@ -34,18 +34,22 @@ setup(name='ooxml_docprops',
       zip_safe=False,
 
       install_requires=[
+        'futures',
         'iso8601',
         'lxml',
         'setuptools',
         ],
 
       tests_require=tests_require,
-      extras_require=dict(tests=tests_require),
+      extras_require=dict(tests=tests_require, parquet=['pyarrow']),
 
       entry_points='''
       # -*- Entry points: -*-
       [console_scripts]
       update-properties = ooxml_docprops.cli:update_props
       read-properties = ooxml_docprops.cli:read_props
+      copy-with-properties = ooxml_docprops.cli:copy_props
+      bulk-update-properties = ooxml_docprops.cli:bulk_update_props
+      export-properties = ooxml_docprops.cli:export_props
       ''',
       )